@@ -1,2 +1,2 @@
 from .cerebras import register_models
-
+from .jsonstream import astream_items, stream_items
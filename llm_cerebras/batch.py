@@ -0,0 +1,209 @@
+import collections
+import concurrent.futures
+import csv
+import json
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Set, TextIO
+
+import llm
+
+from .journal import Journal, input_hash
+
+DEFAULT_CONCURRENCY = 8
+# Results that may be waiting to be written, per worker. In input order a
+# slow prompt holds back the ones after it, so allow some slack before
+# submission pauses.
+PENDING_PER_WORKER = 4
+
+
+def detect_format(path: Optional[str]) -> str:
+    if path and path.lower().endswith(".csv"):
+        return "csv"
+    return "jsonl"
+
+
+def read_records(lines: Iterable[str], fmt: str = "jsonl", prompt_field: str = "prompt") -> Iterator[Dict[str, Any]]:
+    """
+    Yield one record per input row, each with "id", "prompt" and optionally
+    "system". JSONL lines may be objects or bare strings. Rows without an
+    "id" are numbered from 0 in input order, so ids are stable across runs.
+    """
+    if fmt == "csv":
+        rows = csv.DictReader(lines)
+    else:
+        rows = (json.loads(line) for line in lines if line.strip())
+    for index, row in enumerate(rows):
+        if isinstance(row, str):
+            row = {prompt_field: row}
+        if not isinstance(row, dict) or not row.get(prompt_field):
+            raise ValueError(f"Record {index} has no {prompt_field!r} field")
+        record_id = row.get("id")
+        record = {"id": index if record_id in (None, "") else record_id, "prompt": row[prompt_field]}
+        if row.get("system"):
+            record["system"] = row["system"]
+        yield record
+
+
+def completed_ids(path: Path) -> Set[str]:
+    """
+    Ids of the successful results in an existing output file. A partial
+    last line left by a crash is cut off so that appending stays valid JSONL.
+    """
+    done = set()
+    if not path.exists():
+        return done
+    with open(path, "rb+") as f:
+        content = f.read()
+        end = content.rfind(b"\n") + 1
+        if end < len(content):
+            f.truncate(end)
+    for line in content[:end].splitlines():
+        try:
+            result = json.loads(line)
+        except ValueError:
+            continue
+        if isinstance(result, dict) and "id" in result and not result.get("error"):
+            done.add(str(result["id"]))
+    return done
+
+
+def run_prompt(model: llm.Model, record: Dict[str, Any], schema=None, system=None, options=None) -> Dict[str, Any]:
+    """Run one record, returning its result row. Errors are reported, not raised."""
+    result = {"id": record["id"]}
+    try:
+        response = model.prompt(
+            record["prompt"],
+            system=record.get("system", system),
+            schema=schema,
+            stream=False,
+            **(options or {}),
+        )
+        text = response.text()
+        result["response"] = text
+        if schema:
+            try:
+                result["json"] = json.loads(text)
+            except ValueError:
+                pass
+            # Replies corrected by the model took more than one attempt
+            attempts = (response.response_json or {}).get("attempts")
+            if attempts:
+                result["attempts"] = attempts
+        usage = response.usage()
+        result["usage"] = {"input": usage.input, "output": usage.output}
+    except Exception as e:
+        result["error"] = str(e) or type(e).__name__
+    return result
+
+
+def run_batch(
+    model: llm.Model,
+    records: Iterable[Dict[str, Any]],
+    write: Callable[[Dict[str, Any]], None],
+    concurrency: int = DEFAULT_CONCURRENCY,
+    order: str = "input",
+    schema=None,
+    system: Optional[str] = None,
+    options: Optional[Dict[str, Any]] = None,
+    skip_ids: Optional[Set[str]] = None,
+    journal: Optional[Journal] = None,
+) -> Dict[str, int]:
+    """
+    Run records on a thread pool of `concurrency` workers, passing each
+    result to write() from the calling thread, either in input order or as
+    results complete. Records whose id is in skip_ids are not run.
+
+    With a journal, successful results are recorded in it, and records it
+    already holds are not run again: their stored result is written
+    instead. Returns counts of completed, failed, skipped and restored
+    records.
+    """
+    counts = {"completed": 0, "failed": 0, "skipped": 0, "restored": 0}
+    skip_ids = skip_ids or set()
+    max_pending = max(1, concurrency) * PENDING_PER_WORKER
+
+    def emit(future):
+        result, key, restored = future.result()
+        if restored:
+            counts["restored"] += 1
+        elif "error" in result:
+            counts["failed"] += 1
+        else:
+            counts["completed"] += 1
+            if journal is not None:
+                journal.record(key, result)
+        write(result)
+
+    def run(record, key):
+        return run_prompt(model, record, schema, system, options), key, False
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        pending = collections.deque()
+
+        def drain(block: bool):
+            if order == "input":
+                while pending and (block or pending[0].done()):
+                    emit(pending.popleft())
+                    block = False
+            elif pending:
+                done, _ = concurrent.futures.wait(
+                    pending,
+                    timeout=None if block else 0,
+                    return_when=concurrent.futures.FIRST_COMPLETED,
+                )
+                for future in [f for f in pending if f in done]:
+                    pending.remove(future)
+                    emit(future)
+
+        try:
+            for record in records:
+                if str(record["id"]) in skip_ids:
+                    counts["skipped"] += 1
+                    continue
+                key = stored = None
+                if journal is not None:
+                    key = input_hash(model.model_id, record, system, schema, options)
+                    stored = journal.get(key)
+                drain(block=len(pending) >= max_pending)
+                if stored is not None:
+                    future = concurrent.futures.Future()
+                    future.set_result((dict(stored, id=record["id"]), key, True))
+                else:
+                    future = executor.submit(run, record, key)
+                pending.append(future)
+            while pending:
+                drain(block=True)
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            raise
+    return counts
+
+
+def resolve_schema(value: Optional[str]):
+    """A schema given as JSON, a path to a JSON file, or llm's concise syntax."""
+    if not value:
+        return None
+    if value.strip().startswith("{"):
+        return json.loads(value)
+    if os.path.exists(value):
+        return json.loads(Path(value).read_text())
+    return llm.schema_dsl(value)
+
+
+def open_output(path: Optional[str], resume: bool) -> tuple:
+    """Return (file, skip_ids) for writing results, resuming from path if asked."""
+    if not path:
+        return None, set()
+    output = Path(path)
+    skip_ids = completed_ids(output) if resume else set()
+    return open(output, "a" if resume else "w"), skip_ids
+
+
+def writer(output: TextIO) -> Callable[[Dict[str, Any]], None]:
+    def write(result):
+        output.write(json.dumps(result, ensure_ascii=False) + "\n")
+        output.flush()
+
+    return write
@@ -0,0 +1,213 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional
+
+import llm
+
+DEFAULT_TTL = 7 * 24 * 60 * 60  # One week, in seconds
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+# Writes between eviction passes, so eviction stays off the hot path
+EVICT_EVERY = 32
+
+# Request fields that change how a response is delivered, not what it says
+_DELIVERY_FIELDS = ("stream", "stream_options")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL,
+    size INTEGER NOT NULL,
+    value TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+"""
+
+
+def cache_key(data: Dict[str, Any]) -> str:
+    """
+    Canonical hash of a chat completion request body: the resolved API model
+    id, messages, sampling options and response_format. Streamed and
+    non-streamed requests for the same prompt share a key.
+    """
+    body = {key: value for key, value in data.items() if key not in _DELIVERY_FIELDS and value is not None}
+    canonical = json.dumps(body, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def record_chunks(deltas: Iterable[str], chunks: List[str]) -> Iterator[str]:
+    """Pass deltas through, keeping a copy of each in chunks."""
+    for delta in deltas:
+        chunks.append(delta)
+        yield delta
+
+
+async def arecord_chunks(deltas: AsyncIterator[str], chunks: List[str]) -> AsyncIterator[str]:
+    """Async counterpart of record_chunks()."""
+    async for delta in deltas:
+        chunks.append(delta)
+        yield delta
+
+
+class ResponseCache:
+    """
+    SQLite store of completed responses, shared by every process using the
+    same llm user directory. Entries expire ttl seconds after they were
+    written, and the least recently used are evicted once the stored
+    responses exceed max_bytes. Hit and miss counts are kept in the
+    database too.
+    """
+
+    def __init__(self, path=None, ttl: Optional[float] = DEFAULT_TTL, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = Path(path) if path else llm.user_dir() / "cerebras_cache.db"
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._conn = None
+        self._lock = threading.Lock()
+        self._writes = 0
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _count(self, db, name: str):
+        db.execute(
+            "INSERT INTO stats (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """The cached entry for key, or None if there is none or it has expired."""
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            row = db.execute("SELECT created, value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl and now - row[0] > self.ttl:
+                db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self._count(db, "misses")
+                return None
+            db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            self._count(db, "hits")
+        return json.loads(row[1])
+
+    def set(self, key: str, entry: Dict[str, Any]):
+        value = json.dumps(entry, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            db = self._db()
+            db.execute(
+                "INSERT OR REPLACE INTO responses (key, created, accessed, size, value) VALUES (?, ?, ?, ?, ?)",
+                (key, now, now, len(value.encode("utf-8")), value),
+            )
+            self._writes += 1
+            if self._writes % EVICT_EVERY == 1:
+                self._evict(db, now)
+
+    def _evict(self, db, now: float):
+        if self.ttl:
+            db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+        # Keep the most recently used entries that fit in max_bytes
+        db.execute(
+            "DELETE FROM responses WHERE key IN ("
+            " SELECT key FROM ("
+            "  SELECT key, SUM(size) OVER (ORDER BY accessed DESC, key) AS running FROM responses"
+            " ) WHERE running > ?)",
+            (self.max_bytes,),
+        )
+
+    def evict(self):
+        """Drop expired entries and trim the cache to max_bytes now."""
+        with self._lock:
+            self._evict(self._db(), time.time())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            db = self._db()
+            counters = dict(db.execute("SELECT name, value FROM stats").fetchall())
+            entries, size = db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        hits, misses = counters.get("hits", 0), counters.get("misses", 0)
+        return {
+            "path": str(self.path),
+            "entries": entries,
+            "size_bytes": size,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else None,
+        }
+
+    def clear(self):
+        """Remove every entry and reset the statistics."""
+        with self._lock:
+            db = self._db()
+            db.execute("DELETE FROM responses")
+            db.execute("DELETE FROM stats")
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def cache_enabled_by_default() -> bool:
+    return os.environ.get("LLM_CEREBRAS_CACHE", "").lower() in ("1", "true", "yes", "on")
+
+
+def _env_float(name, default):
+    try:
+        return float(os.environ[name])
+    except (KeyError, ValueError):
+        return default
+
+
+def get_response_cache() -> ResponseCache:
+    """
+    The process-wide response cache, configured from the environment on
+    first use:
+
+    - LLM_CEREBRAS_CACHE_TTL: seconds before an entry expires (default one
+      week, 0 to never expire)
+    - LLM_CEREBRAS_CACHE_MAX_MB: size of the stored responses before the
+      least recently used are evicted (default 256)
+    """
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache(
+                ttl=_env_float("LLM_CEREBRAS_CACHE_TTL", DEFAULT_TTL) or None,
+                max_bytes=int(_env_float("LLM_CEREBRAS_CACHE_MAX_MB", DEFAULT_MAX_BYTES / 1024 / 1024) * 1024 * 1024),
+            )
+        return _response_cache
+
+
+def set_response_cache(cache: Optional[ResponseCache]):
+    """Replace the process-wide cache; None recreates it from the environment on next use."""
+    global _response_cache
+    with _response_cache_lock:
+        previous, _response_cache = _response_cache, cache
+    if previous is not None and previous is not cache:
+        try:
+            previous.close()
+        except sqlite3.Error as e:
+            logging.warning(f"Failed to close Cerebras response cache: {e}")
@@ -1,27 +1,78 @@
 import llm
+import asyncio
+import click
 import httpx
+import itertools
 import json
 import os
+import queue
+import sqlite3
+import sys
+import threading
 import time
 from pathlib import Path
 from pydantic import Field
 from typing import Optional, List, Dict, Any, Union
 import logging
 
-# Try to import jsonschema for validation
-try:
-    import jsonschema
-    HAVE_JSONSCHEMA = True
-except ImportError:
-    HAVE_JSONSCHEMA = False
-    logging.warning("jsonschema not installed, schema validation will be limited")
+from .cache import arecord_chunks, cache_enabled_by_default, cache_key, get_response_cache, record_chunks
+from .circuit import CircuitOpenError, get_circuit_breaker
+from .client import (
+    DeadlineExceeded,
+    attempt_timeout,
+    client_settings,
+    configure_client,
+    deadline_after,
+    get_async_client,
+    get_client,
+    timeout_settings,
+)
+from .fallback import api_model_id, configured_fallbacks, load_fallbacks, model_unavailable, parse_chain, save_fallbacks
+from .hedge import DEFAULT_PERCENTILE, Attempt, AttemptCancelled, get_hedger, hedging_enabled_by_default
+from .history import history_cache, trim_history
+from .jsonstream import item_checker
+from .keypool import configured_keys, get_key_pool
+from .limits import OUTPUT_RESERVE, ContextWindowExceeded, model_limits, parse_model_limits, plan_max_tokens
+from .metrics import RequestTimer, emit_metrics
+from .ratelimit import get_rate_limiter
+from .repair import (
+    DEFAULT_MAX_REPAIRS,
+    add_usage,
+    error_message,
+    failed_generation,
+    local_fix,
+    repair_request,
+    schema_rejection,
+)
+from .retry import RetryPolicy, RetryState, is_retryable_status
+from .schemas import CompiledSchema, compile_validator, schema_cache, schema_key
+from .singleflight import async_flights, flights
+from .sse import acoalesce, aiter_sse, coalesce, iter_sse
+from .tokens import estimate_message_tokens, estimate_request_tokens
+from .tools import ToolCallDeltas, parse_tool_calls, run_tool_calls_in_parallel, tool_choice, tool_definitions, tool_result_messages
+
+# Seconds to wait after a failed background refresh before trying again
+REFRESH_RETRY_INTERVAL = 5 * 60
+
+# Snapshot of known models, used until the /models endpoint has been fetched
+DEFAULT_MODELS = {
+    "cerebras-llama3.1-8b": "llama3.1-8b",
+    "cerebras-llama3.3-70b": "llama-3.3-70b",
+    "cerebras-llama-4-scout-17b-16e-instruct": "llama-4-scout-17b-16e-instruct",
+    "cerebras-deepseek-r1-distill-llama-70b": "DeepSeek-R1-Distill-Llama-70B",
+}
 
 @llm.hookimpl
 def register_models(register):
-    model_map = CerebrasModel.get_models()
+    # Runs on every llm invocation, so it must never wait on the network
+    model_map = CerebrasModel.load_models_without_network()
     for model_id in model_map.keys():
         aliases = tuple()
-        register(CerebrasModel(model_id), aliases=aliases)
+        register(
+            CerebrasModel(model_id),
+            AsyncCerebrasModel(model_id),
+            aliases=aliases,
+        )
 
 @llm.hookimpl
 def register_commands(cli):
@@ -42,15 +93,197 @@ def register_commands(cli):
             return 1
         return 0
 
-class CerebrasModel(llm.Model):
+    @cerebras.command()
+    @click.argument("input_path", required=False, type=click.Path(dir_okay=False, allow_dash=True))
+    @click.option("-m", "--model", "model_id", default="cerebras-llama3.1-8b", help="Cerebras model to use")
+    @click.option("-s", "--system", help="System prompt for records without their own")
+    @click.option("--schema", help="JSON schema, path to a schema file, or concise schema syntax")
+    @click.option(
+        "options", "-o", "--option", type=(str, str), multiple=True, help="key/value options for the model"
+    )
+    @click.option("-c", "--concurrency", type=click.IntRange(1), default=8, show_default=True, help="Prompts in flight at once")
+    @click.option(
+        "--order", type=click.Choice(["input", "completion"]), default="input", show_default=True,
+        help="Write results in input order or as they complete",
+    )
+    @click.option("--format", "fmt", type=click.Choice(["jsonl", "csv"]), help="Input format, default from the file extension")
+    @click.option("--prompt-field", default="prompt", show_default=True, help="Field or column holding the prompt")
+    @click.option("--output", type=click.Path(dir_okay=False), help="Append results to this JSONL file")
+    @click.option("--no-resume", is_flag=True, help="Overwrite --output instead of skipping completed records")
+    @click.option("--journal", type=click.Path(dir_okay=False), help="Record completed prompts here and reuse them on restart")
+    @click.option(
+        "--fsync-interval", type=float, default=1.0, show_default=True, help="Seconds between journal fsyncs"
+    )
+    def batch(
+        input_path, model_id, system, schema, options, concurrency, order, fmt, prompt_field, output, no_resume,
+        journal, fsync_interval,
+    ):
+        """
+        Run prompts from a JSONL or CSV file (or stdin) and write results as JSONL
+
+        Each input record needs a "prompt" and may have an "id" and a "system"
+        prompt. With --output, records already completed in that file are
+        skipped, so an interrupted run can simply be started again. With
+        --journal, prompts that completed in any earlier run are not sent
+        again and their recorded results are written instead.
+        """
+        from . import batch as batch_module
+        from .journal import Journal
+
+        try:
+            model = llm.get_model(model_id)
+        except llm.UnknownModelError as e:
+            raise click.ClickException(str(e))
+        if not isinstance(model, _SharedCerebras):
+            raise click.ClickException(f"{model_id} is not a Cerebras model")
+        try:
+            schema = batch_module.resolve_schema(schema)
+        except ValueError as e:
+            raise click.ClickException(f"Invalid schema: {e}")
+        if concurrency > client_settings()["max_keepalive_connections"]:
+            configure_client(max_keepalive_connections=concurrency)
+
+        out, skip_ids = batch_module.open_output(output, resume=not no_resume)
+        journal = Journal(journal, fsync_interval) if journal else None
+        lines = click.open_file(input_path or "-", encoding="utf-8")
+        try:
+            records = batch_module.read_records(lines, fmt or batch_module.detect_format(input_path), prompt_field)
+            counts = batch_module.run_batch(
+                model,
+                records,
+                batch_module.writer(out or sys.stdout),
+                concurrency=concurrency,
+                order=order,
+                schema=schema,
+                system=system,
+                options=dict(options),
+                skip_ids=skip_ids,
+                journal=journal,
+            )
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        finally:
+            lines.close()
+            if out is not None:
+                out.close()
+            if journal is not None:
+                journal.close()
+        summary = f"{counts['completed']} completed, {counts['failed']} failed, {counts['skipped']} skipped"
+        if journal is not None:
+            summary += f", {counts['restored']} restored from journal"
+        click.echo(summary, err=True)
+
+    @cerebras.group()
+    def cache():
+        "Manage the local Cerebras response cache"
+
+    @cache.command()
+    @click.option("--json", "as_json", is_flag=True, help="Output statistics as JSON")
+    def stats(as_json):
+        "Show response cache hits, misses and size"
+        stats = get_response_cache().stats()
+        if as_json:
+            click.echo(json.dumps(stats, indent=2))
+            return
+        hit_rate = "n/a" if stats["hit_rate"] is None else f"{stats['hit_rate']:.1%}"
+        click.echo(f"Path: {stats['path']}")
+        click.echo(f"Entries: {stats['entries']}")
+        click.echo(f"Size: {stats['size_bytes']} of {stats['max_bytes']} bytes")
+        click.echo(f"TTL: {stats['ttl'] or 'none'}")
+        click.echo(f"Hits: {stats['hits']}")
+        click.echo(f"Misses: {stats['misses']}")
+        click.echo(f"Hit rate: {hit_rate}")
+
+    @cache.command()
+    def clear():
+        "Delete every cached response and reset the statistics"
+        get_response_cache().clear()
+        click.echo("Cleared the Cerebras response cache")
+
+    @cerebras.command()
+    @click.option("--json", "as_json", is_flag=True, help="Output counters as JSON")
+    def keys(as_json):
+        """
+        Show the API keys in the key pool with their request counters
+
+        Configure a pool with several keys, separated by commas, in the
+        cerebras_keys llm key or the CEREBRAS_API_KEYS environment variable.
+        """
+        from .keypool import key_stats
+
+        rows = key_stats(configured_keys())
+        if as_json:
+            click.echo(json.dumps(rows, indent=2))
+            return
+        if len(rows) < 2:
+            click.echo("No key pool configured: set cerebras_keys or CEREBRAS_API_KEYS to two or more keys")
+            return
+        for row in rows:
+            status = f"resting {row['ejected_for']:.0f}s" if row["ejected_for"] else "ok"
+            remaining = ", ".join(f"{name} {value:g}" for name, value in sorted(row["remaining"].items()))
+            click.echo(
+                f"{row['key']}: {status}, {row['requests']} requests, {row['ok']} ok, "
+                f"{row['throttled']} throttled, {row['unauthorized']} unauthorized, {row['errors']} errors"
+                + (f" (remaining: {remaining})" if remaining else "")
+            )
+
+    @cerebras.command()
+    @click.argument("model_id", required=False)
+    @click.argument("fallbacks", nargs=-1)
+    @click.option("--clear", is_flag=True, help="Remove the fallback chain of the model")
+    def fallback(model_id, fallbacks, clear):
+        """
+        Show or set the models to fall back to when a model is unavailable
+
+        With no arguments, lists every fallback chain. With a model and
+        fallbacks, sets its chain:
+
+            llm cerebras fallback llama-3.3-70b llama3.1-8b
+        """
+        chains = load_fallbacks()
+        if model_id is None:
+            for model, chain in sorted(chains.items()):
+                click.echo(f"{model}: {', '.join(chain)}")
+            if not chains:
+                click.echo("No fallback chains configured")
+            return
+        if clear:
+            chains.pop(model_id, None)
+        elif fallbacks:
+            chains[model_id] = list(fallbacks)
+        else:
+            click.echo(f"{model_id}: {', '.join(chains.get(model_id, [])) or 'no fallbacks'}")
+            return
+        save_fallbacks(chains)
+        click.echo(f"{model_id}: {', '.join(chains.get(model_id, [])) or 'no fallbacks'}")
+
+
+class _SharedCerebras:
     can_stream = True
     model_id: str
     api_base = "https://api.cerebras.ai/v1"
     supports_schema = True  # Enable schema support
+    supports_tools = True
     
     # Cache settings
     _cache_file = None
     _cache_duration = 24 * 60 * 60  # 24 hours in seconds
+
+    # Process-wide in-memory copy of the model map, so prompts never have
+    # to read the cache file. Stored on _SharedCerebras itself so the sync
+    # and async classes share it.
+    _models_memo = None
+    _models_memo_time = 0.0
+    _models_memo_lock = threading.Lock()
+    _refresh_thread = None
+    # When a background refresh last failed, so it is not retried on every prompt
+    _refresh_failed_at = 0.0
+    # Context window and max output per API model id, from /models, and
+    # capabilities learned from the API's responses
+    _metadata_memo = None
+    # (API model id, schema key) of schemas a model refused in json_schema
+    # mode although it supports the mode; kept for this process only
+    _rejected_schemas = set()
     
     @classmethod
     def get_cache_file(cls):
@@ -60,8 +293,11 @@ class CerebrasModel(llm.Model):
         return cls._cache_file
     
     @classmethod
-    def load_cached_models(cls):
-        """Load models from cache if available and not expired."""
+    def load_cached_models(cls, allow_stale=False):
+        """
+        Load models from cache if available and not expired. With
+        allow_stale=True an expired cache is still returned.
+        """
         cache_file = cls.get_cache_file()
         
         if not cache_file.exists():
@@ -73,81 +309,110 @@ class CerebrasModel(llm.Model):
             
             # Check if cache is expired
             cache_time = cache_data.get('timestamp', 0)
-            if time.time() - cache_time > cls._cache_duration:
+            if not allow_stale and time.time() - cache_time > cls._cache_duration:
                 return None
-                
-            return cache_data.get('models', {})
+
+            models = cache_data.get('models', {})
+            cls._remember_models(models, cache_time)
+            if cache_data.get('metadata'):
+                cls._remember_metadata(cache_data['metadata'])
+            return models
         except (json.JSONDecodeError, KeyError, OSError) as e:
             logging.warning(f"Failed to load cached models: {e}")
             return None
     
     @classmethod
-    def save_models_to_cache(cls, models):
-        """Save models to cache with timestamp."""
+    def save_models_to_cache(cls, models, metadata=None, timestamp=None):
+        """
+        Save models to cache with timestamp, along with the per-model limits
+        (by default those last fetched from the API).
+        """
         cache_file = cls.get_cache_file()
         
         cache_data = {
-            'timestamp': time.time(),
+            'timestamp': timestamp if timestamp is not None else time.time(),
             'models': models
         }
+        metadata = metadata if metadata is not None else _SharedCerebras._metadata_memo
+        if metadata:
+            cache_data['metadata'] = metadata
         
         try:
             # Ensure parent directory exists
             cache_file.parent.mkdir(parents=True, exist_ok=True)
-            with open(cache_file, 'w') as f:
+            # Write then rename, so a refresh thread killed at exit can
+            # never leave a half-written cache behind
+            tmp_file = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+            with open(tmp_file, 'w') as f:
                 json.dump(cache_data, f, indent=2)
+            os.replace(tmp_file, cache_file)
         except OSError as e:
             logging.warning(f"Failed to save models to cache: {e}")
     
     @classmethod
     def fetch_models_from_api(cls):
-        """Fetch available models from Cerebras API."""
+        """Fetch available models from Cerebras API, or the bundled snapshot if that fails."""
         try:
-            api_key = llm.get_key("", "cerebras", "CEREBRAS_API_KEY")
-            if not api_key:
-                logging.warning("No Cerebras API key found, using fallback models")
-                raise ValueError("No API key available")
-                
-            headers = {
-                "Authorization": f"Bearer {api_key}",
-                "Content-Type": "application/json"
-            }
-            
-            url = f"{cls.api_base}/models"
-            logging.info(f"Fetching models from {url}")
-            response = httpx.get(url, headers=headers, timeout=30)
-            response.raise_for_status()
-            
-            api_data = response.json()
-            models = {}
-            
-            # Process the API response to create model mapping
-            if 'data' in api_data:
-                for model in api_data['data']:
-                    model_id = model.get('id', '')
-                    if model_id:
-                        # Create a prefixed version for LLM registration
-                        prefixed_id = f"cerebras-{model_id}"
-                        models[prefixed_id] = model_id
-                        
-                logging.info(f"Successfully fetched {len(models)} models from API")
-            else:
-                logging.warning("No 'data' field in API response")
-            
-            return models
-            
+            return cls._fetch_models_from_api()
         except Exception as e:
             logging.error(f"Failed to fetch models from API: {e}")
             # Return fallback models if API fails
-            fallback_models = {
-                "cerebras-llama3.1-8b": "llama3.1-8b",
-                "cerebras-llama3.3-70b": "llama-3.3-70b",
-                "cerebras-llama-4-scout-17b-16e-instruct": "llama-4-scout-17b-16e-instruct",
-                "cerebras-deepseek-r1-distill-llama-70b": "DeepSeek-R1-Distill-Llama-70B",
-            }
+            fallback_models = dict(DEFAULT_MODELS)
             logging.info(f"Using fallback models: {list(fallback_models.keys())}")
             return fallback_models
-    
+
+    @classmethod
+    def _api_key(cls):
+        """
+        The API key to send requests with, or None if none is configured.
+        Without a single key, the first key of the pool stands in.
+        """
+        key = llm.get_key("", "cerebras", "CEREBRAS_API_KEY")
+        if not key:
+            key = next(iter(configured_keys()), None)
+        return key
+
+    @classmethod
+    def _fetch_models_from_api(cls):
+        """Fetch available models from Cerebras API, raising if there are none."""
+        api_key = cls._api_key()
+        if not api_key:
+            logging.warning("No Cerebras API key found, using fallback models")
+            raise ValueError("No API key available")
+
+        headers = {
+            "Authorization": f"Bearer {api_key}",
+            "Content-Type": "application/json"
+        }
+
+        url = f"{cls.api_base}/models"
+        logging.info(f"Fetching models from {url}")
+        response = get_client().get(url, headers=headers, timeout=30)
+        response.raise_for_status()
+
+        api_data = response.json()
+        models = {}
+        metadata = {}
+
+        # Process the API response to create model mapping
+        if 'data' not in api_data:
+            raise ValueError("No 'data' field in API response")
+        for model in api_data['data']:
+            model_id = model.get('id', '')
+            if model_id:
+                # Create a prefixed version for LLM registration
+                prefixed_id = f"cerebras-{model_id}"
+                models[prefixed_id] = model_id
+                limits = parse_model_limits(model)
+                if limits:
+                    metadata[model_id] = limits
+        if not models:
+            raise ValueError("No models in API response")
+        cls._remember_metadata(metadata)
+
+        logging.info(f"Successfully fetched {len(models)} models from API")
+        return models
+
     @classmethod
     def get_models(cls, refresh=False):
         """Get models from cache or API."""
@@ -159,17 +424,129 @@ class CerebrasModel(llm.Model):
         # Fetch from API and cache
         models = cls.fetch_models_from_api()
         cls.save_models_to_cache(models)
+        cls._remember_models(models, time.time())
         return models
     
     @classmethod
     def refresh_models(cls):
         """Force refresh models from API."""
         return cls.get_models(refresh=True)
-    
+
+    @classmethod
+    def _remember_models(cls, models, loaded_at):
+        """Store the model map in the process-wide memo."""
+        with _SharedCerebras._models_memo_lock:
+            _SharedCerebras._models_memo = models
+            _SharedCerebras._models_memo_time = loaded_at
+
+    @classmethod
+    def _remember_metadata(cls, metadata):
+        with _SharedCerebras._models_memo_lock:
+            _SharedCerebras._metadata_memo = metadata
+
+    @classmethod
+    def _remember_capability(cls, api_model_id, name, value):
+        """
+        Record something learned about a model, such as whether it accepts
+        json_schema response formats, in the memo and the cache file. A
+        refresh from /models forgets it, so it is detected again daily.
+        """
+        with _SharedCerebras._models_memo_lock:
+            metadata = dict(_SharedCerebras._metadata_memo or {})
+            metadata[api_model_id] = dict(metadata.get(api_model_id) or {}, **{name: value})
+            _SharedCerebras._metadata_memo = metadata
+            models, loaded_at = _SharedCerebras._models_memo, _SharedCerebras._models_memo_time
+        if models:
+            cls.save_models_to_cache(models, metadata, timestamp=loaded_at)
+
+    def _supports(self, name):
+        """Whether the model has not been found to lack a capability."""
+        metadata = _SharedCerebras._metadata_memo or {}
+        return (metadata.get(self.api_model_id) or {}).get(name, True)
+
+    @classmethod
+    def load_models_without_network(cls):
+        """
+        Get models for startup: the cache file even if it has expired, or
+        the bundled DEFAULT_MODELS snapshot when there is no cache. Stale
+        data is marked as such so the first prompt refreshes it in the
+        background, if there is an API key to refresh it with.
+        """
+        models = cls.load_cached_models(allow_stale=True)
+        if not models:
+            models = dict(DEFAULT_MODELS)
+            cls._remember_models(models, 0)
+        return models
+
+    @classmethod
+    def memoized_models(cls):
+        """
+        Get the model map from memory. The cache file is only read the first
+        time and the network is never used; once the memo is older than the
+        cache TTL it keeps being served while a background thread refreshes
+        it.
+        """
+        models = _SharedCerebras._models_memo
+        if models is None:
+            models = cls.load_models_without_network()
+        now = time.time()
+        if (
+            now - _SharedCerebras._models_memo_time > cls._cache_duration
+            and now - _SharedCerebras._refresh_failed_at > REFRESH_RETRY_INTERVAL
+        ):
+            if cls._api_key():
+                cls.refresh_models_in_background()
+            else:
+                # Nothing to fetch /models with; look for a key again later
+                _SharedCerebras._refresh_failed_at = now
+        return models
+
+    @classmethod
+    def refresh_models_in_background(cls):
+        """Start a daemon thread to refresh the model map, unless one is running."""
+        with _SharedCerebras._models_memo_lock:
+            thread = _SharedCerebras._refresh_thread
+            if thread is not None and thread.is_alive():
+                return thread
+            thread = threading.Thread(
+                target=cls._background_refresh, name="cerebras-model-refresh", daemon=True
+            )
+            _SharedCerebras._refresh_thread = thread
+        thread.start()
+        return thread
+
+    @classmethod
+    def _background_refresh(cls):
+        """
+        Refresh the model map from the cache file, if another process has
+        refreshed it, or from the API. If the API cannot be reached, the
+        current map and cache file are kept rather than replaced with the
+        bundled snapshot, and the refresh is tried again later.
+        """
+        try:
+            if cls.load_cached_models():
+                return
+            models = cls._fetch_models_from_api()
+            cls.save_models_to_cache(models)
+            cls._remember_models(models, time.time())
+        except Exception as e:
+            _SharedCerebras._refresh_failed_at = time.time()
+            logging.warning(f"Background model refresh failed, keeping the current models: {e}")
+
     @property
     def model_map(self):
         """Get the current model mapping."""
-        return self.get_models()
+        return self.memoized_models()
+
+    @property
+    def api_model_id(self):
+        """The model id the Cerebras API expects for this model."""
+        return self.model_map.get(self.model_id, self.model_id)
+
+    @property
+    def model_limits(self):
+        """Context window and max output tokens for this model, or None if unknown."""
+        return model_limits(_SharedCerebras._metadata_memo, self.api_model_id)
 
     class Options(llm.Options):
         temperature: Optional[float] = Field(
@@ -192,13 +569,94 @@ class CerebrasModel(llm.Model):
             description="If specified, our system will make a best effort to sample deterministically.",
             default=None,
         )
+        max_retries: Optional[int] = Field(
+            description="How many times to retry rate limited or transiently failing requests.",
+            ge=0,
+            default=3,
+        )
+        max_retry_wait: Optional[float] = Field(
+            description="Maximum total seconds to spend waiting between retries.",
+            ge=0,
+            default=60.0,
+        )
+        stream_flush_interval: Optional[float] = Field(
+            description="Join streamed text into at most one chunk per this many seconds (0 to disable).",
+            ge=0,
+            default=0,
+        )
+        cache: Optional[bool] = Field(
+            description="Reuse cached responses for identical requests (default from LLM_CEREBRAS_CACHE).",
+            default=None,
+        )
+        context_budget: Optional[int] = Field(
+            description="Maximum prompt tokens to send; the oldest conversation turns are dropped to fit.",
+            gt=0,
+            default=None,
+        )
+        dedupe: Optional[bool] = Field(
+            description="Share one API call between identical concurrent requests (default: when temperature is 0 or a seed is set).",
+            default=None,
+        )
+        max_repairs: Optional[int] = Field(
+            description="Times to ask the model to correct a reply that does not match the schema (default 2).",
+            ge=0,
+            default=None,
+        )
+        tool_choice: Optional[str] = Field(
+            description="Whether the model may call tools: auto, none, required, or the name of a tool it must call.",
+            default=None,
+        )
+        native_schema: Optional[bool] = Field(
+            description="Have the API enforce schemas with strict json_schema mode (default: when the model supports it).",
+            default=None,
+        )
+        hedge: Optional[bool] = Field(
+            description="Send a duplicate of a stream whose first token is slow and keep whichever starts first (default from LLM_CEREBRAS_HEDGE).",
+            default=None,
+        )
+        hedge_percentile: Optional[float] = Field(
+            description="Percentile of recent times to first token to wait before hedging (default 95).",
+            ge=50,
+            le=99.9,
+            default=None,
+        )
+        fallback: Optional[str] = Field(
+            description="Comma separated models to use, in order, if this one is overloaded or unavailable.",
+            default=None,
+        )
+        connect_timeout: Optional[float] = Field(
+            description="Seconds to wait for a connection to the API (default 10).",
+            gt=0,
+            default=None,
+        )
+        read_timeout: Optional[float] = Field(
+            description="Seconds to wait for each read of a response, such as the next streamed chunk (default 120).",
+            gt=0,
+            default=None,
+        )
+        timeout: Optional[float] = Field(
+            description="Seconds the whole request may take, retries included, or 0 for no limit (default 600).",
+            ge=0,
+            default=None,
+        )
 
     def __init__(self, model_id):
         self.model_id = model_id
 
-    def execute(self, prompt, stream, response, conversation):
-        messages = self._build_messages(prompt, conversation)
-        api_key = llm.get_key("", "cerebras", "CEREBRAS_API_KEY")
+    def _build_request(self, prompt, stream, conversation):
+        """Build the URL, headers and JSON body for a chat completion."""
+        compiled = native = None
+        if hasattr(prompt, 'schema') and prompt.schema:
+            # Convert llm's concise schema format to JSON Schema if needed
+            compiled = self._compiled_schema(prompt.schema)
+            native = getattr(prompt.options, "native_schema", None)
+            if not isinstance(native, bool):
+                native = self._supports("json_schema") and not self._schema_rejected(compiled)
+        # Schema instructions are part of the system prompt that history is
+        # trimmed to fit alongside
+        instructions = compiled.instructions if compiled is not None and not native else None
+        messages = self._build_messages(prompt, conversation, instructions)
+        api_key = self._api_key()
 
         headers = {
             "Content-Type": "application/json",
@@ -206,7 +664,7 @@ class CerebrasModel(llm.Model):
         }
 
         data = {
-            "model": self.model_map.get(self.model_id, self.model_id),
+            "model": self.api_model_id,
             "messages": messages,
             "stream": stream,
             "temperature": prompt.options.temperature,
@@ -214,97 +672,494 @@ class CerebrasModel(llm.Model):
             "top_p": prompt.options.top_p,
             "seed": prompt.options.seed,
         }
+        if stream:
+            # Ask for a final chunk carrying token usage and timings
+            data["stream_options"] = {"include_usage": True}
+        tools = getattr(prompt, "tools", None)
+        if isinstance(tools, list) and tools:
+            data["tools"] = tool_definitions(tools)
+            choice = getattr(prompt.options, "tool_choice", None)
+            if isinstance(choice, str):
+                data["tool_choice"] = tool_choice(choice)
 
-        # Handle schema using json_object mode
-        if hasattr(prompt, 'schema') and prompt.schema:
-            # Convert llm's concise schema format to JSON Schema if needed
-            schema = self._process_schema(prompt.schema)
-            
-            # First try the native json_schema approach
-            try_native_schema = False  # Set to True to try native schema first
-            
-            if try_native_schema and not stream:  # json_schema doesn't support streaming
-                try:
-                    json_schema_data = data.copy()
-                    json_schema_data["response_format"] = {
-                        "type": "json_schema",
-                        "json_schema": {
-                            "strict": True,
-                            "schema": schema
-                        }
-                    }
-                    
-                    # Try the API with json_schema format
-                    url = f"{self.api_base}/chat/completions"
-                    r = httpx.post(url, json=json_schema_data, headers=headers, timeout=None)
-                    r.raise_for_status()
-                    content = r.json()["choices"][0]["message"]["content"]
-                    yield content
-                    return
-                except httpx.HTTPStatusError:
-                    # If json_schema fails, fall back to json_object with instructions
-                    logging.info("json_schema format not supported yet, falling back to json_object with instructions")
-            
-            # Use json_object mode with schema in system message
-            data["response_format"] = {"type": "json_object"}
-            
-            # Add schema instructions via system message if not already present
-            schema_instructions = self._build_schema_instructions(schema)
-            has_system = any(msg.get("role") == "system" for msg in messages)
-            
-            if not has_system:
-                # Insert system message at the beginning
-                messages.insert(0, {"role": "system", "content": schema_instructions})
-                data["messages"] = messages
+        if compiled is not None:
+            if native:
+                # Constrained decoding: no schema instructions needed
+                data["response_format"] = compiled.response_format()
             else:
-                # Append schema instructions to existing system message
-                for msg in messages:
-                    if msg.get("role") == "system":
-                        msg["content"] = msg["content"] + "\n\n" + schema_instructions
-                        break
-                data["messages"] = messages
+                self._use_json_object(data, compiled)
+
+        # Fail fast on prompts that cannot fit, and keep max_tokens in bounds.
+        # Without known limits the estimate is too rough to reject anything.
+        limits = self.model_limits
+        if limits is not None:
+            try:
+                data["max_tokens"] = plan_max_tokens(
+                    estimate_message_tokens(data["messages"]), data["max_tokens"], limits
+                )
+            except ContextWindowExceeded as e:
+                raise ContextWindowExceeded(f"{e} of {self.model_id}") from None
 
         url = f"{self.api_base}/chat/completions"
+        return url, headers, data
 
-        if stream:
-            with httpx.stream("POST", url, json=data, headers=headers, timeout=None) as r:
-                for line in r.iter_lines():
-                    if line.startswith("data: "):
-                        chunk = line[6:]
-                        if chunk != "[DONE]":
-                            content = json.loads(chunk)["choices"][0]["delta"].get("content")
-                            if content:
-                                yield content
+    def _use_json_object(self, data, compiled):
+        """Request json_object mode, describing the schema in the system message."""
+        data["response_format"] = {"type": "json_object"}
+        self._add_instructions(data["messages"], compiled.instructions)
+
+    @staticmethod
+    def _add_instructions(messages, schema_instructions):
+        """Add schema instructions to the system message, unless it already has them."""
+        has_system = any(msg.get("role") == "system" for msg in messages)
+
+        if not has_system:
+            # Insert system message at the beginning
+            messages.insert(0, {"role": "system", "content": schema_instructions})
         else:
-            r = httpx.post(url, json=data, headers=headers, timeout=None)
-            r.raise_for_status()
-            content = r.json()["choices"][0]["message"]["content"]
-            
-            # If we have a schema, validate the response
-            if hasattr(prompt, 'schema') and prompt.schema and not stream:
-                try:
-                    # Parse the JSON content
-                    json_content = json.loads(content)
-                    # Validate against the schema
-                    schema = self._process_schema(prompt.schema)
-                    self._validate_schema(json_content, schema)
-                    # Return the validated JSON as a string
-                    content = json.dumps(json_content)
-                except (json.JSONDecodeError, ValueError, jsonschema.exceptions.ValidationError) as e:
-                    logging.warning(f"Schema validation failed: {str(e)}")
-                    # Continue with the original content
-            
-            yield content
+            # Append schema instructions to existing system message
+            for index, msg in enumerate(messages):
+                if msg.get("role") == "system":
+                    if schema_instructions not in msg["content"]:
+                        messages[index] = dict(msg, content=msg["content"] + "\n\n" + schema_instructions)
+                    break
+
+    def _schema_rejected(self, compiled):
+        """Whether this model has refused compiled's schema in json_schema mode."""
+        rejected = _SharedCerebras._rejected_schemas
+        if not rejected:
+            return False
+        return (self.api_model_id, schema_key(compiled.response_format()["json_schema"]["schema"])) in rejected
+
+    def _schema_fallback(self, data, r):
+        """
+        If the API rejected a json_schema response format, switch data to
+        json_object mode and return True so the request is sent again. A
+        model that does not support json_schema is remembered as such; a
+        model that only refused this schema is not asked again with it.
+        Errors that do not name the response format are left alone.
+        """
+        response_format = data.get("response_format") or {}
+        if response_format.get("type") != "json_schema":
+            return False
+        rejection = schema_rejection(r)
+        if rejection is None:
+            return False
+        strict = response_format["json_schema"]["schema"]
+        if rejection == "model":
+            logging.info(f"{data['model']} does not support json_schema response format, falling back to json_object")
+            self._remember_capability(data["model"], "json_schema", False)
+        else:
+            logging.info(f"{data['model']} rejected this schema in json_schema mode, falling back to json_object")
+            _SharedCerebras._rejected_schemas.add((data["model"], schema_key(strict)))
+        self._use_json_object(data, self._compiled_schema(strict))
+        return True
+
+    def _retry_state(self, prompt) -> RetryState:
+        """Start tracking retries for one request, using the prompt's options."""
+        policy = RetryPolicy()
+        if prompt.options.max_retries is not None:
+            policy.max_retries = prompt.options.max_retries
+        if prompt.options.max_retry_wait is not None:
+            policy.max_total_wait = prompt.options.max_retry_wait
+        state = RetryState(policy)
+        state.fallbacks = self._fallback_chain(prompt)
+        for name in ("connect_timeout", "read_timeout"):
+            value = getattr(prompt.options, name, None)
+            if isinstance(value, (int, float)):
+                setattr(state, name, value)
+        total = getattr(prompt.options, "timeout", None)
+        if not isinstance(total, (int, float)):
+            total = timeout_settings()["total"]
+        state.deadline = deadline_after(total)
+        return state
+
+    def _fallback_chain(self, prompt) -> List[str]:
+        """
+        API ids of the models to fall back to, from the fallback option or
+        else from the chain configured with `llm cerebras fallback`.
+        """
+        names = getattr(prompt.options, "fallback", None)
+        if isinstance(names, str):
+            names = parse_chain(names)
+        else:
+            chains = configured_fallbacks()
+            names = chains.get(self.model_id) or chains.get(self.api_model_id) or []
+        model_map = self.model_map
+        models = []
+        for name in names:
+            model = api_model_id(name, model_map)
+            if model != self.api_model_id and model not in models:
+                models.append(model)
+        return models
+
+    def _fall_back(self, data, retries, reason):
+        """Switch data to the next model of its fallback chain."""
+        model = retries.fallbacks.pop(0)
+        logging.warning(f"Cerebras model {data['model']} {reason}, falling back to {model}")
+        data["model"] = model
+
+    def _admit(self, data, retries, endpoint):
+        """
+        Check the circuits before an attempt at a request: fail fast if the
+        endpoint itself is failing, and move past failing models of the
+        fallback chain, failing fast if the last of them is failing too.
+        """
+        breaker = get_circuit_breaker()
+        if not breaker.allow(endpoint):
+            raise CircuitOpenError(f"Cerebras API at {endpoint} is failing, retry in {breaker.retry_in(endpoint):.0f}s")
+        while not breaker.allow(data["model"]):
+            if not retries.fallbacks:
+                # A half-open endpoint's probe is not going to be sent
+                breaker.release(endpoint)
+                raise CircuitOpenError(
+                    f"Cerebras model {data['model']} is failing, retry in {breaker.retry_in(data['model']):.0f}s"
+                )
+            self._fall_back(data, retries, "is failing")
+
+    def _record_outcome(self, data, endpoint, started, r=None, error=None):
+        """
+        Tell the circuit breaker how an attempt went. Connection failures and
+        server errors count against the endpoint; server errors, timeouts
+        and answers that the model is unavailable count against the model.
+        """
+        breaker = get_circuit_breaker()
+        latency = time.perf_counter() - started
+        if r is None:
+            breaker.record_failure(endpoint, latency)
+            if isinstance(error, httpx.ReadTimeout):
+                breaker.record_failure(data["model"], latency)
+            return
+        if r.is_success:
+            breaker.record_success(endpoint, latency)
+            breaker.record_success(data["model"], latency)
+            return
+        unavailable = model_unavailable(r)
+        if r.status_code >= 500 and not unavailable:
+            breaker.record_failure(endpoint, latency)
+        else:
+            breaker.record_success(endpoint, latency)
+        if r.status_code >= 500 or unavailable:
+            breaker.record_failure(data["model"], latency)
+        else:
+            breaker.record_success(data["model"], latency)
+
+    def _note_fallback(self, response, requested, data):
+        """Record the model that answered if it is not the one requested."""
+        if data["model"] != requested:
+            response.set_resolved_model(data["model"])
+            self._record(response, fallback={"requested": requested, "model": data["model"]})
+
+    def _hedge_percentile(self, prompt) -> Optional[float]:
+        """The percentile to hedge a streaming prompt at, or None if it is not hedged."""
+        enabled = getattr(prompt.options, "hedge", None)
+        if not isinstance(enabled, bool):
+            enabled = hedging_enabled_by_default()
+        if not enabled:
+            return None
+        percentile = getattr(prompt.options, "hedge_percentile", None)
+        return percentile if isinstance(percentile, (int, float)) else DEFAULT_PERCENTILE
+
+    @staticmethod
+    def _check_deadline(retries):
+        if retries.deadline is not None and time.monotonic() > retries.deadline:
+            raise DeadlineExceeded("Cerebras stream ran past its deadline")
+
+    def _hedge_settled(self, response, timer, model, delay, winner):
+        """Record the outcome of a race between a request and its hedge."""
+        if winner == "hedge":
+            get_hedger().won(model)
+        timer.hedge = "won" if winner == "hedge" else "lost"
+        self._record(response, hedge={"delay_ms": delay * 1000, "winner": winner})
+
+    @staticmethod
+    def _stream_failed(url, data, error):
+        """Tell the circuit breaker that a stream broke off after its response began."""
+        if isinstance(error, DeadlineExceeded):
+            return
+        breaker = get_circuit_breaker()
+        breaker.record_failure(httpx.URL(url).host)
+        if isinstance(error, httpx.ReadTimeout):
+            # The model stalled partway through its reply
+            breaker.record_failure(data["model"])
+
+    @staticmethod
+    def _race_won(attempt, name, data, retries, timer):
+        """Carry on with the request as the winning attempt of a race left it."""
+        data.update(attempt.data)
+        if name == "primary":
+            retries.adopt(attempt.retries)
+        timer.sent = attempt.timer.sent
+        timer.connect_ms = attempt.timer.connect_ms
+
+    def _reconcile_usage(self, data, usage):
+        """Tell the rate limiter how many tokens a request really used."""
+        limiter = get_rate_limiter()
+        # With a key pool, which account's budget to correct is not known here
+        if limiter and usage and not get_key_pool():
+            args = (data["model"], estimate_request_tokens(data), usage.get("total_tokens"))
+            try:
+                loop = asyncio.get_running_loop() if limiter.blocking else None
+            except RuntimeError:
+                loop = None
+            if loop is not None:
+                # Keep the file I/O off the event loop; nothing waits for it
+                loop.run_in_executor(None, limiter.record_usage, *args)
+            else:
+                limiter.record_usage(*args)
+
+    def _finish_request(self, response, retries, timer, error):
+        """Record retries and latency on the response and emit the metrics."""
+        if retries.retries:
+            self._record(response, retries=retries.retries)
+        metrics = timer.finish(error)
+        self._record(response, timing=metrics)
+        emit_metrics(metrics)
+
+    @staticmethod
+    def _record(response, **values):
+        """Add plugin details to the response JSON stored in the logs."""
+        if response.response_json is None:
+            response.response_json = {}
+        response.response_json.update(values)
+
+    def _stream_event_content(self, event, response, data, timer, tool_deltas=None):
+        """
+        Handle one server-sent event, returning its content delta if any.
+        Tool call deltas are collected in tool_deltas.
+        """
+        if event.data == b"[DONE]":
+            return None
+        chunk = event.json()
+        if event.event == "error" or "error" in chunk:
+            raise llm.ModelError(f"Cerebras stream error: {chunk.get('error', chunk)}")
+        if chunk.get("usage") or chunk.get("time_info"):
+            self._record_usage(response, data, chunk, timer)
+        if tool_deltas is not None and chunk.get("choices"):
+            deltas = (chunk["choices"][0].get("delta") or {}).get("tool_calls")
+            if deltas:
+                tool_deltas.add(deltas)
+        return self._chunk_content(chunk)
+
+    def _add_tool_calls(self, response, raw_calls):
+        """Add the tool calls of a reply to the response, keeping them for the cache."""
+        if raw_calls:
+            for tool_call in parse_tool_calls(raw_calls):
+                response.add_tool_call(tool_call)
+            self._record(response, tool_calls=raw_calls)
+
+    @staticmethod
+    def _starts_reply(event):
+        """Whether a streamed event carries the first token, or ends or fails the stream."""
+        if event.data == b"[DONE]" or event.event == "error":
+            return True
+        chunk = event.json()
+        if "error" in chunk:
+            return True
+        choices = chunk.get("choices")
+        delta = (choices[0].get("delta") or {}) if choices else {}
+        return bool(delta.get("content") or delta.get("tool_calls"))
+
+    @staticmethod
+    def _chunk_content(chunk):
+        """The content delta of a streamed chunk; usage-only chunks have no choices."""
+        choices = chunk.get("choices")
+        if choices:
+            return (choices[0].get("delta") or {}).get("content")
+        return None
+
+    def _record_usage(self, response, data, body, timer=None):
+        """
+        Store token usage and Cerebras server timings from a completion, or
+        from the final chunk of a stream, on the response.
+        """
+        usage = body.get("usage")
+        time_info = body.get("time_info")
+        if usage:
+            self._set_usage(response, usage)
+            self._reconcile_usage(data, usage)
+            if timer is not None:
+                timer.output_tokens = usage.get("completion_tokens")
+        if time_info:
+            self._record(response, time_info=time_info)
+
+    def _set_usage(self, response, usage):
+        details = {
+            key: value for key, value in usage.items()
+            if key not in ("prompt_tokens", "completion_tokens", "total_tokens") and value
+        }
+        response.set_usage(
+            input=usage.get("prompt_tokens"),
+            output=usage.get("completion_tokens"),
+            details=details or None,
+        )
+        self._record(response, usage=usage)
+
+    def _cache_lookup(self, prompt, data):
+        """
+        Return (cache, key, entry) when the prompt opted in to the response
+        cache, entry being None on a miss, or (None, None, None) otherwise.
+        """
+        enabled = getattr(prompt.options, "cache", None)
+        if not isinstance(enabled, bool):
+            enabled = cache_enabled_by_default()
+        if not enabled:
+            return None, None, None
+        cache = get_response_cache()
+        key = cache_key(data)
+        try:
+            return cache, key, cache.get(key)
+        except sqlite3.Error as e:
+            logging.warning(f"Cerebras response cache unavailable: {e}")
+            return None, None, None
+
+    def _replay_cached(self, entry, response) -> List[str]:
+        """Restore usage and timings from a cache entry, returning its content chunks."""
+        self._restore_details(response, entry)
+        self._record(response, cached=True)
+        return entry["chunks"]
+
+    def _restore_details(self, response, details):
+        """Copy usage and timings recorded for another response onto this one."""
+        if details.get("usage"):
+            self._set_usage(response, details["usage"])
+        if details.get("time_info"):
+            self._record(response, time_info=details["time_info"])
+        self._add_tool_calls(response, details.get("tool_calls"))
+        fallback = details.get("fallback")
+        if fallback:
+            response.set_resolved_model(fallback["model"])
+            self._record(response, fallback=fallback)
+
+    def _flight_key(self, prompt, data, stream):
+        """
+        Key under which identical concurrent requests share one API call, or
+        None if the request is not deduplicated. By default only
+        deterministic requests are: temperature 0 or a seed.
+        """
+        enabled = getattr(prompt.options, "dedupe", None)
+        if not isinstance(enabled, bool):
+            setting = os.environ.get("LLM_CEREBRAS_DEDUPE", "").lower()
+            if setting:
+                enabled = setting not in ("0", "false", "no", "off")
+            else:
+                # Sampled requests should each get their own answer
+                enabled = data.get("temperature") == 0 or data.get("seed") is not None
+        if not enabled:
+            return None
+        return (cache_key(data), stream)
+
+    def _land_flight(self, registry, key, flight, response, error, completed):
+        """Hand the leader's outcome to any requests that joined its flight."""
+        if error is None and not completed:
+            error = llm.ModelError("Shared Cerebras request was abandoned before it completed")
+        stored = response.response_json or {}
+        details = {name: stored.get(name) for name in ("usage", "time_info", "tool_calls", "fallback")}
+        registry.land(key, flight, details, error)
+
+    def _cache_store(self, cache, key, chunks, response):
+        """Store a completed response; a failure to write never fails the prompt."""
+        stored = response.response_json or {}
+        entry = {"chunks": chunks}
+        entry.update((name, stored.get(name)) for name in ("usage", "time_info", "tool_calls"))
+        try:
+            cache.set(key, entry)
+        except sqlite3.Error as e:
+            logging.warning(f"Failed to cache Cerebras response: {e}")
+
+    def _finalize_content(self, prompt, content):
+        """Validate a complete response against the prompt's schema, if any."""
+        if hasattr(prompt, 'schema') and prompt.schema:
+            try:
+                # Parse the JSON content
+                json_content = json.loads(content)
+                # Validate against the cached, pre-compiled schema
+                self._compiled_schema(prompt.schema).validate(json_content)
+                # Return the validated JSON as a string
+                content = json.dumps(json_content)
+            except (json.JSONDecodeError, ValueError) as e:
+                logging.warning(f"Schema validation failed: {str(e)}")
+                # Continue with the original content
+        return content
+
+    def _max_repairs(self, prompt):
+        if not (hasattr(prompt, 'schema') and prompt.schema):
+            return None
+        max_repairs = getattr(prompt.options, "max_repairs", None)
+        return max_repairs if isinstance(max_repairs, int) else DEFAULT_MAX_REPAIRS
+
+    def _check_json(self, prompt, content, error=None):
+        """
+        Parse and validate a schema reply, applying local fixes if it is not
+        valid JSON. Returns (content, error), error being None if it is valid.
+        """
+        try:
+            value = json.loads(content)
+        except json.JSONDecodeError as e:
+            fixed = local_fix(content)
+            if fixed is None:
+                return content, error or f"Invalid JSON: {e}"
+            logging.info("Fixed invalid JSON locally")
+            content, value = fixed, json.loads(fixed)
+        try:
+            self._compiled_schema(prompt.schema).validate(value)
+        except ValueError as e:
+            return content, str(e)
+        return json.dumps(value), None
+
+    def _attempt_failed(self, prompt, request, content, error, attempt, max_repairs, response, usage):
+        """
+        Finish one attempt at a schema reply. Returns the request for the
+        next attempt, or None when the reply is valid or out of attempts.
+        """
+        if error is None or attempt >= max_repairs:
+            self._record(response, attempts=attempt + 1)
+            if attempt and usage:
+                self._set_usage(response, usage)
+            if error is not None:
+                logging.warning(f"Schema validation failed after {attempt + 1} attempts: {error}")
+            return None
+        logging.info(f"Schema reply was invalid ({error}), asking for a correction")
+        return repair_request(request, content, error)
 
-    def _build_messages(self, prompt, conversation) -> List[dict]:
+    def _finish_items(self, prompt, checker, chunks, response):
+        if checker.valid or checker.invalid:
+            self._record(response, items={"valid": checker.valid, "invalid": checker.invalid})
+        self._finalize_content(prompt, "".join(chunks))
+
+    def _build_messages(self, prompt, conversation, schema_instructions=None) -> List[dict]:
         messages = []
+        system = getattr(prompt, "system", None)
+        if isinstance(system, str) and system:
+            messages.append({"role": "system", "content": system})
+        if schema_instructions:
+            self._add_instructions(messages, schema_instructions)
+        tool_results = getattr(prompt, "tool_results", None)
+        current = tool_result_messages(tool_results) if isinstance(tool_results, list) else []
+        if prompt.prompt or not current:
+            current.append({"role": "user", "content": prompt.prompt})
         if conversation:
-            for response in conversation.responses:
-                messages.extend([
-                    {"role": "user", "content": response.prompt.prompt},
-                    {"role": "assistant", "content": response.text()},
-                ])
-        messages.append({"role": "user", "content": prompt.prompt})
+            # Earlier turns come from the per-conversation cache, which only
+            # converts responses added since the previous turn
+            history, tokens, total = history_cache.history(conversation)
+            # Never send more history than fits the context window, leaving
+            # room for the reply. With unknown limits only context_budget trims.
+            limits = self.model_limits
+            max_tokens = prompt.options.max_tokens if isinstance(prompt.options.max_tokens, int) else None
+            budget = None
+            if limits is not None:
+                budget = limits["context_window"] - (max_tokens or min(OUTPUT_RESERVE, limits["max_output"]))
+            context_budget = getattr(prompt.options, "context_budget", None)
+            if isinstance(context_budget, int):
+                requested = context_budget - (max_tokens or 0)
+                budget = requested if budget is None else min(budget, requested)
+            if budget is not None:
+                budget -= estimate_message_tokens(messages + current)
+                history, dropped = trim_history(history, tokens, total, max(0, budget))
+                if dropped:
+                    logging.info(f"Dropped {dropped} old turns to fit the context budget")
+            messages.extend(history)
+        messages.extend(current)
         return messages
     
     def _process_schema(self, schema) -> Dict[str, Any]:
@@ -406,38 +1261,605 @@ class CerebrasModel(llm.Model):
         """
         Validate the response against the schema.
         """
-        if HAVE_JSONSCHEMA:
+        self._compiled_schema(schema).validate(data)
+        return True
+
+    def _compiled_schema(self, schema) -> CompiledSchema:
+        """
+        Get the processed schema, validator and instructions for a schema
+        from the shared LRU cache, building them on first use.
+        """
+        return schema_cache.get(schema, self._compile_schema)
+
+    def _compile_schema(self, schema) -> CompiledSchema:
+        processed = self._process_schema(schema)
+        return CompiledSchema(
+            processed,
+            compile_validator(processed),
+            self._build_schema_instructions(processed),
+        )
+
+
+class CerebrasModel(_SharedCerebras, llm.Model):
+    def execute(self, prompt, stream, response, conversation):
+        url, headers, data = self._build_request(prompt, stream, conversation)
+        if "tools" in data:
+            run_tool_calls_in_parallel(response)
+        cache, key, entry = self._cache_lookup(prompt, data)
+        if entry is not None:
+            chunks = self._replay_cached(entry, response)
+            yield from (chunks if stream else ["".join(chunks)])
+            return
+        flight_key = self._flight_key(prompt, data, stream)
+        flight = None
+        if flight_key is not None:
+            flight, leader = flights.join(flight_key, threading.get_ident())
+            if not leader:
+                yield from (flight.follow() if stream else ["".join(flight.follow())])
+                self._restore_details(response, flight.details)
+                self._record(response, deduplicated=True)
+                return
+        chunks = []
+        requested = data["model"]
+        retries = self._retry_state(prompt)
+        timer = RequestTimer(data["model"], stream)
+        error = None
+        completed = False
+        try:
+            if stream:
+                deltas = record_chunks(self._stream_content(
+                    url, headers, data, retries, response, timer, self._hedge_percentile(prompt)
+                ), chunks)
+                if hasattr(prompt, 'schema') and prompt.schema:
+                    deltas = self._check_items(prompt, deltas, chunks, response)
+                if flight is not None:
+                    deltas = flight.publish(deltas)
+                yield from coalesce(deltas, prompt.options.stream_flush_interval)
+            else:
+                content = self._complete(prompt, url, headers, data, retries, response, timer)
+                timer.chunk()
+                chunks.append(content)
+                if flight is not None:
+                    flight.append(content)
+                yield content
+            completed = True
+            self._note_fallback(response, requested, data)
+            # Only cache answers from the model that was asked for
+            if cache is not None and data["model"] == requested:
+                self._cache_store(cache, key, chunks, response)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._finish_request(response, retries, timer, error)
+            if flight is not None:
+                self._land_flight(flights, flight_key, flight, response, error, completed)
+
+    def _complete(self, prompt, url, headers, data, retries, response, timer):
+        """
+        Non-streaming completion. Schema replies that are not valid JSON or
+        do not match the schema are fixed locally where possible, or sent
+        back to the model with the errors, up to max_repairs times.
+        """
+        max_repairs = self._max_repairs(prompt)
+        request, usage, attempt = data, None, 0
+        while True:
             try:
-                jsonschema.validate(instance=data, schema=schema)
-                return True
-            except jsonschema.exceptions.ValidationError as e:
-                raise ValueError(f"Schema validation failed: {str(e)}")
-        else:
-            # Basic validation if jsonschema is not available
-            if schema.get("type") == "object" and "properties" in schema:
-                properties = schema.get("properties", {})
-                required = schema.get("required", [])
-                
-                # Check required fields
-                for field in required:
-                    if field not in data:
-                        raise ValueError(f"Required field '{field}' is missing from response")
-                
-                # Check field types (simplified)
-                for field, value in data.items():
-                    if field in properties:
-                        prop_type = properties[field].get("type")
-                        if prop_type == "string" and not isinstance(value, str):
-                            raise ValueError(f"Field '{field}' should be a string")
-                        elif prop_type == "integer" and not isinstance(value, int):
-                            raise ValueError(f"Field '{field}' should be an integer")
-                        elif prop_type == "number" and not isinstance(value, (int, float)):
-                            raise ValueError(f"Field '{field}' should be a number")
-                        elif prop_type == "boolean" and not isinstance(value, bool):
-                            raise ValueError(f"Field '{field}' should be a boolean")
-                        elif prop_type == "array" and not isinstance(value, list):
-                            raise ValueError(f"Field '{field}' should be an array")
-                        elif prop_type == "object" and not isinstance(value, dict):
-                            raise ValueError(f"Field '{field}' should be an object")
-            
-            return True
+                r = self._send(url, headers, request, False, retries, timer)
+            except httpx.HTTPStatusError as e:
+                content = failed_generation(e.response) if max_repairs is not None else None
+                if content is None:
+                    raise
+                error = error_message(e.response)
+            else:
+                completion = r.json()
+                self._record_usage(response, request, completion, timer)
+                usage = add_usage(usage, completion.get("usage"))
+                message = completion["choices"][0]["message"]
+                self._add_tool_calls(response, message.get("tool_calls"))
+                content = message.get("content") or ""
+                error = None
+            if max_repairs is None:
+                return content
+            content, error = self._check_json(prompt, content, error)
+            request = self._attempt_failed(prompt, request, content, error, attempt, max_repairs, response, usage)
+            if request is None:
+                return content
+            attempt += 1
+
+    def _check_items(self, prompt, deltas, chunks, response):
+        """
+        Pass a streamed schema response through, validating each array item
+        as it closes and the whole document at the end.
+        """
+        checker = item_checker(self._compiled_schema(prompt.schema), response)
+        for delta in deltas:
+            checker.feed(delta)
+            yield delta
+        self._finish_items(prompt, checker, chunks, response)
+
+    def _stream_content(self, url, headers, data, retries, response, timer, hedge=None):
+        # A stream that fails before its first token is retried from scratch;
+        # once text has been yielded a retry would duplicate it, so errors
+        # after that point propagate. hedge is the percentile to hedge at.
+        hedger = get_hedger()
+        # One hedge-enabled request, however many attempts it takes
+        hedge_delay = hedger.start(data["model"], hedge) if hedge is not None else None
+        while True:
+            if hedge is not None:
+                try:
+                    r, events = self._race_first_token(url, headers, data, retries, response, timer, hedge_delay)
+                except httpx.TransportError as e:
+                    delay = retries.next_delay()
+                    if delay is None:
+                        raise
+                    logging.info(f"Cerebras stream failed before first token ({e}), retrying in {delay:.2f}s")
+                    time.sleep(delay)
+                    continue
+            else:
+                r = self._send(url, headers, data, True, retries, timer)
+                events = iter_sse(r.iter_bytes())
+            yielded = False
+            tool_deltas = ToolCallDeltas()
+            try:
+                for event in events:
+                    self._check_deadline(retries)
+                    content = self._stream_event_content(event, response, data, timer, tool_deltas)
+                    if content:
+                        if not yielded and hedge is None:
+                            hedger.observe(data["model"], time.perf_counter() - timer.sent)
+                        timer.chunk()
+                        yielded = True
+                        yield content
+                self._add_tool_calls(response, tool_deltas.calls())
+                return
+            except httpx.TransportError as e:
+                self._stream_failed(url, data, e)
+                delay = None if yielded else retries.next_delay()
+                if delay is None:
+                    raise
+                logging.info(f"Cerebras stream failed before first token ({e}), retrying in {delay:.2f}s")
+            finally:
+                r.close()
+            time.sleep(delay)
+
+    def _race_first_token(self, url, headers, data, retries, response, timer, delay):
+        """
+        Send a streaming request and, if it has not started streaming after
+        delay seconds, a duplicate of it, within the hedging budget. Returns
+        the response and events of whichever starts first; the other is
+        cancelled, closing its response.
+        """
+        hedger = get_hedger()
+        model = data["model"]
+        results = queue.Queue()
+
+        def run(name, attempt):
+            r = None
+            try:
+                r = self._send(url, headers, attempt.data, True, attempt.retries, attempt.timer, attempt.cancelled)
+                attempt.opened(r)
+                events = iter_sse(r.iter_bytes())
+                opening = []
+                for event in events:
+                    opening.append(event)
+                    if self._starts_reply(event):
+                        break
+            except Exception as e:
+                if r is not None:
+                    r.close()
+                    if isinstance(e, httpx.TransportError) and not attempt.cancelled.is_set():
+                        self._stream_failed(url, attempt.data, e)
+                results.put((name, None, e))
+                return
+            hedger.observe(model, time.perf_counter() - attempt.timer.sent)
+            results.put((name, (r, itertools.chain(opening, events)), None))
+
+        # Each attempt has its own copy of the request and retries, so the
+        # loser's cannot change what the winner carries on with
+        attempts = {"primary": Attempt(dict(data), retries.fork(), RequestTimer(model, True))}
+        threading.Thread(target=run, args=("primary", attempts["primary"]), name="cerebras-hedge", daemon=True).start()
+        try:
+            name, opened, error = results.get(timeout=delay)
+        except queue.Empty:
+            if hedger.try_hedge(model):
+                logging.info(f"No first token from {model} after {delay:.2f}s, sending a hedge request")
+                # A hedge is a single attempt; the request it duplicates keeps the retries
+                hedge = attempts["hedge"] = Attempt(
+                    dict(data, messages=list(data["messages"])), retries.single_attempt(), RequestTimer(model, True)
+                )
+                threading.Thread(target=run, args=("hedge", hedge), name="cerebras-hedge", daemon=True).start()
+            name, opened, error = results.get()
+        racing = len(attempts)
+        first_error = None
+        while opened is None:
+            first_error = first_error or error
+            racing -= 1
+            if not racing:
+                # The request carries on with what the primary spent
+                retries.adopt(attempts["primary"].retries)
+                raise first_error
+            name, opened, error = results.get()
+        for other, attempt in attempts.items():
+            if other != name:
+                attempt.cancel()
+        self._race_won(attempts[name], name, data, retries, timer)
+        if len(attempts) > 1:
+            self._hedge_settled(response, timer, model, delay, name)
+        return opened
+
+    def _send(self, url, headers, data, stream, retries, timer, cancelled=None):
+        """
+        POST to the API, retrying 429s, transient 5xx responses and
+        connection errors with backoff. Streaming responses are returned
+        open and must be closed by the caller. Setting the cancelled event
+        stops the retries with AttemptCancelled.
+        """
+        client = get_client()
+        limiter = get_rate_limiter()
+        pool = get_key_pool()
+        estimate = estimate_request_tokens(data)
+        endpoint = httpx.URL(url).host
+        while True:
+            if cancelled is not None and cancelled.is_set():
+                raise AttemptCancelled()
+            self._admit(data, retries, endpoint)
+            key = None
+            limit_key = data["model"]
+            if pool:
+                key = pool.acquire(data["model"])
+                headers = dict(headers, Authorization=f"Bearer {key.key}")
+                # Each account has rate limits of its own
+                limit_key = f"{data['model']}@{key.id}"
+            if limiter:
+                limiter.acquire(limit_key, estimate)
+            if cancelled is not None and cancelled.is_set():
+                # Called off during the rate limit wait
+                if key is not None:
+                    pool.release(key)
+                raise AttemptCancelled()
+            timeout = attempt_timeout(retries.connect_timeout, retries.read_timeout, retries.deadline)
+            started = timer.sent = time.perf_counter()
+            try:
+                extensions = {"trace": timer.trace}
+                if stream:
+                    request = client.build_request(
+                        "POST", url, json=data, headers=headers, timeout=timeout, extensions=extensions
+                    )
+                    r = client.send(request, stream=True)
+                else:
+                    r = client.post(url, json=data, headers=headers, timeout=timeout, extensions=extensions)
+            except httpx.TransportError as e:
+                if key is not None:
+                    pool.release(key)
+                self._record_outcome(data, endpoint, started, error=e)
+                delay = retries.next_delay()
+                if delay is None:
+                    raise
+                logging.info(f"Cerebras request failed ({e}), retrying in {delay:.2f}s")
+            else:
+                if key is not None:
+                    pool.release(key, r.status_code, r.headers)
+                if limiter:
+                    limiter.update_from_headers(limit_key, r.headers)
+                if r.is_success:
+                    self._record_outcome(data, endpoint, started, r)
+                    return r
+                if stream:
+                    # Read the error body, which says what went wrong
+                    r.read()
+                self._record_outcome(data, endpoint, started, r)
+                if self._schema_fallback(data, r):
+                    r.close()
+                    continue
+                if retries.fallbacks and model_unavailable(r):
+                    r.close()
+                    self._fall_back(data, retries, f"returned {r.status_code}")
+                    continue
+                if (
+                    key is not None and r.status_code in (401, 403, 429)
+                    and pool.has_healthy() and retries.retry_now()
+                ):
+                    # Another account may still accept the request, and the
+                    # rejected key sits out, so try it without waiting
+                    r.close()
+                    logging.info(f"Cerebras returned {r.status_code}, trying another key")
+                    continue
+                delay = retries.next_delay(r) if is_retryable_status(r.status_code) else None
+                if delay is None:
+                    if stream:
+                        r.close()
+                    r.raise_for_status()
+                    return r
+                r.close()
+                logging.info(f"Cerebras returned {r.status_code}, retrying in {delay:.2f}s")
+            if cancelled is None:
+                time.sleep(delay)
+            elif cancelled.wait(delay):
+                raise AttemptCancelled()
+
+
+class AsyncCerebrasModel(_SharedCerebras, llm.AsyncModel):
+    async def execute(self, prompt, stream, response, conversation):
+        url, headers, data = self._build_request(prompt, stream, conversation)
+        cache, key, entry = self._cache_lookup(prompt, data)
+        if entry is not None:
+            chunks = self._replay_cached(entry, response)
+            for content in (chunks if stream else ["".join(chunks)]):
+                yield content
+            return
+        flight_key = self._flight_key(prompt, data, stream)
+        flight = None
+        if flight_key is not None:
+            # Async flights are shared between the coroutines of one event loop
+            flight_key = (id(asyncio.get_running_loop()),) + flight_key
+            flight, leader = async_flights.join(flight_key, asyncio.current_task())
+            if not leader:
+                if stream:
+                    async for content in flight.afollow():
+                        yield content
+                else:
+                    yield "".join([content async for content in flight.afollow()])
+                self._restore_details(response, flight.details)
+                self._record(response, deduplicated=True)
+                return
+        chunks = []
+        requested = data["model"]
+        retries = self._retry_state(prompt)
+        timer = RequestTimer(data["model"], stream)
+        error = None
+        completed = False
+        try:
+            if stream:
+                deltas = arecord_chunks(self._stream_content(
+                    url, headers, data, retries, response, timer, self._hedge_percentile(prompt)
+                ), chunks)
+                if hasattr(prompt, 'schema') and prompt.schema:
+                    deltas = self._acheck_items(prompt, deltas, chunks, response)
+                if flight is not None:
+                    deltas = flight.apublish(deltas)
+                async for content in acoalesce(deltas, prompt.options.stream_flush_interval):
+                    yield content
+            else:
+                content = await self._complete(prompt, url, headers, data, retries, response, timer)
+                timer.chunk()
+                chunks.append(content)
+                if flight is not None:
+                    flight.append(content)
+                yield content
+            completed = True
+            self._note_fallback(response, requested, data)
+            # Only cache answers from the model that was asked for
+            if cache is not None and data["model"] == requested:
+                self._cache_store(cache, key, chunks, response)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._finish_request(response, retries, timer, error)
+            if flight is not None:
+                self._land_flight(async_flights, flight_key, flight, response, error, completed)
+
+    async def _complete(self, prompt, url, headers, data, retries, response, timer):
+        """Async counterpart of CerebrasModel._complete."""
+        max_repairs = self._max_repairs(prompt)
+        request, usage, attempt = data, None, 0
+        while True:
+            try:
+                r = await self._send(url, headers, request, False, retries, timer)
+            except httpx.HTTPStatusError as e:
+                content = failed_generation(e.response) if max_repairs is not None else None
+                if content is None:
+                    raise
+                error = error_message(e.response)
+            else:
+                completion = r.json()
+                self._record_usage(response, request, completion, timer)
+                usage = add_usage(usage, completion.get("usage"))
+                message = completion["choices"][0]["message"]
+                self._add_tool_calls(response, message.get("tool_calls"))
+                content = message.get("content") or ""
+                error = None
+            if max_repairs is None:
+                return content
+            content, error = self._check_json(prompt, content, error)
+            request = self._attempt_failed(prompt, request, content, error, attempt, max_repairs, response, usage)
+            if request is None:
+                return content
+            attempt += 1
+
+    async def _acheck_items(self, prompt, deltas, chunks, response):
+        checker = item_checker(self._compiled_schema(prompt.schema), response)
+        async for delta in deltas:
+            checker.feed(delta)
+            yield delta
+        self._finish_items(prompt, checker, chunks, response)
+
+    async def _stream_content(self, url, headers, data, retries, response, timer, hedge=None):
+        hedger = get_hedger()
+        # One hedge-enabled request, however many attempts it takes
+        hedge_delay = hedger.start(data["model"], hedge) if hedge is not None else None
+        while True:
+            if hedge is not None:
+                try:
+                    r, events = await self._race_first_token(url, headers, data, retries, response, timer, hedge_delay)
+                except httpx.TransportError as e:
+                    delay = retries.next_delay()
+                    if delay is None:
+                        raise
+                    logging.info(f"Cerebras stream failed before first token ({e}), retrying in {delay:.2f}s")
+                    await asyncio.sleep(delay)
+                    continue
+            else:
+                r = await self._send(url, headers, data, True, retries, timer)
+                events = aiter_sse(r.aiter_bytes())
+            yielded = False
+            tool_deltas = ToolCallDeltas()
+            try:
+                async for event in events:
+                    self._check_deadline(retries)
+                    content = self._stream_event_content(event, response, data, timer, tool_deltas)
+                    if content:
+                        if not yielded and hedge is None:
+                            hedger.observe(data["model"], time.perf_counter() - timer.sent)
+                        timer.chunk()
+                        yielded = True
+                        yield content
+                self._add_tool_calls(response, tool_deltas.calls())
+                return
+            except httpx.TransportError as e:
+                self._stream_failed(url, data, e)
+                delay = None if yielded else retries.next_delay()
+                if delay is None:
+                    raise
+                logging.info(f"Cerebras stream failed before first token ({e}), retrying in {delay:.2f}s")
+            finally:
+                await r.aclose()
+            await asyncio.sleep(delay)
+
+    async def _race_first_token(self, url, headers, data, retries, response, timer, delay):
+        """Async counterpart of CerebrasModel._race_first_token; the loser's task is cancelled."""
+        hedger = get_hedger()
+        model = data["model"]
+
+        async def run(attempt):
+            r = await self._send(url, headers, attempt.data, True, attempt.retries, attempt.timer)
+            try:
+                events = aiter_sse(r.aiter_bytes())
+                opening = []
+                async for event in events:
+                    opening.append(event)
+                    if self._starts_reply(event):
+                        break
+            except BaseException as e:
+                await r.aclose()
+                if isinstance(e, httpx.TransportError):
+                    self._stream_failed(url, attempt.data, e)
+                raise
+            hedger.observe(model, time.perf_counter() - attempt.timer.sent)
+            return r, self._chain_events(opening, events)
+
+        # Losers are cancelled at once, so only the request body and timer
+        # need to be the attempt's own
+        attempts = {"primary": Attempt(dict(data), retries, RequestTimer(model, True))}
+        primary = asyncio.ensure_future(run(attempts["primary"]))
+        names = {primary: "primary"}
+        pending = {primary}
+        winner = first_error = None
+        try:
+            done, _ = await asyncio.wait(pending, timeout=delay)
+            if not done and hedger.try_hedge(model):
+                logging.info(f"No first token from {model} after {delay:.2f}s, sending a hedge request")
+                attempts["hedge"] = Attempt(
+                    dict(data, messages=list(data["messages"])), retries.single_attempt(), RequestTimer(model, True)
+                )
+                hedge = asyncio.ensure_future(run(attempts["hedge"]))
+                names[hedge] = "hedge"
+                pending.add(hedge)
+            while winner is None and pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in sorted(done, key=list(names).index):
+                    if task.exception() is not None:
+                        first_error = first_error or task.exception()
+                    elif winner is None:
+                        winner = task
+                    else:
+                        await task.result()[0].aclose()
+        finally:
+            for task in pending:
+                task.cancel()
+        if winner is None:
+            raise first_error
+        name = names[winner]
+        self._race_won(attempts[name], name, data, retries, timer)
+        if len(names) > 1:
+            self._hedge_settled(response, timer, model, delay, name)
+        return winner.result()
+
+    @staticmethod
+    async def _chain_events(opening, events):
+        for event in opening:
+            yield event
+        async for event in events:
+            yield event
+
+    @staticmethod
+    async def _off_loop(blocking, fn, *args):
+        """Call fn, in a worker thread if it does file I/O, so the event loop is not held up."""
+        if blocking:
+            return await asyncio.to_thread(fn, *args)
+        return fn(*args)
+
+    async def _send(self, url, headers, data, stream, retries, timer):
+        """Async counterpart of CerebrasModel._send."""
+        client = get_async_client()
+        limiter = get_rate_limiter()
+        pool = get_key_pool()
+        estimate = estimate_request_tokens(data)
+        endpoint = httpx.URL(url).host
+        while True:
+            self._admit(data, retries, endpoint)
+            key = None
+            limit_key = data["model"]
+            if pool:
+                key = await self._off_loop(pool.blocking, pool.acquire, data["model"])
+                headers = dict(headers, Authorization=f"Bearer {key.key}")
+                # Each account has rate limits of its own
+                limit_key = f"{data['model']}@{key.id}"
+            if limiter:
+                await limiter.acquire_async(limit_key, estimate)
+            timeout = attempt_timeout(retries.connect_timeout, retries.read_timeout, retries.deadline)
+            started = timer.sent = time.perf_counter()
+            try:
+                extensions = {"trace": timer.atrace}
+                if stream:
+                    request = client.build_request(
+                        "POST", url, json=data, headers=headers, timeout=timeout, extensions=extensions
+                    )
+                    r = await client.send(request, stream=True)
+                else:
+                    r = await client.post(url, json=data, headers=headers, timeout=timeout, extensions=extensions)
+            except httpx.TransportError as e:
+                if key is not None:
+                    await self._off_loop(pool.blocking, pool.release, key)
+                self._record_outcome(data, endpoint, started, error=e)
+                delay = retries.next_delay()
+                if delay is None:
+                    raise
+                logging.info(f"Cerebras request failed ({e}), retrying in {delay:.2f}s")
+            else:
+                if key is not None:
+                    await self._off_loop(pool.blocking, pool.release, key, r.status_code, r.headers)
+                if limiter:
+                    await self._off_loop(limiter.blocking, limiter.update_from_headers, limit_key, r.headers)
+                if r.is_success:
+                    self._record_outcome(data, endpoint, started, r)
+                    return r
+                if stream:
+                    await r.aread()
+                self._record_outcome(data, endpoint, started, r)
+                if self._schema_fallback(data, r):
+                    await r.aclose()
+                    continue
+                if retries.fallbacks and model_unavailable(r):
+                    await r.aclose()
+                    self._fall_back(data, retries, f"returned {r.status_code}")
+                    continue
+                if (
+                    key is not None and r.status_code in (401, 403, 429)
+                    and pool.has_healthy() and retries.retry_now()
+                ):
+                    # Another account may still accept the request, and the
+                    # rejected key sits out, so try it without waiting
+                    await r.aclose()
+                    logging.info(f"Cerebras returned {r.status_code}, trying another key")
+                    continue
+                delay = retries.next_delay(r) if is_retryable_status(r.status_code) else None
+                if delay is None:
+                    if stream:
+                        await r.aclose()
+                    r.raise_for_status()
+                    return r
+                await r.aclose()
+                logging.info(f"Cerebras returned {r.status_code}, retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
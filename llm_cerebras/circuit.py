@@ -0,0 +1,207 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+import llm
+
+from .metrics import _percentile
+
+# A circuit opens after this many failures in a row, or when at least
+# MIN_CALLS outcomes in the last WINDOW seconds include FAILURE_RATE of
+# failures and calls slower than SLOW_CALL seconds
+FAILURE_THRESHOLD = 5
+WINDOW = 60.0
+MIN_CALLS = 10
+FAILURE_RATE = 0.5
+SLOW_CALL = 30.0
+
+# Seconds an open circuit stays open, and requests let through to probe it
+# once that time has passed
+RESET_TIMEOUT = 30.0
+HALF_OPEN_PROBES = 1
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitOpenError(llm.ModelError):
+    """Raised instead of sending a request to an endpoint or model that is failing."""
+
+
+class _Circuit:
+    __slots__ = ("outcomes", "failures", "opened_at", "probes")
+
+    def __init__(self):
+        # (time, failed, latency in seconds or None) for recent calls
+        self.outcomes = deque(maxlen=1000)
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probes = 0
+
+
+class CircuitBreaker:
+    """
+    Tracks the health of endpoints and models, so that requests skip or
+    fail fast on those that are failing instead of finding out again each
+    time. A circuit opens after failure_threshold failures in a row, or
+    when failures and slow calls make up failure_rate of the calls in the
+    last window seconds. Once reset_timeout has passed it is half-open:
+    half_open_probes requests are let through, and their outcome closes
+    the circuit or opens it for another reset_timeout.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = FAILURE_THRESHOLD,
+        reset_timeout: float = RESET_TIMEOUT,
+        window: float = WINDOW,
+        min_calls: int = MIN_CALLS,
+        failure_rate: float = FAILURE_RATE,
+        slow_call: float = SLOW_CALL,
+        half_open_probes: int = HALF_OPEN_PROBES,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call = slow_call
+        self.half_open_probes = half_open_probes
+        self._lock = threading.Lock()
+        self._circuits: Dict[str, _Circuit] = {}
+
+    def _state(self, circuit: Optional[_Circuit], now: float) -> str:
+        if circuit is None or circuit.opened_at is None:
+            return CLOSED
+        if now - circuit.opened_at < self.reset_timeout:
+            return OPEN
+        return HALF_OPEN
+
+    def _bad(self, outcome) -> bool:
+        _, failed, latency = outcome
+        return failed or (latency is not None and latency > self.slow_call)
+
+    def _prune(self, circuit: _Circuit, now: float):
+        while circuit.outcomes and now - circuit.outcomes[0][0] > self.window:
+            circuit.outcomes.popleft()
+
+    def _open(self, circuit: _Circuit, now: float):
+        circuit.opened_at = now
+        circuit.probes = 0
+
+    def state(self, name: str) -> str:
+        with self._lock:
+            return self._state(self._circuits.get(name), time.monotonic())
+
+    def retry_in(self, name: str) -> float:
+        """Seconds until an open circuit next lets a probe through."""
+        with self._lock:
+            circuit = self._circuits.get(name)
+            if circuit is None or circuit.opened_at is None:
+                return 0.0
+            return max(0.0, circuit.opened_at + self.reset_timeout - time.monotonic())
+
+    def allow(self, name: str) -> bool:
+        """Whether a request to name may go ahead; a half-open circuit admits its probes."""
+        now = time.monotonic()
+        with self._lock:
+            circuit = self._circuits.get(name)
+            state = self._state(circuit, now)
+            if state != HALF_OPEN:
+                return state == CLOSED
+            if circuit.probes >= self.half_open_probes:
+                # Probes that never reported back are given up on after
+                # another reset_timeout
+                self._open(circuit, now)
+                return False
+            circuit.probes += 1
+            return True
+
+    def release(self, name: str):
+        """Give back a probe that allow() admitted for a request that was never sent."""
+        with self._lock:
+            circuit = self._circuits.get(name)
+            if circuit is not None and circuit.probes:
+                circuit.probes -= 1
+
+    def record_success(self, name: str, latency: Optional[float] = None):
+        now = time.monotonic()
+        with self._lock:
+            circuit = self._circuits.get(name)
+            if circuit is None:
+                circuit = self._circuits[name] = _Circuit()
+            elif circuit.opened_at is not None:
+                # A probe got through: start afresh
+                circuit = self._circuits[name] = _Circuit()
+            circuit.failures = 0
+            circuit.outcomes.append((now, False, latency))
+            self._evaluate(circuit, now)
+
+    def record_failure(self, name: str, latency: Optional[float] = None):
+        now = time.monotonic()
+        with self._lock:
+            circuit = self._circuits.setdefault(name, _Circuit())
+            circuit.failures += 1
+            circuit.outcomes.append((now, True, latency))
+            if circuit.opened_at is not None or circuit.failures >= self.failure_threshold:
+                self._open(circuit, now)
+            else:
+                self._evaluate(circuit, now)
+
+    def _evaluate(self, circuit: _Circuit, now: float):
+        """Open a closed circuit whose recent calls have gone bad too often."""
+        self._prune(circuit, now)
+        calls = len(circuit.outcomes)
+        if circuit.opened_at is None and calls >= self.min_calls:
+            if sum(self._bad(outcome) for outcome in circuit.outcomes) / calls >= self.failure_rate:
+                self._open(circuit, now)
+
+    def states(self) -> Dict[str, str]:
+        """The state of every circuit that is not closed."""
+        now = time.monotonic()
+        with self._lock:
+            states = {name: self._state(circuit, now) for name, circuit in self._circuits.items()}
+        return {name: state for name, state in states.items() if state != CLOSED}
+
+    def health(self) -> Dict[str, Dict[str, Any]]:
+        """State, recent calls, failure and slow call rates, and latency per circuit."""
+        now = time.monotonic()
+        report = {}
+        with self._lock:
+            for name, circuit in self._circuits.items():
+                self._prune(circuit, now)
+                outcomes = list(circuit.outcomes)
+                latencies = sorted(latency for _, _, latency in outcomes if latency is not None)
+                report[name] = {
+                    "state": self._state(circuit, now),
+                    "calls": len(outcomes),
+                    "failure_rate": sum(failed for _, failed, _ in outcomes) / len(outcomes) if outcomes else None,
+                    "slow_rate": (
+                        sum(latency > self.slow_call for latency in latencies) / len(outcomes) if outcomes else None
+                    ),
+                    "latency_p50_ms": _percentile(latencies, 0.5) * 1000 if latencies else None,
+                    "latency_p99_ms": _percentile(latencies, 0.99) * 1000 if latencies else None,
+                }
+        return report
+
+
+_circuit_breaker = None
+_circuit_breaker_lock = threading.Lock()
+
+
+def get_circuit_breaker() -> CircuitBreaker:
+    """The process-wide circuit breaker."""
+    global _circuit_breaker
+    with _circuit_breaker_lock:
+        if _circuit_breaker is None:
+            _circuit_breaker = CircuitBreaker()
+        return _circuit_breaker
+
+
+def set_circuit_breaker(breaker: Optional[CircuitBreaker]):
+    """Replace the process-wide circuit breaker; None creates a new one on next use."""
+    global _circuit_breaker
+    with _circuit_breaker_lock:
+        _circuit_breaker = breaker
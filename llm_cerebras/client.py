@@ -0,0 +1,231 @@
+import asyncio
+import atexit
+import importlib.util
+import os
+import threading
+import time
+import weakref
+from typing import Optional
+
+import httpx
+
+# Pool defaults, overridable through the environment or configure_client()
+DEFAULT_MAX_CONNECTIONS = 100
+DEFAULT_MAX_KEEPALIVE_CONNECTIONS = 20
+DEFAULT_KEEPALIVE_EXPIRY = 30.0
+
+# Seconds to wait for a connection, and for each read from it, and for a
+# whole request including its retries (0 for no overall deadline)
+DEFAULT_CONNECT_TIMEOUT = 10.0
+DEFAULT_READ_TIMEOUT = 120.0
+DEFAULT_TOTAL_TIMEOUT = 600.0
+
+_client: Optional[httpx.Client] = None
+_client_lock = threading.Lock()
+_client_settings = {}
+
+# httpx.AsyncClient connections are bound to the event loop that opened
+# them, so async clients are shared per loop rather than per process. Each
+# is kept with an async generator that closes it, so that
+# loop.shutdown_asyncgens(), which asyncio.run() calls before closing the
+# loop, releases its connections.
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _env_number(name, default, cast):
+    value = os.environ.get(name)
+    if value in (None, ""):
+        return default
+    try:
+        return cast(value)
+    except ValueError:
+        return default
+
+
+def _http2_available() -> bool:
+    """HTTP/2 support in httpx needs the optional h2 package."""
+    return importlib.util.find_spec("h2") is not None
+
+
+def client_settings() -> dict:
+    """Resolve the pool settings used when the shared client is created."""
+    http2_env = os.environ.get("LLM_CEREBRAS_HTTP2", "1").lower()
+    settings = {
+        "max_connections": _env_number(
+            "LLM_CEREBRAS_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS, int
+        ),
+        "max_keepalive_connections": _env_number(
+            "LLM_CEREBRAS_MAX_KEEPALIVE_CONNECTIONS",
+            DEFAULT_MAX_KEEPALIVE_CONNECTIONS,
+            int,
+        ),
+        "keepalive_expiry": _env_number(
+            "LLM_CEREBRAS_KEEPALIVE_EXPIRY", DEFAULT_KEEPALIVE_EXPIRY, float
+        ),
+        "http2": http2_env not in ("0", "false", "no") and _http2_available(),
+    }
+    settings.update(_client_settings)
+    return settings
+
+
+def timeout_settings() -> dict:
+    """Timeout defaults, from the environment."""
+    return {
+        "connect": _env_number("LLM_CEREBRAS_CONNECT_TIMEOUT", DEFAULT_CONNECT_TIMEOUT, float),
+        "read": _env_number("LLM_CEREBRAS_READ_TIMEOUT", DEFAULT_READ_TIMEOUT, float),
+        "total": _env_number("LLM_CEREBRAS_TIMEOUT", DEFAULT_TOTAL_TIMEOUT, float),
+    }
+
+
+class DeadlineExceeded(httpx.TimeoutException):
+    """A request ran past its overall deadline."""
+
+
+def deadline_after(seconds: Optional[float]) -> Optional[float]:
+    """The time.monotonic() deadline that many seconds from now; None or 0 for none."""
+    return time.monotonic() + seconds if seconds else None
+
+
+def attempt_timeout(
+    connect: Optional[float] = None, read: Optional[float] = None, deadline: Optional[float] = None
+) -> httpx.Timeout:
+    """
+    Timeouts for one attempt at a request, cut short to what is left before
+    its deadline. Raises DeadlineExceeded once the deadline has passed.
+    """
+    defaults = timeout_settings()
+    connect = defaults["connect"] if connect is None else connect
+    read = defaults["read"] if read is None else read
+    if deadline is not None:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise DeadlineExceeded("Cerebras request ran past its deadline")
+        connect, read = min(connect, remaining), min(read, remaining)
+    # Writing the request body is bounded like a read; waiting for a pooled
+    # connection like connecting
+    return httpx.Timeout(connect=connect, read=read, write=read, pool=connect)
+
+
+def _client_kwargs() -> dict:
+    settings = client_settings()
+    return {
+        "http2": settings["http2"],
+        "limits": httpx.Limits(
+            max_connections=settings["max_connections"],
+            max_keepalive_connections=settings["max_keepalive_connections"],
+            keepalive_expiry=settings["keepalive_expiry"],
+        ),
+        "timeout": attempt_timeout(),
+    }
+
+
+def get_client() -> httpx.Client:
+    """Return the process-wide pooled client, creating it on first use."""
+    global _client
+    client = _client
+    if client is not None and not client.is_closed:
+        return client
+    with _client_lock:
+        if _client is None or _client.is_closed:
+            _client = httpx.Client(**_client_kwargs())
+        return _client
+
+
+async def _closed_with_loop(client: httpx.AsyncClient):
+    try:
+        yield
+    finally:
+        await client.aclose()
+
+
+def _close_with_loop(client: httpx.AsyncClient):
+    """Have the running loop close client when it shuts down its async generators."""
+    closer = _closed_with_loop(client)
+    try:
+        # Running it to its yield registers it with the loop
+        closer.asend(None).send(None)
+    except StopIteration:
+        pass
+    return closer
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Return the pooled async client shared by the running event loop."""
+    loop = asyncio.get_running_loop()
+    entry = _async_clients.get(loop)
+    if entry is None or entry[0].is_closed:
+        client = httpx.AsyncClient(**_client_kwargs())
+        entry = _async_clients[loop] = (client, _close_with_loop(client))
+    return entry[0]
+
+
+async def aclose_async_client():
+    """Close the running event loop's async client, if it has one."""
+    entry = _async_clients.pop(asyncio.get_running_loop(), None)
+    if entry is not None:
+        await entry[1].aclose()
+
+
+def _discard_async_client(loop, client: httpx.AsyncClient):
+    """
+    Close an async client that is no longer shared, on the loop its
+    connections belong to: scheduled there if that loop is running, or run
+    to completion if it is idle. A closed loop already closed it.
+    """
+    if loop.is_closed() or client.is_closed:
+        return
+    try:
+        if not loop.is_running():
+            loop.run_until_complete(client.aclose())
+            return
+        try:
+            current = asyncio.get_running_loop()
+        except RuntimeError:
+            current = None
+        if current is loop:
+            loop.create_task(client.aclose())
+        else:
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+    except RuntimeError:
+        # Another loop is running in this thread; the client is still
+        # closed when its own loop shuts down
+        pass
+
+
+def configure_client(
+    max_connections: Optional[int] = None,
+    max_keepalive_connections: Optional[int] = None,
+    keepalive_expiry: Optional[float] = None,
+    http2: Optional[bool] = None,
+):
+    """
+    Override the pool settings. The current sync and async clients, if
+    any, are closed so the next request picks up the new limits.
+    """
+    overrides = {
+        "max_connections": max_connections,
+        "max_keepalive_connections": max_keepalive_connections,
+        "keepalive_expiry": keepalive_expiry,
+        "http2": (http2 and _http2_available()) if http2 is not None else None,
+    }
+    with _client_lock:
+        _client_settings.update(
+            {key: value for key, value in overrides.items() if value is not None}
+        )
+    dropped = list(_async_clients.items())
+    _async_clients.clear()
+    for loop, (client, _) in dropped:
+        _discard_async_client(loop, client)
+    close_client()
+
+
+def close_client():
+    """Close the shared client and release its pooled connections."""
+    global _client
+    with _client_lock:
+        client, _client = _client, None
+    if client is not None:
+        client.close()
+
+
+atexit.register(close_client)
@@ -0,0 +1,103 @@
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import llm
+
+# Status codes that say the model itself cannot serve requests right now:
+# removed or renamed, or overloaded
+UNAVAILABLE_STATUS_CODES = frozenset({404, 503})
+
+
+def fallbacks_path() -> Path:
+    return llm.user_dir() / "cerebras_fallbacks.json"
+
+
+def load_fallbacks(path=None) -> Dict[str, List[str]]:
+    """The configured fallback chains, by model."""
+    path = Path(path) if path else fallbacks_path()
+    try:
+        chains = json.loads(path.read_text())
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logging.warning(f"Failed to load Cerebras fallbacks from {path}: {e}")
+        return {}
+    return {model: list(chain) for model, chain in chains.items() if isinstance(chain, list)}
+
+
+def save_fallbacks(chains: Dict[str, List[str]], path=None):
+    path = Path(path) if path else fallbacks_path()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps(chains, indent=2))
+    os.replace(tmp_path, path)
+    forget_fallbacks()
+
+
+# Path, modification time and contents of the fallbacks file as last read
+_configured: Optional[Tuple[Path, Optional[int], Dict[str, List[str]]]] = None
+_configured_lock = threading.Lock()
+
+
+def configured_fallbacks() -> Dict[str, List[str]]:
+    """
+    The configured fallback chains, read once per process and again only
+    when the file changes. Callers must not modify the result.
+    """
+    global _configured
+    with _configured_lock:
+        path = _configured[0] if _configured else fallbacks_path()
+        try:
+            mtime = path.stat().st_mtime_ns
+        except OSError:
+            mtime = None
+        if _configured is None or _configured[1] != mtime:
+            _configured = (path, mtime, load_fallbacks(path))
+        return _configured[2]
+
+
+def forget_fallbacks():
+    """Read the fallbacks file again on next use."""
+    global _configured
+    with _configured_lock:
+        _configured = None
+
+
+def parse_chain(value: str) -> List[str]:
+    """Models from a comma separated list."""
+    return [model.strip() for model in value.split(",") if model.strip()]
+
+
+def api_model_id(name: str, model_map: Dict[str, str]) -> str:
+    """The API id for a model given by its llm id (cerebras-...) or API id."""
+    if name in model_map:
+        return model_map[name]
+    return name[len("cerebras-"):] if name.startswith("cerebras-") else name
+
+
+def model_unavailable(r: httpx.Response) -> bool:
+    """
+    Whether an error response means the model cannot take requests at all,
+    rather than that this one request was bad or over a rate limit.
+    """
+    if r.status_code in UNAVAILABLE_STATUS_CODES:
+        return True
+    if r.status_code not in (400, 429):
+        return False
+    try:
+        body = r.json()
+    except ValueError:
+        return False
+    error = body.get("error", body) if isinstance(body, dict) else {}
+    if not isinstance(error, dict):
+        return False
+    code = str(error.get("code") or error.get("type") or "")
+    if r.status_code == 429:
+        # Requests queued for the model, not our rate limit, are full
+        return "queue" in code or "queue" in str(error.get("message") or "").lower()
+    return code == "model_not_found"
@@ -0,0 +1,169 @@
+import os
+import threading
+from collections import deque
+from typing import Any, Dict, Optional
+
+from .metrics import _percentile
+
+# Percentile of recent times to first token after which a duplicate
+# request is sent, and the largest fraction of requests that may get one
+DEFAULT_PERCENTILE = 95.0
+DEFAULT_BUDGET = 0.1
+
+# Times to first token kept per model, and how many are needed before the
+# percentile is trusted enough to hedge on
+WINDOW = 200
+MIN_SAMPLES = 20
+
+
+def hedging_enabled_by_default() -> bool:
+    return os.environ.get("LLM_CEREBRAS_HEDGE", "").lower() in ("1", "true", "yes", "on")
+
+
+def _budget_from_env() -> float:
+    try:
+        return min(1.0, max(0.0, float(os.environ.get("LLM_CEREBRAS_HEDGE_BUDGET", DEFAULT_BUDGET))))
+    except ValueError:
+        return DEFAULT_BUDGET
+
+
+class AttemptCancelled(Exception):
+    """Raised in a raced attempt at a request once another attempt has won."""
+
+
+class Attempt:
+    """
+    One of the racing attempts at a hedged request, with the request body,
+    retry state and timer of its own. cancel() stops its retries and
+    closes its response as soon as another attempt wins.
+    """
+
+    def __init__(self, data: dict, retries, timer):
+        self.data = data
+        self.retries = retries
+        self.timer = timer
+        self.cancelled = threading.Event()
+        self._response = None
+        self._lock = threading.Lock()
+
+    def opened(self, response):
+        """Hold on to the open response for cancel(); raises AttemptCancelled if already cancelled."""
+        with self._lock:
+            if not self.cancelled.is_set():
+                self._response = response
+                return
+        response.close()
+        raise AttemptCancelled()
+
+    def cancel(self):
+        with self._lock:
+            self.cancelled.set()
+            response, self._response = self._response, None
+        if response is not None:
+            response.close()
+
+
+class _ModelStats:
+    __slots__ = ("samples", "requests", "hedged", "won")
+
+    def __init__(self, window: int):
+        self.samples = deque(maxlen=window)
+        self.requests = 0
+        self.hedged = 0
+        self.won = 0
+
+
+class Hedger:
+    """
+    Decides when a slow streaming request gets a duplicate. Keeps recent
+    times to first token per model; a request that has not started
+    streaming after the chosen percentile of them is hedged, as long as
+    hedges stay within budget, a fraction of all hedge-enabled requests.
+    Counts how often the duplicate started first.
+    """
+
+    def __init__(self, budget: Optional[float] = None, window: int = WINDOW, min_samples: int = MIN_SAMPLES):
+        self.budget = _budget_from_env() if budget is None else budget
+        self.window = window
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._models: Dict[str, _ModelStats] = {}
+        self._requests = 0
+        self._hedged = 0
+
+    def _stats(self, model: str) -> _ModelStats:
+        stats = self._models.get(model)
+        if stats is None:
+            stats = self._models[model] = _ModelStats(self.window)
+        return stats
+
+    def observe(self, model: str, seconds: float):
+        """Record how long a streaming request to model took to start."""
+        with self._lock:
+            self._stats(model).samples.append(seconds)
+
+    def delay(self, model: str, percentile: float = DEFAULT_PERCENTILE) -> Optional[float]:
+        """Seconds to wait for a first token before hedging, or None without enough samples."""
+        with self._lock:
+            samples = sorted(self._stats(model).samples)
+        if len(samples) < self.min_samples:
+            return None
+        return _percentile(samples, percentile / 100)
+
+    def start(self, model: str, percentile: float = DEFAULT_PERCENTILE) -> Optional[float]:
+        """Count a hedge-enabled request to model, returning its hedge delay."""
+        with self._lock:
+            self._requests += 1
+            self._stats(model).requests += 1
+        return self.delay(model, percentile)
+
+    def try_hedge(self, model: str) -> bool:
+        """Take a hedge from the budget; False if that would exceed it."""
+        with self._lock:
+            if self._hedged + 1 > self.budget * self._requests:
+                return False
+            self._hedged += 1
+            self._stats(model).hedged += 1
+            return True
+
+    def won(self, model: str):
+        """Record that a hedge started streaming before the request it duplicated."""
+        with self._lock:
+            self._stats(model).won += 1
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Requests, hedges and hedges that won, per model."""
+        with self._lock:
+            return {
+                model: {
+                    "requests": stats.requests,
+                    "hedged": stats.hedged,
+                    "won": stats.won,
+                    "win_rate": stats.won / stats.hedged if stats.hedged else None,
+                }
+                for model, stats in self._models.items()
+                if stats.requests
+            }
+
+
+_hedger = None
+_hedger_lock = threading.Lock()
+
+
+def get_hedger() -> Hedger:
+    """
+    The process-wide hedger. LLM_CEREBRAS_HEDGE_BUDGET sets the largest
+    fraction of requests that may be duplicated (default 0.1).
+    """
+    global _hedger
+    with _hedger_lock:
+        if _hedger is None:
+            _hedger = Hedger()
+        return _hedger
+
+
+def set_hedger(hedger: Optional[Hedger]):
+    """Replace the process-wide hedger; None creates a new one on next use."""
+    global _hedger
+    with _hedger_lock:
+        _hedger = hedger
@@ -0,0 +1,119 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from .tokens import TOKENS_PER_MESSAGE, estimate_tokens
+from .tools import tool_call_dicts, tool_result_messages
+
+DEFAULT_MAX_CONVERSATIONS = 256
+
+
+def message_tokens(message: Dict) -> int:
+    content = message.get("content")
+    tokens = TOKENS_PER_MESSAGE + (estimate_tokens(content) if isinstance(content, str) else 0)
+    for tool_call in message.get("tool_calls") or ():
+        tokens += estimate_tokens(tool_call["function"]["name"] + tool_call["function"]["arguments"])
+    return tokens
+
+
+def turn_messages(response) -> List[Dict]:
+    """
+    Chat messages for one earlier turn: the tool results and user text it
+    was prompted with, then the reply and the tool calls it made.
+    """
+    prompt = response.prompt
+    messages = tool_result_messages(prompt.tool_results)
+    if prompt.prompt or not messages:
+        messages.append({"role": "user", "content": prompt.prompt})
+    reply = {"role": "assistant", "content": response.text_or_raise()}
+    tool_calls = response.tool_calls_or_raise()
+    if tool_calls:
+        reply["tool_calls"] = tool_call_dicts(tool_calls)
+    messages.append(reply)
+    return messages
+
+
+class _History:
+    __slots__ = ("count", "last", "messages", "tokens", "total")
+
+    def __init__(self):
+        self.count = 0  # Responses already turned into messages
+        self.last = None  # The last of those, to detect an edited conversation
+        self.messages: List[Dict] = []
+        self.tokens: List[int] = []  # Estimated tokens of each message
+        self.total = 0
+
+
+class HistoryCache:
+    """
+    Chat messages for the earlier turns of each conversation, extended with
+    only the new responses on each turn instead of being rebuilt from the
+    whole conversation. The most recently used conversations are kept.
+    """
+
+    def __init__(self, maxsize: int = DEFAULT_MAX_CONVERSATIONS):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, _History]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def history(self, conversation) -> Tuple[List[Dict], List[int], int]:
+        """
+        Return (messages, tokens, total) for the conversation's previous
+        responses. The lists are shared with the cache: do not modify them.
+        """
+        responses = conversation.responses
+        with self._lock:
+            entry = self._entries.get(conversation.id)
+            if entry is None or entry.count > len(responses) or (
+                entry.count and responses[entry.count - 1] is not entry.last
+            ):
+                entry = _History()
+            self._entries[conversation.id] = entry
+            self._entries.move_to_end(conversation.id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            for response in responses[entry.count:]:
+                for message in turn_messages(response):
+                    tokens = message_tokens(message)
+                    entry.messages.append(message)
+                    entry.tokens.append(tokens)
+                    entry.total += tokens
+            if len(responses) > entry.count:
+                entry.count = len(responses)
+                entry.last = responses[-1]
+            return entry.messages, entry.tokens, entry.total
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def trim_history(messages: List[Dict], tokens: List[int], total: int, budget: Optional[int]) -> Tuple[List[Dict], int]:
+    """
+    Drop the oldest turns until the history fits in budget tokens. Returns
+    the kept messages and the number of turns dropped.
+    """
+    if budget is None or total <= budget:
+        return messages, 0
+    start = dropped = 0
+    while start < len(messages) and total > budget:
+        # Drop a user message together with the assistant reply after it,
+        # and any tool calls and results that follow, so tool results are
+        # never sent without the call they answer
+        end = min(start + 2, len(messages))
+        while end < len(messages) and messages[end]["role"] != "user":
+            end += 1
+        total -= sum(tokens[start:end])
+        start = end
+        dropped += 1
+    return messages[start:], dropped
+
+
+def _cache_size_from_env() -> int:
+    try:
+        return int(os.environ.get("LLM_CEREBRAS_HISTORY_CACHE_SIZE", DEFAULT_MAX_CONVERSATIONS))
+    except ValueError:
+        return DEFAULT_MAX_CONVERSATIONS
+
+history_cache = HistoryCache(_cache_size_from_env())
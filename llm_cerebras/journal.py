@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+# Seconds between fsyncs. Results still buffered when the process dies are
+# simply run again on restart.
+DEFAULT_FSYNC_INTERVAL = 1.0
+# Buffered entries that force a write before the interval is up
+MAX_BUFFERED = 1000
+
+
+def input_hash(model_id: str, record: Dict[str, Any], system=None, schema=None, options=None) -> str:
+    """Hash of everything that determines a prompt's result, but not its id."""
+    key = {
+        "model": model_id,
+        "prompt": record["prompt"],
+        "system": record.get("system", system),
+        "schema": schema,
+        "options": options or {},
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class Journal:
+    """
+    JSONL file with one {"hash": ..., "result": ...} line per completed
+    prompt. Appends are buffered and written, flushed and fsynced at most
+    every fsync_interval seconds, so the journal keeps up with high request
+    rates. A timer syncs the buffer when no further result arrives in time.
+    """
+
+    def __init__(self, path, fsync_interval: float = DEFAULT_FSYNC_INTERVAL):
+        self.path = Path(path)
+        self.fsync_interval = fsync_interval
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self._load()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "ab")
+        self._last_sync = time.monotonic()
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        with open(self.path, "rb+") as f:
+            content = f.read()
+            # Drop a partial last line left by a crash mid-write
+            end = content.rfind(b"\n") + 1
+            if end < len(content):
+                f.truncate(end)
+        for line in content[:end].splitlines():
+            try:
+                entry = json.loads(line)
+                self._entries[entry["hash"]] = entry["result"]
+            except (ValueError, KeyError, TypeError):
+                continue
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        return self._entries.get(key)
+
+    def record(self, key: str, result: Dict[str, Any]):
+        """Add a completed result; it reaches the disk by the next sync."""
+        line = json.dumps({"hash": key, "result": result}, ensure_ascii=False).encode("utf-8") + b"\n"
+        with self._lock:
+            self._entries[key] = result
+            self._buffer.append(line)
+            if (
+                len(self._buffer) >= MAX_BUFFERED
+                or time.monotonic() - self._last_sync >= self.fsync_interval
+            ):
+                self._sync()
+            elif self._timer is None:
+                # A stalled or unclosed batch must not hold results back
+                self._timer = threading.Timer(self._last_sync + self.fsync_interval - time.monotonic(), self.sync)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def sync(self):
+        """Write and fsync everything buffered so far."""
+        with self._lock:
+            if not self._file.closed:
+                self._sync()
+
+    def _sync(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._buffer:
+            self._file.write(b"".join(self._buffer))
+            self._buffer = []
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        self._last_sync = time.monotonic()
+
+    def close(self):
+        with self._lock:
+            if self._file.closed:
+                return
+            self._sync()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
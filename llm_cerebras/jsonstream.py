@@ -0,0 +1,307 @@
+import json
+import logging
+import re
+import weakref
+from itertools import chain
+from typing import Any, AsyncIterator, Iterable, Iterator, List, Optional, Tuple
+
+from .schemas import CompiledSchema
+
+# Characters that change the parser's state, outside and inside strings
+_STRUCTURE = re.compile(r'[{}\[\],:"]')
+_STRING = re.compile(r'["\\]')
+
+Item = Tuple[Tuple[Any, ...], Any]
+
+
+class _Frame:
+    __slots__ = ("kind", "path", "key", "expect_key", "index", "split", "start")
+
+    def __init__(self, kind: str, path: Tuple[Any, ...], split: bool, start: int):
+        self.kind = kind
+        self.path = path
+        self.key = None  # The property whose value is being parsed, in objects
+        self.expect_key = kind == "{"
+        self.index = 0
+        self.split = split
+        # Where the current item began, or None once it has been reported
+        self.start = start
+
+
+class JSONItemParser:
+    """
+    Incremental JSON parser that reports each element of an array as soon
+    as it closes, without waiting for the rest of the document. Arrays
+    nested in an item are not split further: for {"items": [{...}, {...}]}
+    each object is reported once, with its path ("items", 0), ("items", 1)
+    and so on.
+
+    Text is scanned once, jumping between structural characters, and only
+    the unfinished item is kept in memory.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._offset = 0  # Position in the document of _buffer[0]
+        self._stack: List[_Frame] = []
+        self._splitting: Optional[_Frame] = None
+        self._in_string = False
+        self._escaped = False
+        self._string_start = 0
+
+    def feed(self, text: str) -> List[Item]:
+        """Parse the next chunk of the document, returning the items it completed."""
+        items = []
+        buffer = self._buffer = self._buffer + text
+        offset = self._offset
+        pos = len(buffer) - len(text)
+        end = len(buffer)
+        while pos < end:
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                    pos += 1
+                    continue
+                match = _STRING.search(buffer, pos)
+                if match is None:
+                    break
+                pos = match.end()
+                if match.group() == "\\":
+                    self._escaped = True
+                    continue
+                self._in_string = False
+                frame = self._stack[-1] if self._stack else None
+                if frame is not None and frame.expect_key:
+                    frame.key = json.loads(buffer[self._string_start - offset:pos])
+                continue
+            match = _STRUCTURE.search(buffer, pos)
+            if match is None:
+                break
+            char = match.group()
+            pos = match.end()
+            if char == '"':
+                self._in_string = True
+                self._string_start = offset + pos - 1
+                continue
+            frame = self._stack[-1] if self._stack else None
+            if char in "{[":
+                path = ()
+                if frame is not None:
+                    path = frame.path + ((frame.key,) if frame.kind == "{" else (frame.index,))
+                split = char == "[" and self._splitting is None
+                child = _Frame(char, path, split, offset + pos)
+                if split:
+                    self._splitting = child
+                self._stack.append(child)
+            elif frame is None:
+                continue
+            elif char == ":":
+                frame.expect_key = False
+            elif char == ",":
+                if frame.kind == "{":
+                    frame.expect_key = True
+                elif frame.split:
+                    self._item(frame, offset + pos - 1, items)
+                    frame.start = offset + pos
+                else:
+                    frame.index += 1
+            else:
+                self._stack.pop()
+                if frame.split:
+                    self._item(frame, offset + pos - 1, items)
+                    self._splitting = None
+                elif self._stack and self._stack[-1].split:
+                    # A container item is complete as soon as it closes
+                    self._item(self._stack[-1], offset + pos, items)
+        self._trim()
+        return items
+
+    def _item(self, frame: _Frame, stop: int, items: List[Item]):
+        if frame.start is None:
+            return
+        text = self._buffer[frame.start - self._offset:stop - self._offset].strip()
+        frame.start = None
+        if not text:
+            return
+        path = frame.path + (frame.index,)
+        frame.index += 1
+        try:
+            items.append((path, json.loads(text)))
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Invalid JSON in item {list(path)}: {e}")
+
+    def _trim(self):
+        keep = [self._offset + len(self._buffer)]
+        if self._splitting is not None and self._splitting.start is not None:
+            keep.append(self._splitting.start)
+        if self._in_string:
+            keep.append(self._string_start)
+        drop = min(keep) - self._offset
+        if drop:
+            self._buffer = self._buffer[drop:]
+            self._offset += drop
+
+
+def validate_item(compiled: Optional[CompiledSchema], path: Tuple[Any, ...], item: Any):
+    """Validate one streamed item against its array's item schema, if there is one."""
+    if compiled is None:
+        return
+    validate = compiled.item_validator(tuple(path[:-1]))
+    if validate is not None:
+        try:
+            validate(item)
+        except ValueError as e:
+            raise ValueError(f"Item {list(path)}: {e}")
+
+
+class ItemChecker:
+    """
+    Validates the items of a streamed schema response as they close,
+    logging failures instead of interrupting the stream. With keep, the
+    items and failures are also kept until take() hands them on, so
+    stream_items() need not parse the response a second time.
+    """
+
+    def __init__(self, compiled: CompiledSchema, keep: bool = False):
+        self.compiled = compiled
+        self.parser = JSONItemParser()
+        self.valid = 0
+        self.invalid = 0
+        self._broken = False
+        self._kept: Optional[List[Tuple[Optional[Item], Optional[ValueError]]]] = [] if keep else None
+
+    def feed(self, text: str):
+        if self._broken:
+            return
+        try:
+            items = self.parser.feed(text)
+        except ValueError as e:
+            logging.warning(f"Streamed JSON could not be parsed: {e}")
+            self._broken = True
+            self._keep(None, e)
+            return
+        for path, item in items:
+            try:
+                validate_item(self.compiled, path, item)
+            except ValueError as e:
+                self.invalid += 1
+                logging.warning(f"Schema validation failed: {e}")
+                self._keep(None, e)
+            else:
+                self.valid += 1
+                self._keep((path, item), None)
+
+    def _keep(self, item: Optional[Item], error: Optional[ValueError]):
+        if self._kept is not None:
+            self._kept.append((item, error))
+
+    def take(self) -> Iterator[Item]:
+        """Yield the items checked since the last call, raising at the first failure."""
+        kept, self._kept = self._kept, []
+        for item, error in kept:
+            if error is not None:
+                raise error
+            yield item
+
+
+# Responses that stream_items() is reading, and the checkers their models
+# created for them
+_wanted = weakref.WeakSet()
+_checkers = weakref.WeakKeyDictionary()
+
+
+def item_checker(compiled: CompiledSchema, response) -> ItemChecker:
+    """The checker for a streamed response, shared with stream_items() if it is reading it."""
+    if response not in _wanted:
+        return ItemChecker(compiled)
+    checker = _checkers[response] = ItemChecker(compiled, keep=True)
+    return checker
+
+
+def _compiled_for(response) -> Optional[CompiledSchema]:
+    schema = getattr(response.prompt, "schema", None)
+    compile_schema = getattr(response.model, "_compiled_schema", None)
+    if schema and compile_schema is not None:
+        return compile_schema(schema)
+    return None
+
+
+def iter_items(chunks: Iterable[str], compiled: Optional[CompiledSchema] = None) -> Iterator[Item]:
+    """
+    Yield (path, item) for each array item in a stream of JSON text chunks,
+    validated against compiled's item schema. Raises ValueError for an
+    item that is not valid JSON or does not match the schema.
+    """
+    parser = JSONItemParser()
+    for chunk in chunks:
+        for path, item in parser.feed(chunk):
+            validate_item(compiled, path, item)
+            yield path, item
+
+
+async def aiter_items(chunks: AsyncIterator[str], compiled: Optional[CompiledSchema] = None) -> AsyncIterator[Item]:
+    """Async counterpart of iter_items()."""
+    parser = JSONItemParser()
+    async for chunk in chunks:
+        for path, item in parser.feed(chunk):
+            validate_item(compiled, path, item)
+            yield path, item
+
+
+def stream_items(response) -> Iterator[Item]:
+    """
+    Yield (path, item) for each array item of a streaming schema response
+    as soon as the model has finished writing it, validated against the
+    prompt's schema:
+
+        response = model.prompt("Invent 10 dogs", schema=llm.schema_dsl("name, age int", multi=True))
+        for path, dog in stream_items(response):
+            ...
+    """
+    _wanted.add(response)
+    chunks = iter(response)
+    try:
+        first = next(chunks, None)
+    finally:
+        _wanted.discard(response)
+    checker = _checkers.pop(response, None)
+    if checker is None:
+        # Already streamed, or from a model that does not check items
+        yield from iter_items(chunks if first is None else chain([first], chunks), _compiled_for(response))
+        return
+    yield from checker.take()
+    for _ in chunks:
+        yield from checker.take()
+    yield from checker.take()
+
+
+async def astream_items(response) -> AsyncIterator[Item]:
+    """Async counterpart of stream_items(), for responses from async models."""
+    _wanted.add(response)
+    chunks = response.__aiter__()
+    try:
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        first = None
+    finally:
+        _wanted.discard(response)
+    checker = _checkers.pop(response, None)
+    if checker is None:
+        async for item in aiter_items(
+            chunks if first is None else _aprepend(first, chunks), _compiled_for(response)
+        ):
+            yield item
+        return
+    for item in checker.take():
+        yield item
+    async for _ in chunks:
+        for item in checker.take():
+            yield item
+    for item in checker.take():
+        yield item
+
+
+async def _aprepend(first: str, chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+    yield first
+    async for chunk in chunks:
+        yield chunk
@@ -0,0 +1,211 @@
+import atexit
+import hashlib
+import json
+import logging
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional
+
+import llm
+
+from .ratelimit import FileBackend, fcntl, get_rate_limiter
+from .retry import retry_after_seconds
+
+# Seconds a key sits out after a 429 without Retry-After, and after the
+# server rejects it outright
+THROTTLE_EJECT = 10.0
+AUTH_EJECT = 300.0
+
+# Seconds between writes of the per-key counters to the stats file
+FLUSH_INTERVAL = 5.0
+
+COUNTERS = ("requests", "ok", "throttled", "unauthorized", "errors")
+
+
+def key_id(key: str) -> str:
+    """A stable identifier for a key that does not reveal it."""
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:12]
+
+
+def mask_key(key: str) -> str:
+    return f"...{key[-4:]}" if len(key) > 8 else "..."
+
+
+class _Key:
+    __slots__ = ("key", "id", "index", "in_flight", "ejected_until", "pending", "remaining")
+
+    def __init__(self, key: str, index: int):
+        self.key = key
+        self.id = key_id(key)
+        self.index = index
+        self.in_flight = 0
+        self.ejected_until = 0.0
+        # Counts not yet written to the stats file
+        self.pending = dict.fromkeys(COUNTERS, 0)
+        # Latest x-ratelimit-remaining-* values, for display
+        self.remaining: Dict[str, float] = {}
+
+
+class KeyPool:
+    """
+    Several API keys, typically for different accounts, used together.
+    Each request goes to the healthy key with the most of its rate limit
+    budget left (as learned by the rate limiter from response headers),
+    shared out by the requests already in flight on it. Keys that are
+    throttled or rejected sit out for a while.
+
+    Counters per key are written to a stats file shared by every process,
+    for `llm cerebras keys`.
+    """
+
+    def __init__(self, keys: List[str], stats_path=None, flush_interval: float = FLUSH_INTERVAL):
+        self.keys = [_Key(key, index) for index, key in enumerate(dict.fromkeys(keys))]
+        self.flush_interval = flush_interval
+        self._backend = FileBackend(stats_path or default_stats_path()) if fcntl is not None else None
+        self._lock = threading.Lock()
+        self._next = 0
+        self._flushed = time.monotonic()
+
+    @property
+    def blocking(self) -> bool:
+        """Whether acquire() and release() may do file I/O that should be kept off an event loop."""
+        limiter = get_rate_limiter()
+        return self._backend is not None or bool(limiter and limiter.blocking)
+
+    def acquire(self, model: str) -> _Key:
+        """Choose the key for the next request to model; pass it to release() afterwards."""
+        limiter = get_rate_limiter()
+        headroom = {key.id: limiter.headroom(f"{model}@{key.id}") if limiter else 1.0 for key in self.keys}
+        now = time.time()
+        with self._lock:
+            healthy = [key for key in self.keys if key.ejected_until <= now]
+            if healthy:
+                count = len(self.keys)
+                # Round robin between keys that are equally good
+                chosen = min(
+                    healthy,
+                    key=lambda key: (-headroom[key.id] / (1 + key.in_flight), (key.index - self._next) % count),
+                )
+                self._next = (chosen.index + 1) % count
+            else:
+                chosen = min(self.keys, key=lambda key: key.ejected_until)
+            chosen.in_flight += 1
+            chosen.pending["requests"] += 1
+        return chosen
+
+    def release(self, key: _Key, status: Optional[int] = None, headers: Optional[Mapping[str, str]] = None):
+        """Record the outcome of a request; status None means it failed to get a response."""
+        now = time.time()
+        with self._lock:
+            key.in_flight -= 1
+            if status in (401, 403):
+                key.pending["unauthorized"] += 1
+                key.ejected_until = now + AUTH_EJECT
+                logging.warning(f"Cerebras key {mask_key(key.key)} was rejected ({status}), not using it for {AUTH_EJECT:.0f}s")
+            elif status == 429:
+                key.pending["throttled"] += 1
+                key.ejected_until = now + (retry_after_seconds(headers or {}) or THROTTLE_EJECT)
+                logging.info(f"Cerebras key {mask_key(key.key)} is throttled, resting it")
+            elif status is not None and 200 <= status < 300:
+                key.pending["ok"] += 1
+            else:
+                key.pending["errors"] += 1
+            for name, value in (headers or {}).items():
+                name = name.lower()
+                if name.startswith("x-ratelimit-remaining-"):
+                    try:
+                        key.remaining[name[len("x-ratelimit-remaining-"):]] = float(value)
+                    except ValueError:
+                        pass
+            due = time.monotonic() - self._flushed >= self.flush_interval
+        if due:
+            self.flush()
+
+    def has_healthy(self) -> bool:
+        now = time.time()
+        return any(key.ejected_until <= now for key in self.keys)
+
+    def flush(self):
+        """Add the counts since the last flush to the stats file."""
+        if self._backend is None:
+            return
+        with self._lock:
+            self._flushed = time.monotonic()
+            updates = [
+                (key.id, mask_key(key.key), dict(key.pending), key.ejected_until, dict(key.remaining))
+                for key in self.keys
+            ]
+            for key in self.keys:
+                key.pending = dict.fromkeys(COUNTERS, 0)
+
+        def merge(state):
+            for id, label, counts, ejected_until, remaining in updates:
+                entry = state.setdefault(id, {"label": label, **dict.fromkeys(COUNTERS, 0)})
+                for name, count in counts.items():
+                    entry[name] = entry.get(name, 0) + count
+                entry["ejected_until"] = ejected_until
+                if remaining:
+                    entry["remaining"] = remaining
+                entry["updated"] = time.time()
+            return 0.0
+
+        try:
+            self._backend.transact(merge)
+        except OSError as e:
+            logging.warning(f"Failed to save Cerebras key stats: {e}")
+
+
+def default_stats_path() -> Path:
+    return llm.user_dir() / "cerebras_keys.json"
+
+
+def configured_keys() -> List[str]:
+    """
+    Keys for the pool: the "cerebras_keys" llm key or the CEREBRAS_API_KEYS
+    environment variable, separated by commas or whitespace.
+    """
+    raw = llm.get_key("", "cerebras_keys", "CEREBRAS_API_KEYS") or ""
+    return [key for key in re.split(r"[\s,]+", raw) if key]
+
+
+def key_stats(keys: List[str], path=None) -> List[Dict[str, Any]]:
+    """Counters for each of keys from the stats file, for display."""
+    path = Path(path) if path else default_stats_path()
+    try:
+        state = json.loads(path.read_text())
+    except (OSError, ValueError):
+        state = {}
+    now = time.time()
+    rows = []
+    for key in dict.fromkeys(keys):
+        entry = state.get(key_id(key), {})
+        row = {"key": mask_key(key), **{name: entry.get(name, 0) for name in COUNTERS}}
+        row["ejected_for"] = max(0.0, entry.get("ejected_until", 0.0) - now)
+        row["remaining"] = entry.get("remaining", {})
+        rows.append(row)
+    return rows
+
+
+_key_pool = None
+_key_pool_lock = threading.Lock()
+
+
+def get_key_pool() -> Optional[KeyPool]:
+    """The process-wide key pool, or None unless at least two keys are configured."""
+    global _key_pool
+    with _key_pool_lock:
+        if _key_pool is None:
+            keys = configured_keys()
+            _key_pool = KeyPool(keys) if len(set(keys)) > 1 else False
+            if _key_pool:
+                atexit.register(_key_pool.flush)
+        return _key_pool or None
+
+
+def set_key_pool(pool: Optional[KeyPool]):
+    """Replace the process-wide pool; None reads the configuration again on next use."""
+    global _key_pool
+    with _key_pool_lock:
+        _key_pool = pool
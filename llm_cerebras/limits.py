@@ -0,0 +1,68 @@
+import os
+from typing import Any, Dict, Optional
+
+import llm
+
+# Tokens kept free for the reply when trimming history to the context window
+# and the prompt sets no max_tokens
+OUTPUT_RESERVE = 1024
+
+# Field names other OpenAI-compatible /models endpoints use for these limits
+_CONTEXT_FIELDS = ("context_window", "context_length", "max_context_length", "max_model_len")
+_OUTPUT_FIELDS = ("max_output", "max_output_tokens", "max_completion_tokens")
+
+
+def _env_int(name: str) -> Optional[int]:
+    try:
+        return int(os.environ[name])
+    except (KeyError, ValueError):
+        return None
+
+
+def parse_model_limits(entry: Dict[str, Any]) -> Dict[str, int]:
+    """The context window and max output a /models entry reports, if any."""
+    limits = {}
+    sources = [entry] + [entry[key] for key in ("limits", "top_provider") if isinstance(entry.get(key), dict)]
+    for name, fields in (("context_window", _CONTEXT_FIELDS), ("max_output", _OUTPUT_FIELDS)):
+        for source in sources:
+            value = next((source[field] for field in fields if isinstance(source.get(field), int)), None)
+            if value and value > 0:
+                limits[name] = value
+                break
+    return limits
+
+
+def model_limits(metadata: Optional[Dict[str, Dict[str, int]]], api_model_id: str) -> Optional[Dict[str, int]]:
+    """
+    Limits for a model: what /models reported, with LLM_CEREBRAS_CONTEXT_WINDOW
+    standing in for a missing context window. None when neither gives one,
+    in which case prompts are sent as they are and the API decides.
+    """
+    reported = (metadata or {}).get(api_model_id) or {}
+    context_window = reported.get("context_window") or _env_int("LLM_CEREBRAS_CONTEXT_WINDOW")
+    if not context_window:
+        return None
+    return {"context_window": context_window, "max_output": reported.get("max_output") or context_window}
+
+
+class ContextWindowExceeded(llm.ModelError):
+    """Raised before sending a prompt that cannot fit the model's context window."""
+
+
+def plan_max_tokens(prompt_tokens: int, max_tokens: Optional[int], limits: Dict[str, int]) -> Optional[int]:
+    """
+    Choose max_tokens so that the prompt plus the reply fit the context
+    window. A requested max_tokens is lowered if needed. With none, the
+    server already limits the reply to what is left of the window, and
+    leaving it unset keeps rate limit reservations small. Raises
+    ContextWindowExceeded if the prompt alone does not fit.
+    """
+    window = limits["context_window"]
+    available = min(limits["max_output"], window - prompt_tokens)
+    if available <= 0:
+        raise ContextWindowExceeded(
+            f"Prompt is about {prompt_tokens} tokens, which does not fit the {window} token context window"
+        )
+    if max_tokens is None:
+        return None
+    return min(max_tokens, available)
@@ -0,0 +1,145 @@
+import importlib
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+MetricsHook = Callable[[Dict[str, Any]], None]
+
+_hooks: List[MetricsHook] = []
+_hooks_lock = threading.Lock()
+
+
+def add_metrics_hook(hook: MetricsHook):
+    """Call hook(metrics) with the timing dict of every completed request."""
+    with _hooks_lock:
+        if hook not in _hooks:
+            _hooks.append(hook)
+
+
+def remove_metrics_hook(hook: MetricsHook):
+    with _hooks_lock:
+        if hook in _hooks:
+            _hooks.remove(hook)
+
+
+def emit_metrics(metrics: Dict[str, Any]):
+    """Pass metrics to every registered hook; a failing hook never fails the request."""
+    with _hooks_lock:
+        hooks = list(_hooks)
+    for hook in hooks:
+        try:
+            hook(metrics)
+        except Exception as e:
+            logging.warning(f"Cerebras metrics hook {hook!r} failed: {e}")
+
+
+def opentelemetry_hook(metrics: Dict[str, Any]):
+    """
+    Metrics hook that records each request as an OpenTelemetry span. Does
+    nothing if opentelemetry-api is not installed. Enable it with
+    add_metrics_hook(opentelemetry_hook).
+    """
+    try:
+        trace = importlib.import_module("opentelemetry.trace")
+    except ImportError:
+        return
+    tracer = trace.get_tracer("llm_cerebras")
+    start_ns = int(metrics["started_at"] * 1e9)
+    span = tracer.start_span("cerebras.chat.completions", start_time=start_ns)
+    for key, value in metrics.items():
+        if isinstance(value, dict):
+            for sub_key, sub_value in value.items():
+                span.set_attribute(f"cerebras.{key}.{sub_key}", sub_value)
+        elif value is not None and key != "started_at":
+            span.set_attribute(f"cerebras.{key}", value)
+    span.end(end_time=start_ns + int(metrics["duration_ms"] * 1e6))
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class RequestTimer:
+    """
+    Collects latency for one request: connection setup (through the httpx
+    trace extension), time to first token, gaps between streamed chunks,
+    total duration and output tokens per second.
+    """
+
+    def __init__(self, model: str, stream: bool):
+        self.model = model
+        self.stream = stream
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        # perf_counter() when the latest attempt was sent, after any backoff
+        # and rate limit waits
+        self.sent: Optional[float] = None
+        self._connect_start = None
+        self.connect_ms: Optional[float] = None
+        self.first_token_ms: Optional[float] = None
+        self._last_chunk = None
+        self.gaps_ms: List[float] = []
+        self.output_tokens: Optional[int] = None
+        # "won" or "lost" when a hedge request raced this one
+        self.hedge: Optional[str] = None
+
+    def _elapsed_ms(self, since=None) -> float:
+        return (time.perf_counter() - (self._start if since is None else since)) * 1000
+
+    def trace(self, event: str, info: dict):
+        """httpx "trace" extension callback for synchronous clients."""
+        if event == "connection.connect_tcp.started":
+            self._connect_start = time.perf_counter()
+        elif event in ("connection.connect_tcp.complete", "connection.start_tls.complete"):
+            if self._connect_start is not None:
+                self.connect_ms = self._elapsed_ms(self._connect_start)
+
+    async def atrace(self, event: str, info: dict):
+        """httpx "trace" extension callback for async clients."""
+        self.trace(event, info)
+
+    def chunk(self):
+        """Mark the arrival of a streamed chunk of content."""
+        now = time.perf_counter()
+        if self._last_chunk is None:
+            self.first_token_ms = self._elapsed_ms()
+        else:
+            self.gaps_ms.append((now - self._last_chunk) * 1000)
+        self._last_chunk = now
+
+    def finish(self, error: Optional[BaseException] = None) -> Dict[str, Any]:
+        duration_ms = self._elapsed_ms()
+        metrics = {
+            "model": self.model,
+            "stream": self.stream,
+            "started_at": self.started_at,
+            "connect_ms": self.connect_ms,
+            "connection_reused": self.connect_ms is None,
+            "ttft_ms": self.first_token_ms,
+            "duration_ms": duration_ms,
+            "output_tokens": self.output_tokens,
+            "tokens_per_second": None,
+            "inter_chunk_ms": None,
+            "hedge": self.hedge,
+        }
+        if self.gaps_ms:
+            gaps = sorted(self.gaps_ms)
+            metrics["inter_chunk_ms"] = {
+                "count": len(gaps),
+                "mean": sum(gaps) / len(gaps),
+                "p50": _percentile(gaps, 0.5),
+                "p99": _percentile(gaps, 0.99),
+                "max": gaps[-1],
+            }
+        if self.output_tokens:
+            # For streams, measure generation speed from the first token on
+            generating_ms = duration_ms
+            if self.stream and self.gaps_ms:
+                generating_ms -= self.first_token_ms
+            if generating_ms > 0:
+                metrics["tokens_per_second"] = self.output_tokens / (generating_ms / 1000)
+        if error is not None:
+            metrics["error"] = type(error).__name__
+        return metrics
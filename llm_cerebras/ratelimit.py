@@ -0,0 +1,278 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Mapping, Optional
+
+import llm
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# Length in seconds of the windows used in x-ratelimit-* header names
+WINDOWS = {"second": 1.0, "minute": 60.0, "hour": 3600.0, "day": 86400.0}
+
+# Longest we will pace a single request. Waits beyond this (a spent daily
+# quota, say) are left to the server's 429 and the retry policy.
+DEFAULT_MAX_WAIT = 60.0
+
+
+class MemoryBackend:
+    """Limiter state shared between the threads of one process."""
+
+    def __init__(self):
+        self._state = {}
+        self._lock = threading.Lock()
+
+    def transact(self, fn: Callable[[dict], float], write: bool = True) -> float:
+        with self._lock:
+            return fn(self._state)
+
+
+class FileBackend:
+    """
+    Limiter state shared between processes through a JSON file, guarded by
+    an exclusive lock on a sibling lock file. Calls block on file I/O, so
+    async code runs them in a worker thread.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path else llm.user_dir() / "cerebras_ratelimit.json"
+        self.lock_path = self.path.with_name(self.path.name + ".lock")
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict:
+        try:
+            return json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def transact(self, fn: Callable[[dict], float], write: bool = True) -> float:
+        """Run fn on the state, saving what it changes unless write is False."""
+        if not write:
+            # Writers replace the file in one step, so a read needs no lock
+            return fn(self._load())
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock, open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                state = self._load()
+                result = fn(state)
+                tmp_path = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+                tmp_path.write_text(json.dumps(state))
+                os.replace(tmp_path, self.path)
+                return result
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _limit_cost(name: str, tokens: int) -> int:
+    return 1 if name.startswith("requests-") else tokens
+
+
+class RateLimiter:
+    """
+    Token buckets per key (normally the API model id) for each known limit,
+    such as "requests-minute" or "tokens-day". Limits come from the
+    constructor, or are learned from x-ratelimit-limit-* response headers.
+    """
+
+    def __init__(
+        self,
+        backend=None,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        max_wait: float = DEFAULT_MAX_WAIT,
+    ):
+        self.backend = backend or MemoryBackend()
+        self.configured = {}
+        if requests_per_minute:
+            self.configured["requests-minute"] = requests_per_minute
+        if tokens_per_minute:
+            self.configured["tokens-minute"] = tokens_per_minute
+        self.max_wait = max_wait
+
+    @property
+    def blocking(self) -> bool:
+        """Whether calls do file I/O that should be kept off an event loop."""
+        return isinstance(self.backend, FileBackend)
+
+    def _refill(self, entry: dict, now: float) -> Dict[str, tuple]:
+        """Current (level, limit, rate) of each bucket, refilled up to now."""
+        limits = dict(entry.get("limits", {}))
+        limits.update(self.configured)
+        buckets = {}
+        for name, limit in limits.items():
+            window = WINDOWS.get(name.split("-", 1)[-1])
+            if not window or not limit:
+                continue
+            rate = limit / window
+            level, updated = entry.setdefault("buckets", {}).get(name, (limit, now))
+            level = min(limit, level + max(0.0, now - updated) * rate)
+            buckets[name] = (level, limit, rate)
+        return buckets
+
+    def try_acquire(self, key: str, tokens: int = 0) -> float:
+        """
+        Take one request and `tokens` tokens from key's buckets. Returns 0.0
+        on success, otherwise the seconds to wait before trying again.
+        """
+        def attempt(state):
+            now = time.time()
+            entry = state.setdefault(key, {"limits": {}, "buckets": {}})
+            buckets = self._refill(entry, now)
+            wait = 0.0
+            for name, (level, limit, rate) in buckets.items():
+                # A request bigger than the whole bucket waits for a full one
+                cost = min(_limit_cost(name, tokens), limit)
+                if level < cost:
+                    wait = max(wait, (cost - level) / rate)
+            for name, (level, limit, rate) in buckets.items():
+                if not wait:
+                    level -= min(_limit_cost(name, tokens), limit)
+                entry["buckets"][name] = (level, now)
+            return wait
+
+        return self.backend.transact(attempt)
+
+    def acquire(self, key: str, tokens: int = 0) -> float:
+        """Block until the request fits the budget; returns seconds waited."""
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(key, tokens)
+            if not wait:
+                return waited
+            if waited + wait > self.max_wait:
+                logging.info(f"Rate limit for {key} needs {wait:.1f}s, sending anyway")
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    async def acquire_async(self, key: str, tokens: int = 0) -> float:
+        """Async counterpart of acquire()."""
+        waited = 0.0
+        while True:
+            if self.blocking:
+                wait = await asyncio.to_thread(self.try_acquire, key, tokens)
+            else:
+                wait = self.try_acquire(key, tokens)
+            if not wait:
+                return waited
+            if waited + wait > self.max_wait:
+                logging.info(f"Rate limit for {key} needs {wait:.1f}s, sending anyway")
+                return waited
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def headroom(self, key: str) -> float:
+        """
+        The fraction of key's tightest budget still available, from 0.0 to
+        1.0; 1.0 while no limits are known.
+        """
+        def measure(state):
+            entry = state.get(key)
+            if entry is None:
+                return 1.0
+            buckets = self._refill(entry, time.time())
+            return min((max(0.0, level) / limit for level, limit, rate in buckets.values()), default=1.0)
+
+        return self.backend.transact(measure, write=False)
+
+    def update_from_headers(self, key: str, headers: Mapping[str, str]):
+        """Learn limits and remaining budget from x-ratelimit-* headers."""
+        limits = {}
+        remaining = {}
+        for name, value in headers.items():
+            name = name.lower()
+            for prefix, target in (("x-ratelimit-limit-", limits), ("x-ratelimit-remaining-", remaining)):
+                if name.startswith(prefix) and name[len(prefix):].split("-", 1)[-1] in WINDOWS:
+                    try:
+                        target[name[len(prefix):]] = float(value)
+                    except ValueError:
+                        pass
+        if not limits and not remaining:
+            return
+
+        def update(state):
+            now = time.time()
+            entry = state.setdefault(key, {"limits": {}, "buckets": {}})
+            entry["limits"].update(limits)
+            buckets = self._refill(entry, now)
+            for name, (level, limit, rate) in buckets.items():
+                if name in remaining:
+                    # The server is authoritative, but may not yet count
+                    # requests still in flight, so never raise our level
+                    level = min(level, remaining[name])
+                entry["buckets"][name] = (level, now)
+            return 0.0
+
+        self.backend.transact(update)
+
+    def record_usage(self, key: str, estimated: int, actual: Optional[int]):
+        """Correct the token buckets once a request's real usage is known."""
+        if actual is None or actual == estimated:
+            return
+
+        def correct(state):
+            now = time.time()
+            entry = state.setdefault(key, {"limits": {}, "buckets": {}})
+            for name, (level, limit, rate) in self._refill(entry, now).items():
+                if name.startswith("tokens-"):
+                    level = min(limit, level + estimated - actual)
+                entry["buckets"][name] = (level, now)
+            return 0.0
+
+        self.backend.transact(correct)
+
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+
+def _env_int(name):
+    try:
+        return int(os.environ[name])
+    except (KeyError, ValueError):
+        return None
+
+
+def get_rate_limiter() -> Optional[RateLimiter]:
+    """
+    The process-wide limiter, configured from the environment on first use:
+
+    - LLM_CEREBRAS_RATE_LIMIT_BACKEND: "memory" (default), "file" to share
+      budgets between processes, or "off"
+    - LLM_CEREBRAS_RPM / LLM_CEREBRAS_TPM: fixed requests and tokens per
+      minute, instead of learning them from response headers
+    """
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            backend_name = os.environ.get("LLM_CEREBRAS_RATE_LIMIT_BACKEND", "memory").lower()
+            if backend_name == "off":
+                _rate_limiter = False
+            else:
+                if backend_name == "file" and fcntl is not None:
+                    backend = FileBackend()
+                else:
+                    if backend_name == "file":
+                        logging.warning("File rate limit backend needs fcntl, using memory backend")
+                    backend = MemoryBackend()
+                _rate_limiter = RateLimiter(
+                    backend,
+                    requests_per_minute=_env_int("LLM_CEREBRAS_RPM"),
+                    tokens_per_minute=_env_int("LLM_CEREBRAS_TPM"),
+                )
+        return _rate_limiter or None
+
+
+def set_rate_limiter(limiter: Optional[RateLimiter]):
+    """Replace the process-wide limiter; pass None to disable pacing."""
+    global _rate_limiter
+    with _rate_limiter_lock:
+        _rate_limiter = limiter if limiter is not None else False
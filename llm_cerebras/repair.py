@@ -0,0 +1,153 @@
+import json
+import re
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+DEFAULT_MAX_REPAIRS = 2
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def failed_generation(r: httpx.Response) -> Optional[str]:
+    """
+    The invalid output the API reports in a 400 response when JSON mode
+    generation fails, or None for other errors.
+    """
+    if r.status_code != 400:
+        return None
+    try:
+        body = r.json()
+    except ValueError:
+        return None
+    if not isinstance(body, dict):
+        return None
+    for source in (body, body.get("error")):
+        if isinstance(source, dict) and isinstance(source.get("failed_generation"), str):
+            return source["failed_generation"]
+    return None
+
+
+def error_message(r: httpx.Response) -> str:
+    """The error message of an API error response, for the repair prompt."""
+    try:
+        body = r.json()
+    except ValueError:
+        return r.text
+    error = body.get("error", body) if isinstance(body, dict) else body
+    if isinstance(error, dict):
+        return str(error.get("message") or error)
+    return str(error)
+
+
+# An error about structured output names the response format, and one
+# saying the model cannot do json_schema at all says it is not supported
+_SCHEMA_MODE = re.compile(r"response_format|json_schema")
+_SCHEMA_MODE_UNSUPPORTED = re.compile(
+    r"(?:response_format|json_schema)[^.]*\bnot supported|does not support[^.]*(?:response_format|json_schema)"
+)
+
+
+def schema_rejection(r: httpx.Response) -> Optional[str]:
+    """
+    Why the API rejected a json_schema request: "model" if the model does
+    not support json_schema mode, "schema" if it only objects to this
+    schema, or None if the error is not about the response format at all.
+    """
+    if r.status_code not in (400, 422) or failed_generation(r) is not None:
+        return None
+    message = error_message(r)
+    if not _SCHEMA_MODE.search(message):
+        return None
+    return "model" if _SCHEMA_MODE_UNSUPPORTED.search(message) else "schema"
+
+
+def local_fix(text: str) -> Optional[str]:
+    """
+    Cheap fixes for the usual ways generated JSON goes wrong: text around
+    the value, trailing commas, and output cut off before the closing
+    quotes and brackets. Returns the fixed JSON, or None if it still does
+    not parse.
+    """
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        return None
+    out: List[str] = []
+    stack: List[str] = []
+    in_string = escaped = False
+    for char in text[min(starts):]:
+        if in_string:
+            out.append(char)
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in _CLOSERS:
+            stack.append(_CLOSERS[char])
+        elif char in "}]":
+            _drop_trailing_comma(out)
+            if not stack:
+                break
+            out.append(stack.pop())
+            if not stack:
+                # Ignore anything after the value
+                break
+            continue
+        out.append(char)
+    if stack:
+        if in_string:
+            if escaped:
+                out.pop()
+            out.append('"')
+        _drop_trailing_comma(out)
+        if out and out[-1] == ":":
+            out.append("null")
+        out.extend(reversed(stack))
+    fixed = "".join(out)
+    try:
+        json.loads(fixed)
+    except json.JSONDecodeError:
+        return None
+    return fixed
+
+
+def _drop_trailing_comma(out: List[str]):
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+
+
+def repair_request(data: Dict[str, Any], content: str, error: str) -> Dict[str, Any]:
+    """The request body asking the model to correct its invalid output."""
+    correction = (
+        f"Your previous response was not valid: {error}\n"
+        "Reply with only the corrected JSON, with no other text."
+    )
+    return dict(
+        data,
+        messages=data["messages"] + [
+            {"role": "assistant", "content": content},
+            {"role": "user", "content": correction},
+        ],
+    )
+
+
+def add_usage(total: Optional[Dict[str, Any]], usage: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Sum the token counts of two usage blocks, for responses that took several requests."""
+    if not total:
+        return dict(usage) if usage else total
+    if not usage:
+        return total
+    combined = dict(total)
+    for key, value in usage.items():
+        if isinstance(value, (int, float)) and isinstance(combined.get(key), (int, float)):
+            combined[key] += value
+        elif key not in combined:
+            combined[key] = value
+    return combined
@@ -0,0 +1,151 @@
+import email.utils
+import random
+import re
+import time
+from typing import List, Mapping, Optional
+
+# Status codes worth retrying: timeouts, rate limits and transient server errors
+RETRYABLE_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+
+_DURATION_RE = re.compile(r"^\s*([0-9]*\.?[0-9]+)\s*(ms|s|m|h)?\s*$")
+_DURATION_UNITS = {None: 1.0, "s": 1.0, "ms": 0.001, "m": 60.0, "h": 3600.0}
+
+
+def is_retryable_status(status_code: int) -> bool:
+    return status_code in RETRYABLE_STATUS_CODES
+
+
+def parse_duration(value: Optional[str]) -> Optional[float]:
+    """Parse a header duration such as "1.5", "250ms" or "2m" into seconds."""
+    if not value:
+        return None
+    match = _DURATION_RE.match(value)
+    if not match:
+        return None
+    return float(match.group(1)) * _DURATION_UNITS[match.group(2)]
+
+
+def retry_after_seconds(headers: Mapping[str, str]) -> Optional[float]:
+    """
+    How long the server asked us to wait, from Retry-After (seconds or an
+    HTTP date) or, failing that, from the x-ratelimit-reset-* headers of
+    every limit that is exhausted.
+    """
+    retry_after = headers.get("retry-after")
+    if retry_after:
+        seconds = parse_duration(retry_after)
+        if seconds is not None:
+            return seconds
+        try:
+            when = email.utils.parsedate_to_datetime(retry_after)
+        except (TypeError, ValueError):
+            when = None
+        if when is not None:
+            return max(0.0, when.timestamp() - time.time())
+
+    waits = []
+    for name, value in headers.items():
+        name = name.lower()
+        if not name.startswith("x-ratelimit-reset-"):
+            continue
+        remaining = headers.get("x-ratelimit-remaining-" + name[len("x-ratelimit-reset-"):])
+        if remaining is not None and remaining.strip() not in ("0", "0.0"):
+            continue
+        seconds = parse_duration(value)
+        if seconds is not None:
+            waits.append(seconds)
+    return max(waits) if waits else None
+
+
+class RetryPolicy:
+    """
+    Exponential backoff with jitter, honouring server-provided wait times,
+    with a cap on the number of retries and on the total time spent waiting.
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 20.0,
+        max_total_wait: float = 60.0,
+    ):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_total_wait = max_total_wait
+
+    def backoff(self, retry: int) -> float:
+        """Delay before retry number `retry` (0-based) using equal jitter."""
+        ceiling = min(self.max_delay, self.base_delay * (2 ** retry))
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+    def delay(self, retry: int, response=None) -> float:
+        if response is not None:
+            server_delay = retry_after_seconds(response.headers)
+            if server_delay is not None:
+                return server_delay
+        return self.backoff(retry)
+
+
+class RetryState:
+    """Tracks the retries made for a single request."""
+
+    def __init__(self, policy: RetryPolicy):
+        self.policy = policy
+        self.retries = 0
+        self.waited = 0.0
+        # Models to switch to, in order, if the requested one is unavailable
+        self.fallbacks: List[str] = []
+        # Connect and read timeouts for each attempt (None for the defaults),
+        # and the time.monotonic() by which the whole request must be done
+        self.connect_timeout: Optional[float] = None
+        self.read_timeout: Optional[float] = None
+        self.deadline: Optional[float] = None
+
+    def single_attempt(self) -> "RetryState":
+        """A state for one more attempt at the same request, with no retries of its own."""
+        state = RetryState(RetryPolicy(max_retries=0))
+        state.connect_timeout = self.connect_timeout
+        state.read_timeout = self.read_timeout
+        state.deadline = self.deadline
+        return state
+
+    def fork(self) -> "RetryState":
+        """A copy that spends its own budget, for an attempt raced against others."""
+        state = RetryState(self.policy)
+        state.adopt(self)
+        state.fallbacks = list(self.fallbacks)
+        state.connect_timeout = self.connect_timeout
+        state.read_timeout = self.read_timeout
+        state.deadline = self.deadline
+        return state
+
+    def adopt(self, other: "RetryState"):
+        """Take on what a fork spent, once its attempt is the one carried on with."""
+        self.retries = other.retries
+        self.waited = other.waited
+        self.fallbacks = other.fallbacks
+
+    def retry_now(self) -> bool:
+        """Spend one retry on an immediate attempt, such as with another key; False if none are left."""
+        if self.retries >= self.policy.max_retries:
+            return False
+        self.retries += 1
+        return True
+
+    def next_delay(self, response=None) -> Optional[float]:
+        """
+        Seconds to wait before retrying, or None if the retry or total wait
+        budget would be exceeded.
+        """
+        if self.retries >= self.policy.max_retries:
+            return None
+        delay = self.policy.delay(self.retries, response)
+        if self.waited + delay > self.policy.max_total_wait:
+            return None
+        if self.deadline is not None and time.monotonic() + delay >= self.deadline:
+            return None
+        self.retries += 1
+        self.waited += delay
+        return delay
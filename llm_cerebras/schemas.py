@@ -0,0 +1,227 @@
+import hashlib
+import importlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+DEFAULT_SCHEMA_CACHE_SIZE = 128
+
+# jsonschema is only needed for --schema prompts, so it is imported on
+# first use rather than on every llm invocation
+_jsonschema = None
+
+def _get_jsonschema():
+    """Import jsonschema on first use, returning None if it is not installed."""
+    global _jsonschema
+    if _jsonschema is None:
+        try:
+            _jsonschema = importlib.import_module("jsonschema")
+        except ImportError:
+            logging.warning("jsonschema not installed, schema validation will be limited")
+            _jsonschema = False
+    return _jsonschema or None
+
+def _get_fastjsonschema():
+    """Import fastjsonschema if it is installed, otherwise return None."""
+    try:
+        return importlib.import_module("fastjsonschema")
+    except ImportError:
+        return None
+
+def schema_key(schema) -> str:
+    """Canonical hash of a schema, independent of key order and whitespace."""
+    if isinstance(schema, str):
+        canonical = "str:" + schema
+    else:
+        canonical = "json:" + json.dumps(schema, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+def basic_validate(data: Any, schema: Dict[str, Any]):
+    """
+    Minimal validation used when jsonschema is not installed: required
+    fields and top-level property types only.
+    """
+    if schema.get("type") == "object" and "properties" in schema:
+        properties = schema.get("properties", {})
+        required = schema.get("required", [])
+
+        # Check required fields
+        for field in required:
+            if field not in data:
+                raise ValueError(f"Required field '{field}' is missing from response")
+
+        # Check field types (simplified)
+        for field, value in data.items():
+            if field in properties:
+                prop_type = properties[field].get("type")
+                if prop_type == "string" and not isinstance(value, str):
+                    raise ValueError(f"Field '{field}' should be a string")
+                elif prop_type == "integer" and not isinstance(value, int):
+                    raise ValueError(f"Field '{field}' should be an integer")
+                elif prop_type == "number" and not isinstance(value, (int, float)):
+                    raise ValueError(f"Field '{field}' should be a number")
+                elif prop_type == "boolean" and not isinstance(value, bool):
+                    raise ValueError(f"Field '{field}' should be a boolean")
+                elif prop_type == "array" and not isinstance(value, list):
+                    raise ValueError(f"Field '{field}' should be an array")
+                elif prop_type == "object" and not isinstance(value, dict):
+                    raise ValueError(f"Field '{field}' should be an object")
+
+def compile_validator(schema: Dict[str, Any]) -> Callable[[Any], None]:
+    """
+    Build a function that validates data against schema, raising ValueError
+    on failure. Uses fastjsonschema when installed, then jsonschema, then
+    basic_validate. The schema itself is checked once, here.
+    """
+    fastjsonschema = _get_fastjsonschema()
+    if fastjsonschema is not None:
+        try:
+            compiled = fastjsonschema.compile(schema)
+        except Exception as e:
+            logging.info(f"fastjsonschema could not compile schema, using jsonschema: {e}")
+        else:
+            def validate(data):
+                try:
+                    compiled(data)
+                except fastjsonschema.JsonSchemaException as e:
+                    raise ValueError(f"Schema validation failed: {str(e)}")
+            return validate
+
+    jsonschema = _get_jsonschema()
+    if jsonschema is not None:
+        validator_class = jsonschema.validators.validator_for(schema)
+        validator_class.check_schema(schema)
+        validator = validator_class(schema)
+
+        def validate(data):
+            try:
+                validator.validate(data)
+            except jsonschema.exceptions.ValidationError as e:
+                raise ValueError(f"Schema validation failed: {str(e)}")
+        return validate
+
+    return lambda data: basic_validate(data, schema)
+
+def item_schema(schema: Dict[str, Any], path: Tuple[str, ...]) -> Optional[Dict[str, Any]]:
+    """
+    The schema for the items of the array found by following the object
+    property names in path from schema, or None if there is no such array.
+    """
+    for name in path:
+        properties = schema.get("properties") if isinstance(schema, dict) else None
+        if not isinstance(properties, dict) or not isinstance(properties.get(name), dict):
+            return None
+        schema = properties[name]
+    items = schema.get("items")
+    return items if isinstance(items, dict) else None
+
+def strict_schema(schema: Any) -> Any:
+    """
+    Copy of schema with additionalProperties set to false on every object
+    that does not say otherwise, as strict json_schema mode requires.
+    """
+    if isinstance(schema, list):
+        return [strict_schema(item) for item in schema]
+    if not isinstance(schema, dict):
+        return schema
+    strict = {}
+    for key, value in schema.items():
+        if key in ("properties", "$defs", "definitions") and isinstance(value, dict):
+            strict[key] = {name: strict_schema(sub) for name, sub in value.items()}
+        elif key in ("items", "anyOf", "oneOf", "allOf"):
+            strict[key] = strict_schema(value)
+        else:
+            strict[key] = value
+    if strict.get("type") == "object" and "additionalProperties" not in strict:
+        strict["additionalProperties"] = False
+    return strict
+
+class CompiledSchema:
+    """A processed JSON Schema with its validator and prompt instructions."""
+
+    __slots__ = ("schema", "validate", "instructions", "_item_validators", "_response_format")
+
+    def __init__(self, schema: Dict[str, Any], validate: Callable[[Any], None], instructions: str):
+        self.schema = schema
+        self.validate = validate
+        self.instructions = instructions
+        self._item_validators = {}
+        self._response_format = None
+
+    def response_format(self) -> Dict[str, Any]:
+        """The response_format that has the API enforce this schema while decoding."""
+        if self._response_format is None:
+            self._response_format = {
+                "type": "json_schema",
+                "json_schema": {"name": "response", "strict": True, "schema": strict_schema(self.schema)},
+            }
+        return self._response_format
+
+    def item_validator(self, path: Tuple[str, ...]) -> Optional[Callable[[Any], None]]:
+        """
+        Validator for single items of the array at path, for checking a
+        streamed response item by item. Compiled on first use.
+        """
+        try:
+            return self._item_validators[path]
+        except KeyError:
+            pass
+        items = item_schema(self.schema, path)
+        validate = compile_validator(items) if items else None
+        self._item_validators[path] = validate
+        return validate
+
+class SchemaCache:
+    """Thread-safe LRU cache of CompiledSchema objects keyed by schema_key()."""
+
+    def __init__(self, maxsize: int = DEFAULT_SCHEMA_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, schema, build: Callable[[Any], CompiledSchema]) -> CompiledSchema:
+        """Return the cached entry for schema, calling build(schema) on a miss."""
+        key = schema_key(schema)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        # Build outside the lock: compiling a validator can be slow
+        entry = build(schema)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+            }
+
+def _cache_size_from_env() -> int:
+    try:
+        return int(os.environ.get("LLM_CEREBRAS_SCHEMA_CACHE_SIZE", DEFAULT_SCHEMA_CACHE_SIZE))
+    except ValueError:
+        return DEFAULT_SCHEMA_CACHE_SIZE
+
+schema_cache = SchemaCache(_cache_size_from_env())
@@ -0,0 +1,139 @@
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Dict, Hashable, Iterable, Iterator, Optional, Tuple
+
+
+class Flight:
+    """
+    One in-flight request. The leader that sends it appends each chunk of
+    content as it arrives; followers replay the chunks so far and then wait
+    for more, so a stream fans out to every waiter as it is generated.
+    """
+
+    def __init__(self, owner: Hashable = None):
+        # The thread or task of the leader, which must never wait on itself
+        self.owner = owner
+        self.chunks = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        # Usage and timings of the finished response, for followers to copy
+        self.details: Dict[str, Any] = {}
+        self._cond = threading.Condition()
+
+    def _notify(self):
+        self._cond.notify_all()
+
+    def append(self, chunk: str):
+        with self._cond:
+            self.chunks.append(chunk)
+            self._notify()
+
+    def publish(self, deltas: Iterable[str]) -> Iterator[str]:
+        """Pass the leader's deltas through, sharing each with followers."""
+        for delta in deltas:
+            self.append(delta)
+            yield delta
+
+    def finish(self, details: Optional[Dict[str, Any]] = None, error: Optional[BaseException] = None):
+        with self._cond:
+            self.details = details or {}
+            self.error = error
+            self.done = True
+            self._notify()
+
+    def follow(self) -> Iterator[str]:
+        """Yield every chunk of the response, raising the leader's error if it failed."""
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self.chunks) and not self.done:
+                    self._cond.wait()
+                new = self.chunks[index:]
+                done, error = self.done, self.error
+            index += len(new)
+            yield from new
+            if done and index >= len(self.chunks):
+                if error is not None:
+                    raise error
+                return
+
+
+class AsyncFlight(Flight):
+    """Flight whose followers are coroutines on the leader's event loop."""
+
+    def __init__(self, owner: Hashable = None):
+        super().__init__(owner)
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def append(self, chunk: str):
+        self.chunks.append(chunk)
+        self._notify()
+
+    async def apublish(self, deltas: AsyncIterator[str]) -> AsyncIterator[str]:
+        async for delta in deltas:
+            self.append(delta)
+            yield delta
+
+    def finish(self, details: Optional[Dict[str, Any]] = None, error: Optional[BaseException] = None):
+        self.details = details or {}
+        self.error = error
+        self.done = True
+        self._notify()
+
+    async def afollow(self) -> AsyncIterator[str]:
+        index = 0
+        while True:
+            changed = self._changed
+            if index < len(self.chunks):
+                new = self.chunks[index:]
+                index += len(new)
+                for chunk in new:
+                    yield chunk
+                continue
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await changed.wait()
+
+
+class SingleFlight:
+    """Registry of in-flight requests, so identical concurrent requests share one."""
+
+    def __init__(self, flight_class=Flight):
+        self.flight_class = flight_class
+        self._flights: Dict[Hashable, Flight] = {}
+        self._lock = threading.Lock()
+
+    def join(self, key: Hashable, owner: Hashable = None) -> Tuple[Flight, bool]:
+        """
+        Return (flight, is_leader); the leader must call land() when done.
+        A request from the thread or task already leading the flight for key
+        gets a separate flight of its own, as waiting would deadlock.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                if owner is not None and flight.owner == owner:
+                    return self.flight_class(owner), True
+                return flight, False
+            flight = self._flights[key] = self.flight_class(owner)
+            return flight, True
+
+    def land(self, key: Hashable, flight: Flight, details=None, error=None):
+        """Finish the leader's flight; later requests for key start a new one."""
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        flight.finish(details, error)
+
+    def __len__(self):
+        return len(self._flights)
+
+
+flights = SingleFlight(Flight)
+async_flights = SingleFlight(AsyncFlight)
@@ -0,0 +1,155 @@
+import json
+import time
+from typing import AsyncIterator, Iterable, Iterator, List, Optional
+
+try:
+    import orjson
+
+    def loads(data):
+        """Parse JSON from bytes or str, using orjson when it is installed."""
+        return orjson.loads(data)
+except ImportError:  # pragma: no cover - depends on the environment
+    orjson = None
+
+    def loads(data):
+        """Parse JSON from bytes or str, using orjson when it is installed."""
+        return json.loads(data)
+
+
+class ServerSentEvent:
+    """One dispatched event. data is the raw bytes of its joined data: lines."""
+
+    __slots__ = ("event", "data", "id", "retry")
+
+    def __init__(self, data: bytes, event: str = "message", id: Optional[str] = None, retry: Optional[int] = None):
+        self.data = data
+        self.event = event
+        self.id = id
+        self.retry = retry
+
+    def json(self):
+        return loads(self.data)
+
+    def __repr__(self):
+        return f"ServerSentEvent(event={self.event!r}, data={self.data!r})"
+
+
+class SSEDecoder:
+    """
+    Incremental decoder for text/event-stream bodies that works on raw bytes,
+    as they arrive off the socket. Handles CRLF, CR and LF line endings,
+    multi-line data fields, comments, and the event, id and retry fields.
+    """
+
+    def __init__(self):
+        self._buffer = b""
+        self._last_id = None
+        self._retry = None
+
+    def feed(self, chunk: bytes) -> List[ServerSentEvent]:
+        """Decode a chunk of bytes, returning any events it completed."""
+        buffer = self._buffer + chunk
+        if b"\r" in buffer:
+            # A trailing CR may be the first half of a CRLF split across chunks
+            tail = b"\r" if buffer.endswith(b"\r") else b""
+            if tail:
+                buffer = buffer[:-1]
+            buffer = buffer.replace(b"\r\n", b"\n").replace(b"\r", b"\n") + tail
+        # Only whole events, terminated by a blank line, are decoded; the
+        # remainder waits in the buffer for the next chunk
+        blocks = buffer.split(b"\n\n")
+        self._buffer = blocks.pop()
+        events = []
+        for block in blocks:
+            event = self._block(block)
+            if event is not None:
+                events.append(event)
+        return events
+
+    def flush(self) -> List[ServerSentEvent]:
+        """Decode whatever is left once the stream has ended."""
+        block, self._buffer = self._buffer.replace(b"\r", b"\n"), b""
+        event = self._block(block.rstrip(b"\n"))
+        return [event] if event is not None else []
+
+    def _block(self, block: bytes) -> Optional[ServerSentEvent]:
+        # Fast path: the typical event is a single "data: ..." line
+        if block[:6] == b"data: " and b"\n" not in block:
+            return ServerSentEvent(block[6:], "message", self._last_id, self._retry)
+        data = []
+        event_type = None
+        for line in block.split(b"\n"):
+            if not line or line[:1] == b":":
+                continue  # Blank line, or a comment such as a keep-alive ping
+            field, _, value = line.partition(b":")
+            if value[:1] == b" ":
+                value = value[1:]
+            if field == b"data":
+                data.append(value)
+            elif field == b"event":
+                event_type = value.decode("utf-8")
+            elif field == b"id":
+                if b"\0" not in value:
+                    self._last_id = value.decode("utf-8")
+            elif field == b"retry":
+                if value.isdigit():
+                    self._retry = int(value)
+        if not data:
+            return None
+        return ServerSentEvent(b"\n".join(data), event_type or "message", self._last_id, self._retry)
+
+
+def iter_sse(byte_chunks: Iterable[bytes]) -> Iterator[ServerSentEvent]:
+    """Decode server-sent events from an iterable of byte chunks."""
+    decoder = SSEDecoder()
+    for chunk in byte_chunks:
+        yield from decoder.feed(chunk)
+    yield from decoder.flush()
+
+
+async def aiter_sse(byte_chunks: AsyncIterator[bytes]) -> AsyncIterator[ServerSentEvent]:
+    """Async counterpart of iter_sse()."""
+    decoder = SSEDecoder()
+    async for chunk in byte_chunks:
+        for event in decoder.feed(chunk):
+            yield event
+    for event in decoder.flush():
+        yield event
+
+
+def coalesce(deltas: Iterable[str], flush_interval: float) -> Iterator[str]:
+    """
+    Join small text deltas so that at most one string is yielded per
+    flush_interval seconds. The first delta is yielded right away so time to
+    first token is unaffected. A buffered delta is only released when the
+    next one arrives or the stream ends.
+    """
+    if not flush_interval or flush_interval <= 0:
+        yield from deltas
+        return
+    pending = []
+    last_flush = None
+    for delta in deltas:
+        pending.append(delta)
+        now = time.monotonic()
+        if last_flush is None or now - last_flush >= flush_interval:
+            yield "".join(pending)
+            pending = []
+            last_flush = now
+    if pending:
+        yield "".join(pending)
+
+
+async def acoalesce(deltas: AsyncIterator[str], flush_interval: float) -> AsyncIterator[str]:
+    """Async counterpart of coalesce()."""
+    pending = []
+    last_flush = None
+    async for delta in deltas:
+        pending.append(delta)
+        now = time.monotonic()
+        if not flush_interval or last_flush is None or now - last_flush >= flush_interval:
+            yield "".join(pending)
+            pending = []
+            last_flush = now
+    if pending:
+        yield "".join(pending)
@@ -0,0 +1,32 @@
+from typing import Any, Dict, List
+
+# Rough average for English text with Llama-family tokenizers
+CHARS_PER_TOKEN = 4
+# Role markers and separators the chat template adds around each message
+TOKENS_PER_MESSAGE = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap approximation of the number of tokens in text."""
+    if not text:
+        return 0
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def estimate_message_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Approximate prompt tokens for a list of chat messages."""
+    total = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            total += estimate_tokens(content)
+        total += TOKENS_PER_MESSAGE
+    return total
+
+
+def estimate_request_tokens(data: Dict[str, Any]) -> int:
+    """
+    Tokens a chat completion request may consume against a tokens-per-minute
+    budget: the prompt plus max_tokens when one is set.
+    """
+    return estimate_message_tokens(data.get("messages") or []) + (data.get("max_tokens") or 0)
@@ -0,0 +1,142 @@
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import llm
+
+DEFAULT_TOOL_WORKERS = 8
+
+# Values of tool_choice the API understands; anything else names a tool
+_TOOL_CHOICES = ("auto", "none", "required")
+
+
+def tool_definitions(tools) -> List[Dict[str, Any]]:
+    """The tools parameter of a chat completion request."""
+    definitions = []
+    for tool in tools:
+        function = {"name": tool.name, "parameters": tool.input_schema or {"type": "object", "properties": {}}}
+        if tool.description:
+            function["description"] = tool.description
+        definitions.append({"type": "function", "function": function})
+    return definitions
+
+
+def tool_choice(choice: str):
+    """The tool_choice parameter: auto, none, required, or the name of a tool to force."""
+    if choice in _TOOL_CHOICES:
+        return choice
+    return {"type": "function", "function": {"name": choice}}
+
+
+def tool_call_dicts(tool_calls) -> List[Dict[str, Any]]:
+    """llm ToolCalls in the API's format, for the history of a conversation."""
+    return [
+        {
+            "id": tool_call.tool_call_id,
+            "type": "function",
+            "function": {"name": tool_call.name, "arguments": json.dumps(tool_call.arguments)},
+        }
+        for tool_call in tool_calls
+    ]
+
+
+def tool_result_messages(tool_results) -> List[Dict[str, Any]]:
+    return [
+        {"role": "tool", "tool_call_id": result.tool_call_id, "content": result.output}
+        for result in tool_results
+    ]
+
+
+def parse_tool_calls(raw_calls: List[Dict[str, Any]]) -> List[llm.ToolCall]:
+    """Turn the tool_calls of a completion into llm ToolCalls."""
+    tool_calls = []
+    for raw in raw_calls:
+        function = raw.get("function") or {}
+        try:
+            arguments = json.loads(function.get("arguments") or "{}")
+        except json.JSONDecodeError as e:
+            raise llm.ModelError(f"Invalid arguments for tool {function.get('name')}: {e}")
+        tool_calls.append(llm.ToolCall(name=function.get("name"), arguments=arguments, tool_call_id=raw.get("id")))
+    return tool_calls
+
+
+class ToolCallDeltas:
+    """Assembles the tool calls of a stream from their chunk by chunk deltas."""
+
+    def __init__(self):
+        self._calls: Dict[int, Dict[str, Any]] = {}
+
+    def add(self, deltas: List[Dict[str, Any]]):
+        for delta in deltas:
+            call = self._calls.setdefault(
+                delta.get("index", len(self._calls)),
+                {"id": None, "type": "function", "function": {"name": "", "arguments": ""}},
+            )
+            if delta.get("id"):
+                call["id"] = delta["id"]
+            function = delta.get("function") or {}
+            if function.get("name"):
+                call["function"]["name"] += function["name"]
+            if function.get("arguments"):
+                call["function"]["arguments"] += function["arguments"]
+
+    def calls(self) -> List[Dict[str, Any]]:
+        return [self._calls[index] for index in sorted(self._calls)]
+
+
+def _workers_from_env() -> int:
+    try:
+        return max(1, int(os.environ.get("LLM_CEREBRAS_TOOL_WORKERS", DEFAULT_TOOL_WORKERS)))
+    except ValueError:
+        return DEFAULT_TOOL_WORKERS
+
+
+def run_tool_calls_in_parallel(response, max_workers: Optional[int] = None):
+    """
+    Make response.execute_tool_calls() run the tool calls of a turn
+    concurrently on a thread pool, so a chain does not wait for each slow
+    tool in turn. Results keep the order of the calls.
+
+    With a before_call or after_call callback, such as the approval prompt
+    of `llm --ta`, the calls run one at a time as usual, so callbacks never
+    overlap and a PauseChain leaves the later calls unstarted. Without
+    them, a call that pauses lets the calls already running finish, and
+    their results are kept on the PauseChain, as with async tool calls.
+    """
+    execute_serially = response.execute_tool_calls
+    max_workers = max_workers or _workers_from_env()
+
+    def execute_tool_calls(*, before_call=None, after_call=None, tool_calls_list=None, tools=None):
+        if tool_calls_list is None:
+            tool_calls_list = response.tool_calls()
+        if len(tool_calls_list) < 2 or max_workers < 2 or before_call or after_call:
+            return execute_serially(
+                before_call=before_call, after_call=after_call, tool_calls_list=tool_calls_list, tools=tools
+            )
+        # Prepare any toolboxes once, before the calls race to do it
+        execute_serially(tool_calls_list=[], tools=tools)
+        with ThreadPoolExecutor(min(max_workers, len(tool_calls_list)), thread_name_prefix="cerebras-tool") as pool:
+            futures = [
+                pool.submit(execute_serially, tool_calls_list=[tool_call], tools=tools)
+                for tool_call in tool_calls_list
+            ]
+        # Leaving the pool waited for every call, so each future is done
+        results = []
+        paused = None
+        for future in futures:
+            error = future.exception()
+            if isinstance(error, llm.PauseChain):
+                paused = paused or error
+            elif error is not None:
+                raise error
+            else:
+                results.extend(future.result())
+        if paused is not None:
+            paused.tool_results = results
+            raise paused
+        logging.debug(f"Ran {len(tool_calls_list)} tool calls on up to {max_workers} threads")
+        return results
+
+    response.execute_tool_calls = execute_tool_calls
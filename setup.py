@@ -8,6 +8,10 @@ setup(
         "llm",
         "httpx",
     ],
+    extras_require={
+        "http2": ["httpx[http2]"],
+        "test": ["pytest"],
+    },
     entry_points={
         "llm": [
             "cerebras=llm_cerebras.cerebras",
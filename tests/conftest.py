@@ -0,0 +1,81 @@
+import time
+import pytest
+from unittest.mock import patch
+from llm_cerebras.cerebras import DEFAULT_MODELS, _SharedCerebras
+from llm_cerebras.cache import set_response_cache
+from llm_cerebras.circuit import set_circuit_breaker
+from llm_cerebras.fallback import forget_fallbacks
+from llm_cerebras.hedge import set_hedger
+from llm_cerebras.keypool import set_key_pool
+from llm_cerebras.ratelimit import RateLimiter, set_rate_limiter
+
+
+@pytest.fixture
+def fake_key():
+    """Give prompts an API key; use with pytest.mark.usefixtures("fake_key")."""
+    with patch("llm_cerebras.cerebras.llm.get_key", return_value="fake-api-key"):
+        yield
+
+
+@pytest.fixture(autouse=True)
+def isolated_user_dir(tmp_path, monkeypatch):
+    """Keep tests away from the real llm user directory and the network."""
+    monkeypatch.setenv("LLM_USER_PATH", str(tmp_path / "llm-user"))
+    monkeypatch.setattr(_SharedCerebras, "_cache_file", None)
+    for cls in _SharedCerebras.__subclasses__():
+        monkeypatch.setattr(cls, "_cache_file", None, raising=False)
+    monkeypatch.setattr(_SharedCerebras, "_models_memo", dict(DEFAULT_MODELS))
+    monkeypatch.setattr(_SharedCerebras, "_models_memo_time", time.time())
+    monkeypatch.setattr(_SharedCerebras, "_metadata_memo", None)
+    monkeypatch.setattr(_SharedCerebras, "_rejected_schemas", set())
+    monkeypatch.setattr(_SharedCerebras, "_refresh_failed_at", 0.0)
+
+
+@pytest.fixture(autouse=True)
+def fresh_rate_limiter():
+    """Give every test its own in-memory rate limiter."""
+    set_rate_limiter(RateLimiter())
+    yield
+    set_rate_limiter(RateLimiter())
+
+
+@pytest.fixture(autouse=True)
+def fresh_response_cache(monkeypatch):
+    """Recreate the response cache per test, inside the isolated user dir."""
+    monkeypatch.delenv("LLM_CEREBRAS_CACHE", raising=False)
+    set_response_cache(None)
+    yield
+    set_response_cache(None)
+
+
+@pytest.fixture(autouse=True)
+def fresh_key_pool():
+    """Read the key pool configuration again in every test."""
+    set_key_pool(None)
+    yield
+    set_key_pool(None)
+
+
+@pytest.fixture(autouse=True)
+def fresh_hedger(monkeypatch):
+    """Start every test without hedging history."""
+    monkeypatch.delenv("LLM_CEREBRAS_HEDGE", raising=False)
+    set_hedger(None)
+    yield
+    set_hedger(None)
+
+
+@pytest.fixture(autouse=True)
+def fresh_circuit_breaker():
+    """Close every circuit between tests."""
+    set_circuit_breaker(None)
+    yield
+    set_circuit_breaker(None)
+
+
+@pytest.fixture(autouse=True)
+def fresh_fallbacks():
+    """Read the fallback chains of each test's user dir."""
+    forget_fallbacks()
+    yield
+    forget_fallbacks()
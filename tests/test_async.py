@@ -0,0 +1,72 @@
+import asyncio
+import json
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+from llm_cerebras.cerebras import AsyncCerebrasModel, register_models
+
+@pytest.fixture
+def async_model():
+    return AsyncCerebrasModel("cerebras-llama3.1-8b")
+
+def make_prompt(schema=None):
+    prompt = MagicMock()
+    prompt.prompt = "Test prompt"
+    prompt.schema = schema
+    prompt.options = AsyncCerebrasModel.Options()
+    return prompt
+
+async def collect(generator):
+    return [chunk async for chunk in generator]
+
+def test_register_models_registers_async_model():
+    registered = []
+    register_models(lambda model, async_model=None, aliases=None: registered.append((model, async_model)))
+    assert registered
+    for model, async_model in registered:
+        assert isinstance(async_model, AsyncCerebrasModel)
+        assert async_model.model_id == model.model_id
+
+@patch('llm_cerebras.cerebras.get_async_client')
+@patch('llm_cerebras.cerebras.llm.get_key')
+def test_async_execute_non_streaming_with_schema(mock_get_key, mock_get_async_client, async_model):
+    mock_get_key.return_value = "fake-api-key"
+    mock_response = MagicMock()
+    mock_response.json.return_value = {
+        "choices": [{"message": {"content": '{"name": "Alice", "age": 30}'}}]
+    }
+    client = mock_get_async_client.return_value
+    client.post = AsyncMock(return_value=mock_response)
+
+    prompt = make_prompt(schema="name, age int")
+    result = asyncio.run(collect(async_model.execute(prompt, False, MagicMock(), None)))
+
+    assert [json.loads(r) for r in result] == [{"name": "Alice", "age": 30}]
+    sent = client.post.call_args[1]["json"]
+    assert sent["response_format"]["type"] == "json_schema"
+    assert sent["response_format"]["json_schema"]["strict"] is True
+    assert [m["role"] for m in sent["messages"]] == ["user"]
+
+@patch('llm_cerebras.cerebras.get_async_client')
+@patch('llm_cerebras.cerebras.llm.get_key')
+def test_async_execute_streaming(mock_get_key, mock_get_async_client, async_model):
+    mock_get_key.return_value = "fake-api-key"
+    lines = [
+        'data: {"choices": [{"delta": {"content": "Hel"}}]}',
+        '',
+        'data: {"choices": [{"delta": {"content": "lo"}}]}',
+        '',
+        'data: [DONE]',
+    ]
+
+    async def aiter_bytes():
+        for line in lines:
+            yield (line + "\n").encode()
+
+    stream_response = MagicMock()
+    stream_response.is_success = True
+    stream_response.aiter_bytes = aiter_bytes
+    stream_response.aclose = AsyncMock()
+    mock_get_async_client.return_value.send = AsyncMock(return_value=stream_response)
+
+    result = asyncio.run(collect(async_model.execute(make_prompt(), True, MagicMock(), None)))
+    assert result == ["Hel", "lo"]
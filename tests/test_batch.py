@@ -0,0 +1,130 @@
+import json
+import threading
+import time
+import pytest
+import httpx
+from click.testing import CliRunner
+from unittest.mock import patch
+from llm.cli import cli
+from llm_cerebras.batch import completed_ids, read_records, run_batch
+from llm_cerebras.cerebras import CerebrasModel
+
+pytestmark = pytest.mark.usefixtures("fake_key")
+
+def echo_client(delays=None, fail=()):
+    """Answer each prompt with its upper-cased text, optionally after a delay."""
+    state = {"active": 0, "peak": 0}
+    lock = threading.Lock()
+
+    def handler(request):
+        prompt = json.loads(request.content)["messages"][-1]["content"]
+        with lock:
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+        time.sleep((delays or {}).get(prompt, 0))
+        with lock:
+            state["active"] -= 1
+        if prompt in fail:
+            return httpx.Response(400, json={"message": "bad prompt"})
+        return httpx.Response(200, json={
+            "choices": [{"message": {"content": prompt.upper()}}],
+            "usage": {"prompt_tokens": 3, "completion_tokens": 2, "total_tokens": 5},
+        })
+
+    return httpx.Client(transport=httpx.MockTransport(handler)), state
+
+def test_read_records_jsonl_and_csv():
+    jsonl = ['{"id": "a", "prompt": "one"}\n', '\n', '"two"\n']
+    assert list(read_records(jsonl)) == [{"id": "a", "prompt": "one"}, {"id": 1, "prompt": "two"}]
+    csv_lines = ["text,system\n", "hello,be brief\n"]
+    assert list(read_records(csv_lines, "csv", prompt_field="text")) == [
+        {"id": 0, "prompt": "hello", "system": "be brief"}
+    ]
+    with pytest.raises(ValueError):
+        list(read_records(['{"text": "x"}']))
+
+def test_run_batch_input_order_and_bounded_concurrency():
+    prompts = [f"p{i}" for i in range(12)]
+    client, state = echo_client(delays={"p0": 0.2, "p5": 0.1})
+    results = []
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        counts = run_batch(
+            CerebrasModel("cerebras-llama3.1-8b"),
+            read_records(json.dumps(p) for p in prompts),
+            results.append,
+            concurrency=3,
+        )
+    assert counts == {"completed": 12, "failed": 0, "skipped": 0, "restored": 0}
+    assert [r["response"] for r in results] == [p.upper() for p in prompts]
+    assert results[0]["usage"] == {"input": 3, "output": 2}
+    assert state["peak"] <= 3
+
+def test_run_batch_sends_system_prompts():
+    bodies = []
+
+    def handler(request):
+        bodies.append(json.loads(request.content))
+        return httpx.Response(200, json={"choices": [{"message": {"content": "ok"}}]})
+
+    with patch("llm_cerebras.cerebras.get_client", return_value=httpx.Client(transport=httpx.MockTransport(handler))):
+        run_batch(
+            CerebrasModel("cerebras-llama3.1-8b"),
+            read_records(['{"prompt": "one", "system": "be brief"}', '"two"']),
+            lambda result: None,
+            concurrency=1,
+            system="be kind",
+        )
+    assert [body["messages"] for body in bodies] == [
+        [{"role": "system", "content": "be brief"}, {"role": "user", "content": "one"}],
+        [{"role": "system", "content": "be kind"}, {"role": "user", "content": "two"}],
+    ]
+
+def test_run_batch_completion_order_reports_failures():
+    client, _ = echo_client(delays={"slow": 0.2}, fail={"bad"})
+    results = []
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        counts = run_batch(
+            CerebrasModel("cerebras-llama3.1-8b"),
+            read_records(['"slow"', '"fast"', '"bad"']),
+            results.append,
+            concurrency=3,
+            order="completion",
+        )
+    assert counts == {"completed": 2, "failed": 1, "skipped": 0, "restored": 0}
+    assert results[-1]["id"] == 0
+    assert "error" in next(r for r in results if r["id"] == 2)
+
+def test_completed_ids_truncates_partial_line(tmp_path):
+    output = tmp_path / "out.jsonl"
+    output.write_text('{"id": 0, "response": "A"}\n{"id": 1, "error": "boom"}\n{"id": 2, "resp')
+    assert completed_ids(output) == {"0"}
+    assert output.read_text().endswith('"boom"}\n')
+
+def test_cli_batch_resumes_from_output(tmp_path):
+    input_path = tmp_path / "prompts.jsonl"
+    input_path.write_text("".join(json.dumps({"id": f"r{i}", "prompt": f"p{i}"}) + "\n" for i in range(4)))
+    output = tmp_path / "out.jsonl"
+    output.write_text('{"id": "r0", "response": "P0"}\n{"id": "r1", "error": "boom"}\n')
+    client, _ = echo_client()
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        result = CliRunner().invoke(
+            cli, ["cerebras", "batch", str(input_path), "--output", str(output), "-c", "2"]
+        )
+    assert result.exit_code == 0, result.output
+    assert "3 completed, 0 failed, 1 skipped" in result.output
+    rows = [json.loads(line) for line in output.read_text().splitlines()]
+    assert [row["id"] for row in rows] == ["r0", "r1", "r1", "r2", "r3"]
+    assert rows[-1]["response"] == "P3"
+
+def test_cli_batch_with_schema_from_stdin():
+    client, _ = echo_client()
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        result = CliRunner().invoke(
+            cli,
+            ["cerebras", "batch", "--schema", "NAME", "--format", "csv"],
+            input='prompt\n"{""name"": ""x""}"\n',
+        )
+    assert result.exit_code == 0, result.output
+    row = json.loads(result.output.splitlines()[0])
+    assert row["json"] == {"NAME": "X"}
+    assert row["attempts"] == 1
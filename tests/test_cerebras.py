@@ -19,10 +19,11 @@ def test_build_messages(cerebras_model):
     assert len(messages) == 1
     assert messages[0] == {"role": "user", "content": "Test prompt"}
 
-@patch('llm_cerebras.cerebras.httpx.post')
+@patch('llm_cerebras.cerebras.get_client')
 @patch('llm_cerebras.cerebras.llm.get_key')
-def test_execute_non_streaming(mock_get_key, mock_post, cerebras_model):
+def test_execute_non_streaming(mock_get_key, mock_get_client, cerebras_model):
     mock_get_key.return_value = "fake-api-key"
+    mock_post = mock_get_client.return_value.post
     mock_response = MagicMock()
     mock_response.raise_for_status.return_value = None
     mock_response.json.return_value = {
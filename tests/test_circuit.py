@@ -0,0 +1,175 @@
+import asyncio
+import json
+import time
+import httpx
+import pytest
+from unittest.mock import patch
+from llm_cerebras.cerebras import AsyncCerebrasModel, CerebrasModel
+from llm_cerebras.circuit import CircuitBreaker, CircuitOpenError, set_circuit_breaker
+from llm_cerebras.client import DeadlineExceeded, attempt_timeout
+
+pytestmark = pytest.mark.usefixtures("fake_key")
+
+def status_client(statuses, requests, client_class=httpx.Client):
+    """Answer successive requests with the given status codes."""
+    def handler(request):
+        requests.append(request)
+        status = statuses[min(len(requests), len(statuses)) - 1]
+        if status != 200:
+            return httpx.Response(status, json={"message": "error"})
+        return httpx.Response(200, json={"choices": [{"message": {"content": "ok"}}]})
+    return client_class(transport=httpx.MockTransport(handler))
+
+def test_failure_rate_over_window_opens_circuit():
+    breaker = CircuitBreaker(failure_threshold=100, min_calls=4, failure_rate=0.5, slow_call=1.0)
+    breaker.record_success("m", 0.1)
+    breaker.record_failure("m", 0.1)
+    breaker.record_success("m", 0.1)
+    assert breaker.state("m") == "closed"
+    # Slow calls count against the circuit like failures
+    breaker.record_success("m", 5.0)
+    assert breaker.state("m") == "open"
+    health = breaker.health()["m"]
+    assert (health["calls"], health["failure_rate"], health["slow_rate"]) == (4, 0.25, 0.25)
+    assert health["latency_p50_ms"] == pytest.approx(100)
+
+def test_old_outcomes_leave_the_window():
+    breaker = CircuitBreaker(failure_threshold=100, min_calls=2, window=60)
+    breaker.record_failure("m")
+    breaker._circuits["m"].outcomes[0] = (time.monotonic() - 120, True, None)
+    breaker.record_success("m")
+    assert breaker.state("m") == "closed"
+    assert breaker.health()["m"]["calls"] == 1
+
+def test_open_endpoint_fails_fast():
+    set_circuit_breaker(CircuitBreaker(failure_threshold=2))
+    requests = []
+    with patch("llm_cerebras.cerebras.get_client", return_value=status_client([500], requests)), \
+            patch("llm_cerebras.cerebras.time.sleep"):
+        with pytest.raises(httpx.HTTPStatusError):
+            CerebrasModel("cerebras-llama3.1-8b").prompt("hi", stream=False, max_retries=1).text()
+        assert len(requests) == 2
+        # Another model, but the same failing endpoint
+        with pytest.raises(CircuitOpenError, match="api.cerebras.ai"):
+            CerebrasModel("cerebras-llama3.3-70b").prompt("hi", stream=False).text()
+    assert len(requests) == 2
+
+def test_half_open_probe_closes_circuit():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    set_circuit_breaker(breaker)
+    requests = []
+    with patch("llm_cerebras.cerebras.get_client", return_value=status_client([500, 200], requests)):
+        with pytest.raises(httpx.HTTPStatusError):
+            CerebrasModel("cerebras-llama3.1-8b").prompt("hi", stream=False, max_retries=0).text()
+        with pytest.raises(CircuitOpenError, match="retry in 60s"):
+            CerebrasModel("cerebras-llama3.1-8b").prompt("hi", stream=False).text()
+        breaker.reset_timeout = 0
+        assert CerebrasModel("cerebras-llama3.1-8b").prompt("hi", stream=False).text() == "ok"
+    assert breaker.states() == {}
+
+def test_open_endpoint_leaves_the_model_probe_unspent():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    set_circuit_breaker(breaker)
+    breaker.record_failure("api.cerebras.ai")
+    breaker.record_failure("llama3.1-8b")
+    # The model is half-open, the endpoint still open
+    breaker._circuits["llama3.1-8b"].opened_at -= 60
+    requests = []
+    with patch("llm_cerebras.cerebras.get_client", return_value=status_client([200], requests)):
+        with pytest.raises(CircuitOpenError, match="api.cerebras.ai"):
+            CerebrasModel("cerebras-llama3.1-8b").prompt("hi", stream=False).text()
+        breaker._circuits["api.cerebras.ai"].opened_at -= 60
+        assert CerebrasModel("cerebras-llama3.1-8b").prompt("hi", stream=False).text() == "ok"
+    assert breaker.states() == {}
+
+def test_failing_model_gives_back_the_endpoint_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=60)
+    set_circuit_breaker(breaker)
+    breaker.record_failure("api.cerebras.ai")
+    breaker.record_failure("llama3.1-8b")
+    # The endpoint is half-open, the model still open
+    breaker._circuits["api.cerebras.ai"].opened_at -= 60
+    requests = []
+    with patch("llm_cerebras.cerebras.get_client", return_value=status_client([200], requests)):
+        with pytest.raises(CircuitOpenError, match="llama3.1-8b"):
+            CerebrasModel("cerebras-llama3.1-8b").prompt("hi", stream=False).text()
+        assert CerebrasModel("cerebras-llama3.3-70b").prompt("hi", stream=False).text() == "ok"
+    assert breaker.states() == {"llama3.1-8b": "open"}
+
+def test_stalled_stream_counts_against_the_model():
+    breaker = CircuitBreaker(failure_threshold=1)
+    set_circuit_breaker(breaker)
+
+    def body():
+        yield b'data: {"choices": [{"delta": {"content": "hi"}}]}\n\n'
+        raise httpx.ReadTimeout("stalled")
+
+    client = httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(200, content=body())))
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        with pytest.raises(httpx.ReadTimeout):
+            list(CerebrasModel("cerebras-llama3.1-8b").prompt("hi"))
+    assert breaker.states() == {"api.cerebras.ai": "open", "llama3.1-8b": "open"}
+
+def test_client_errors_do_not_trip_the_circuit():
+    set_circuit_breaker(CircuitBreaker(failure_threshold=1))
+    requests = []
+    with patch("llm_cerebras.cerebras.get_client", return_value=status_client([400, 200], requests)):
+        with pytest.raises(httpx.HTTPStatusError):
+            CerebrasModel("cerebras-llama3.1-8b").prompt("hi", stream=False).text()
+        assert CerebrasModel("cerebras-llama3.1-8b").prompt("hi", stream=False).text() == "ok"
+
+def test_requests_have_connect_and_read_timeouts():
+    requests = []
+    with patch("llm_cerebras.cerebras.get_client", return_value=status_client([200], requests)):
+        CerebrasModel("cerebras-llama3.1-8b").prompt("hi", stream=False).text()
+        CerebrasModel("cerebras-llama3.1-8b").prompt(
+            "hi", stream=False, connect_timeout=2, read_timeout=5, timeout=0
+        ).text()
+    assert requests[0].extensions["timeout"] == {"connect": 10.0, "read": 120.0, "write": 120.0, "pool": 10.0}
+    assert requests[1].extensions["timeout"] == {"connect": 2, "read": 5, "write": 5, "pool": 2}
+
+def test_timeouts_are_cut_to_the_deadline():
+    timeout = attempt_timeout(deadline=time.monotonic() + 3)
+    assert 2 < timeout.read <= 3 and 2 < timeout.connect <= 3
+    with pytest.raises(DeadlineExceeded):
+        attempt_timeout(deadline=time.monotonic() - 1)
+
+def test_no_retry_past_the_deadline():
+    requests = []
+    client = status_client([503], requests)
+    with patch("llm_cerebras.cerebras.get_client", return_value=client), \
+            patch("llm_cerebras.cerebras.time.sleep") as sleep:
+        with pytest.raises(httpx.HTTPStatusError):
+            CerebrasModel("cerebras-llama3.1-8b").prompt("hi", stream=False, timeout=0.2).text()
+    # The first backoff, at least 0.25s, would overrun the deadline
+    assert len(requests) == 1
+    sleep.assert_not_called()
+
+def test_stream_past_deadline_is_cut_off():
+    def body():
+        for i in range(5):
+            chunk = {"choices": [{"delta": {"content": f"{i} "}}]}
+            yield f"data: {json.dumps(chunk)}\n\n".encode()
+            time.sleep(0.1)
+
+    client = httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(200, content=body())))
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        response = CerebrasModel("cerebras-llama3.1-8b").prompt("count", timeout=0.25)
+        with pytest.raises(DeadlineExceeded):
+            list(response)
+
+def test_async_circuit_fails_fast():
+    set_circuit_breaker(CircuitBreaker(failure_threshold=1))
+    requests = []
+    client = status_client([502], requests, httpx.AsyncClient)
+
+    async def run():
+        with patch("llm_cerebras.cerebras.get_async_client", return_value=client):
+            model = AsyncCerebrasModel("cerebras-llama3.1-8b")
+            with pytest.raises(httpx.HTTPStatusError):
+                await model.prompt("hi", stream=False, max_retries=0).text()
+            with pytest.raises(CircuitOpenError):
+                await model.prompt("hi", stream=False).text()
+
+    asyncio.run(run())
+    assert len(requests) == 1
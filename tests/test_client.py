@@ -0,0 +1,79 @@
+import asyncio
+import pytest
+import httpx
+from llm_cerebras import client
+
+
+@pytest.fixture(autouse=True)
+def reset_client():
+    client.close_client()
+    client._client_settings.clear()
+    yield
+    client.close_client()
+    client._client_settings.clear()
+
+
+def test_get_client_is_shared():
+    first = client.get_client()
+    assert isinstance(first, httpx.Client)
+    assert client.get_client() is first
+
+def test_get_client_recreated_after_close():
+    first = client.get_client()
+    client.close_client()
+    assert first.is_closed
+    second = client.get_client()
+    assert second is not first
+    assert not second.is_closed
+
+def test_client_settings_from_environment(monkeypatch):
+    monkeypatch.setenv("LLM_CEREBRAS_MAX_CONNECTIONS", "7")
+    monkeypatch.setenv("LLM_CEREBRAS_KEEPALIVE_EXPIRY", "2.5")
+    monkeypatch.setenv("LLM_CEREBRAS_HTTP2", "0")
+    settings = client.client_settings()
+    assert settings["max_connections"] == 7
+    assert settings["keepalive_expiry"] == 2.5
+    assert settings["http2"] is False
+
+def test_configure_client_replaces_existing_client():
+    first = client.get_client()
+    client.configure_client(max_connections=3, max_keepalive_connections=1)
+    assert first.is_closed
+    assert client.client_settings()["max_connections"] == 3
+    assert client.get_client() is not first
+
+def test_async_client_shared_within_event_loop():
+    async def fetch_twice():
+        first = client.get_async_client()
+        second = client.get_async_client()
+        await client.aclose_async_client()
+        return first, second
+
+    first, second = asyncio.run(fetch_twice())
+    assert first is second
+    assert first.is_closed
+
+def test_async_client_closed_when_its_loop_shuts_down():
+    async def fetch():
+        return client.get_async_client()
+
+    assert asyncio.run(fetch()).is_closed
+
+def test_configure_client_closes_async_clients():
+    async def reconfigure():
+        first = client.get_async_client()
+        client.configure_client(max_connections=3)
+        await asyncio.sleep(0)
+        return first, first.is_closed, client.get_async_client()
+
+    first, closed, second = asyncio.run(reconfigure())
+    assert closed
+    assert second is not first
+
+    loop = asyncio.new_event_loop()
+    try:
+        idle = loop.run_until_complete(reconfigure())[2]
+        client.configure_client(max_connections=4)
+        assert idle.is_closed
+    finally:
+        loop.close()
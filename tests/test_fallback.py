@@ -0,0 +1,132 @@
+import asyncio
+import json
+import httpx
+import pytest
+from click.testing import CliRunner
+from llm.cli import cli
+from unittest.mock import patch
+from llm_cerebras.cerebras import AsyncCerebrasModel, CerebrasModel
+from llm_cerebras.circuit import CircuitBreaker, get_circuit_breaker, set_circuit_breaker
+from llm_cerebras import fallback
+from llm_cerebras.fallback import load_fallbacks, model_unavailable
+
+pytestmark = pytest.mark.usefixtures("fake_key")
+
+def model_client(status_for, models, client_class=httpx.Client):
+    """Answer as the requested model, or with its status from status_for."""
+    def handler(request):
+        model = json.loads(request.content)["model"]
+        models.append(model)
+        status = status_for.get(model, 200)
+        if status != 200:
+            return httpx.Response(status, json={"message": "unavailable"})
+        return httpx.Response(200, json={"choices": [{"message": {"content": f"from {model}"}}]})
+    return client_class(transport=httpx.MockTransport(handler))
+
+@pytest.mark.parametrize("status, body, unavailable", [
+    (503, {"message": "overloaded"}, True),
+    (404, {"message": "Model does not exist"}, True),
+    (429, {"message": "We're experiencing high traffic", "code": "queue_exceeded"}, True),
+    (429, {"message": "Requests per minute limit exceeded", "code": "request_quota_exceeded"}, False),
+    (400, {"error": {"message": "no such model", "code": "model_not_found"}}, True),
+    (400, {"message": "bad request"}, False),
+    (500, {"message": "oops"}, False),
+])
+def test_model_unavailable(status, body, unavailable):
+    assert model_unavailable(httpx.Response(status, json=body)) is unavailable
+
+def test_unavailable_model_falls_back():
+    models = []
+    with patch("llm_cerebras.cerebras.get_client", return_value=model_client({"llama-3.3-70b": 503}, models)):
+        response = CerebrasModel("cerebras-llama3.3-70b").prompt(
+            "hi", stream=False, fallback="cerebras-qwen-3-32b, llama3.1-8b"
+        )
+        assert response.text() == "from qwen-3-32b"
+    assert models == ["llama-3.3-70b", "qwen-3-32b"]
+    assert response.resolved_model == "qwen-3-32b"
+    assert response.response_json["fallback"] == {"requested": "llama-3.3-70b", "model": "qwen-3-32b"}
+
+def test_last_model_in_chain_is_retried_as_usual():
+    models = []
+    client = model_client({"llama-3.3-70b": 503, "llama3.1-8b": 503}, models)
+    with patch("llm_cerebras.cerebras.get_client", return_value=client), \
+            patch("llm_cerebras.cerebras.time.sleep"):
+        with pytest.raises(httpx.HTTPStatusError):
+            CerebrasModel("cerebras-llama3.3-70b").prompt(
+                "hi", stream=False, fallback="llama3.1-8b", max_retries=1
+            ).text()
+    assert models == ["llama-3.3-70b", "llama3.1-8b", "llama3.1-8b"]
+
+def test_open_circuit_is_skipped_until_probe():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    set_circuit_breaker(breaker)
+    models = []
+    status_for = {"llama-3.3-70b": 503}
+    with patch("llm_cerebras.cerebras.get_client", return_value=model_client(status_for, models)):
+        for i in range(4):
+            CerebrasModel("cerebras-llama3.3-70b").prompt(f"hi {i}", stream=False, fallback="llama3.1-8b").text()
+        assert models.count("llama-3.3-70b") == 2
+        assert breaker.state("llama-3.3-70b") == "open"
+
+        # Once reset_timeout has passed, one request probes the model again
+        breaker.reset_timeout = 0
+        status_for.clear()
+        models.clear()
+        response = CerebrasModel("cerebras-llama3.3-70b").prompt("again", stream=False, fallback="llama3.1-8b")
+        assert response.text() == "from llama-3.3-70b"
+    assert breaker.state("llama-3.3-70b") == "closed"
+
+def test_half_open_circuit_admits_one_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+    breaker.record_failure("m")
+    assert breaker.state("m") == "half-open"
+    breaker.reset_timeout = 60
+    breaker._circuits["m"].opened_at -= 60
+    assert breaker.allow("m") is True
+    assert breaker.allow("m") is False
+    breaker.record_failure("m")
+    assert breaker.states() == {"m": "open"}
+
+def test_configured_chain(tmp_path):
+    runner = CliRunner()
+    result = runner.invoke(cli, ["cerebras", "fallback", "cerebras-llama3.3-70b", "llama3.1-8b"])
+    assert result.exit_code == 0, result.output
+    assert load_fallbacks() == {"cerebras-llama3.3-70b": ["llama3.1-8b"]}
+    assert "cerebras-llama3.3-70b: llama3.1-8b" in runner.invoke(cli, ["cerebras", "fallback"]).output
+
+    models = []
+    with patch("llm_cerebras.cerebras.get_client", return_value=model_client({"llama-3.3-70b": 404}, models)):
+        assert CerebrasModel("cerebras-llama3.3-70b").prompt("hi", stream=False).text() == "from llama3.1-8b"
+
+    runner.invoke(cli, ["cerebras", "fallback", "cerebras-llama3.3-70b", "--clear"])
+    assert load_fallbacks() == {}
+
+def test_configured_chains_are_read_once():
+    runner = CliRunner()
+    runner.invoke(cli, ["cerebras", "fallback", "cerebras-llama3.3-70b", "llama3.1-8b"])
+    models = []
+    client = model_client({"llama-3.3-70b": 404}, models)
+    with patch("llm_cerebras.cerebras.get_client", return_value=client), \
+            patch.object(fallback, "load_fallbacks", wraps=load_fallbacks) as load, \
+            patch.object(fallback.llm, "user_dir", wraps=fallback.llm.user_dir) as user_dir:
+        for _ in range(3):
+            assert CerebrasModel("cerebras-llama3.3-70b").prompt("hi", stream=False).text() == "from llama3.1-8b"
+        CerebrasModel("cerebras-llama3.3-70b").prompt("hi", stream=False, fallback="qwen-3-32b").text()
+        assert load.call_count == 1
+        assert user_dir.call_count == 1
+
+        # Changes made with `llm cerebras fallback` are picked up
+        runner.invoke(cli, ["cerebras", "fallback", "cerebras-llama3.3-70b", "qwen-3-32b"])
+        assert CerebrasModel("cerebras-llama3.3-70b").prompt("hi", stream=False).text() == "from qwen-3-32b"
+
+def test_async_fallback():
+    models = []
+    client = model_client({"llama-3.3-70b": 503}, models, httpx.AsyncClient)
+
+    async def run():
+        with patch("llm_cerebras.cerebras.get_async_client", return_value=client):
+            response = AsyncCerebrasModel("cerebras-llama3.3-70b").prompt("hi", stream=False, fallback="llama3.1-8b")
+            return await response.text(), response.resolved_model
+
+    assert asyncio.run(run()) == ("from llama3.1-8b", "llama3.1-8b")
+    assert get_circuit_breaker()._circuits["llama-3.3-70b"].failures == 1
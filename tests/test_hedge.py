@@ -0,0 +1,168 @@
+import asyncio
+import json
+import time
+import httpx
+import pytest
+from unittest.mock import patch
+from llm_cerebras.cerebras import AsyncCerebrasModel, CerebrasModel
+from llm_cerebras.hedge import Hedger, get_hedger, set_hedger
+
+MODEL = "llama3.1-8b"
+
+pytestmark = pytest.mark.usefixtures("fake_key")
+
+@pytest.fixture
+def hedger():
+    """A hedger that has seen fast first tokens and may hedge every request."""
+    hedger = Hedger(budget=1.0, min_samples=5)
+    for _ in range(5):
+        hedger.observe(MODEL, 0.02)
+    set_hedger(hedger)
+    return hedger
+
+def sse(text):
+    chunk = {"choices": [{"delta": {"content": text}}]}
+    return f"data: {json.dumps(chunk)}\n\n".encode() + b"data: [DONE]\n\n"
+
+def racing_client(first_delays, requests):
+    """Stream "reply N" for request N after its delay in first_delays."""
+    def handler(request):
+        requests.append(request)
+        n = len(requests)
+        delay = first_delays[n - 1]
+
+        def body():
+            time.sleep(delay)
+            yield sse(f"reply {n}")
+        return httpx.Response(200, content=body())
+    return httpx.Client(transport=httpx.MockTransport(handler))
+
+def test_hedger_delay_and_budget():
+    hedger = Hedger(budget=0.5, min_samples=4)
+    assert hedger.start(MODEL) is None
+    for seconds in (0.1, 0.2, 0.3, 1.0):
+        hedger.observe(MODEL, seconds)
+    assert hedger.delay(MODEL, 50) == 0.3
+    assert hedger.delay(MODEL, 99) == 1.0
+    assert hedger.try_hedge(MODEL) is False
+    hedger.start(MODEL)
+    assert hedger.try_hedge(MODEL) is True
+    assert hedger.try_hedge(MODEL) is False
+    hedger.won(MODEL)
+    assert hedger.stats()[MODEL] == {"requests": 2, "hedged": 1, "won": 1, "win_rate": 1.0}
+
+def test_slow_stream_is_hedged(hedger):
+    requests = []
+    with patch("llm_cerebras.cerebras.get_client", return_value=racing_client([1.0, 0], requests)):
+        response = CerebrasModel("cerebras-llama3.1-8b").prompt("hi", hedge=True)
+        assert response.text() == "reply 2"
+    assert len(requests) == 2
+    assert json.loads(requests[1].content) == json.loads(requests[0].content)
+    assert response.response_json["hedge"]["winner"] == "hedge"
+    assert hedger.stats()[MODEL]["won"] == 1
+
+def test_fast_stream_is_not_hedged(hedger):
+    requests = []
+    with patch("llm_cerebras.cerebras.get_client", return_value=racing_client([0, 0], requests)):
+        response = CerebrasModel("cerebras-llama3.1-8b").prompt("hi", hedge=True)
+        assert response.text() == "reply 1"
+    assert len(requests) == 1
+    assert "hedge" not in (response.response_json or {})
+
+def test_hedges_stay_within_budget(hedger):
+    hedger.budget = 0
+    requests = []
+    with patch("llm_cerebras.cerebras.get_client", return_value=racing_client([0.2], requests)):
+        assert CerebrasModel("cerebras-llama3.1-8b").prompt("hi", hedge=True).text() == "reply 1"
+    assert len(requests) == 1
+    assert hedger.stats()[MODEL] == {"requests": 1, "hedged": 0, "won": 0, "win_rate": None}
+
+def test_unhedged_streams_feed_the_percentile():
+    requests = []
+    with patch("llm_cerebras.cerebras.get_client", return_value=racing_client([0], requests)):
+        CerebrasModel("cerebras-llama3.1-8b").prompt("hi").text()
+    assert len(get_hedger()._models[MODEL].samples) == 1
+
+def test_async_hedge_cancels_the_loser(hedger):
+    requests = []
+    closed = []
+
+    def handler(request):
+        requests.append(request)
+        n = len(requests)
+
+        async def body():
+            try:
+                await asyncio.sleep(1.0 if n == 1 else 0)
+                yield sse(f"reply {n}")
+            finally:
+                closed.append(n)
+        return httpx.Response(200, content=body())
+
+    async def run():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        with patch("llm_cerebras.cerebras.get_async_client", return_value=client):
+            response = AsyncCerebrasModel("cerebras-llama3.1-8b").prompt("hi", hedge=True)
+            text = await response.text()
+            await asyncio.sleep(0.05)
+            return text, response.response_json
+
+    text, details = asyncio.run(run())
+    assert text == "reply 2"
+    assert details["hedge"]["winner"] == "hedge"
+    assert 1 in closed
+
+class SlowStream(httpx.SyncByteStream):
+    """A stream that takes delay seconds to start, recording when it is closed."""
+
+    def __init__(self, text, delay, closed):
+        self.text = text
+        self.delay = delay
+        self.closed = closed
+
+    def __iter__(self):
+        time.sleep(self.delay)
+        yield sse(self.text)
+
+    def close(self):
+        self.closed.append(self.text)
+
+def test_sync_hedge_closes_the_loser(hedger):
+    requests = []
+    closed = []
+
+    def handler(request):
+        requests.append(request)
+        n = len(requests)
+        return httpx.Response(200, stream=SlowStream(f"reply {n}", 1.0 if n == 1 else 0, closed))
+
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        started = time.perf_counter()
+        response = CerebrasModel("cerebras-llama3.1-8b").prompt("hi", hedge=True)
+        assert response.text() == "reply 2"
+        assert "reply 1" in closed
+    assert time.perf_counter() - started < 1.0
+
+class BrokenStream(httpx.SyncByteStream):
+    def __iter__(self):
+        raise httpx.ReadError("connection reset")
+        yield b""
+
+def test_retried_stream_counts_once_and_times_from_send(hedger):
+    hedger.budget = 0
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        if len(requests) == 1:
+            return httpx.Response(200, stream=BrokenStream())
+        return httpx.Response(200, content=sse("ok"))
+
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        assert CerebrasModel("cerebras-llama3.1-8b").prompt("hi", hedge=True).text() == "ok"
+    assert len(requests) == 2
+    assert hedger.stats()[MODEL]["requests"] == 1
+    # The backoff before the retry, at least 0.25s, is not part of the time to first token
+    assert max(hedger._models[MODEL].samples) < 0.25
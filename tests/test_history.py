@@ -0,0 +1,89 @@
+import asyncio
+import json
+import httpx
+import pytest
+from unittest.mock import patch
+from llm_cerebras.cerebras import AsyncCerebrasModel, CerebrasModel
+from llm_cerebras.history import HistoryCache, history_cache, trim_history
+
+pytestmark = pytest.mark.usefixtures("fake_key")
+
+@pytest.fixture(autouse=True)
+def empty_history_cache():
+    history_cache.clear()
+    yield
+    history_cache.clear()
+
+def echo_handler(requests):
+    def handler(request):
+        body = json.loads(request.content)
+        requests.append(body)
+        return httpx.Response(200, json={"choices": [{"message": {"content": f"reply {len(requests)}"}}]})
+    return handler
+
+def test_history_is_extended_not_rebuilt():
+    requests = []
+    client = httpx.Client(transport=httpx.MockTransport(echo_handler(requests)))
+    conversation = CerebrasModel("cerebras-llama3.1-8b").conversation()
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        for i in range(3):
+            conversation.prompt(f"turn {i}", stream=False).text()
+        first = conversation.responses[0]
+        with patch.object(first, "text_or_raise", side_effect=AssertionError("rebuilt")):
+            conversation.prompt("turn 3", stream=False, system="be brief").text()
+    assert requests[-1]["messages"] == [
+        {"role": "system", "content": "be brief"},
+        {"role": "user", "content": "turn 0"},
+        {"role": "assistant", "content": "reply 1"},
+        {"role": "user", "content": "turn 1"},
+        {"role": "assistant", "content": "reply 2"},
+        {"role": "user", "content": "turn 2"},
+        {"role": "assistant", "content": "reply 3"},
+        {"role": "user", "content": "turn 3"},
+    ]
+
+def test_edited_conversation_is_rebuilt():
+    cache = HistoryCache()
+    model = CerebrasModel("cerebras-llama3.1-8b")
+    requests = []
+    client = httpx.Client(transport=httpx.MockTransport(echo_handler(requests)))
+    conversation = model.conversation()
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        conversation.prompt("a", stream=False).text()
+        conversation.prompt("b", stream=False).text()
+    assert len(cache.history(conversation)[0]) == 4
+    conversation.responses.pop()
+    messages, tokens, total = cache.history(conversation)
+    assert [m["content"] for m in messages] == ["a", "reply 1"]
+    assert total == sum(tokens)
+
+def test_trim_history_drops_oldest_turns():
+    messages = [{"role": "user", "content": str(i)} for i in range(6)]
+    tokens = [10] * 6
+    kept, dropped = trim_history(messages, tokens, 60, 35)
+    assert dropped == 2 and kept == messages[4:]
+    assert trim_history(messages, tokens, 60, None) == (messages, 0)
+
+def test_context_budget_bounds_payload():
+    requests = []
+    client = httpx.Client(transport=httpx.MockTransport(echo_handler(requests)))
+    conversation = CerebrasModel("cerebras-llama3.1-8b").conversation()
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        for i in range(20):
+            conversation.prompt("x" * 400, stream=False, context_budget=500).text()
+    sizes = [len(r["messages"]) for r in requests]
+    assert max(sizes) < 10
+    assert requests[-1]["messages"][-1]["content"] == "x" * 400
+
+def test_async_conversation_history():
+    requests = []
+
+    async def run():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(echo_handler(requests)))
+        conversation = AsyncCerebrasModel("cerebras-llama3.1-8b").conversation()
+        with patch("llm_cerebras.cerebras.get_async_client", return_value=client):
+            await conversation.prompt("one", stream=False).text()
+            await conversation.prompt("two", stream=False).text()
+
+    asyncio.run(run())
+    assert [m["content"] for m in requests[-1]["messages"]] == ["one", "reply 1", "two"]
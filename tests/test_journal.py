@@ -0,0 +1,77 @@
+import json
+import time
+import httpx
+import pytest
+from unittest.mock import patch
+from llm_cerebras.batch import read_records, run_batch
+from llm_cerebras.cerebras import CerebrasModel
+from llm_cerebras.journal import Journal, input_hash
+
+pytestmark = pytest.mark.usefixtures("fake_key")
+
+def counting_client(sent, fail=()):
+    def handler(request):
+        prompt = json.loads(request.content)["messages"][-1]["content"]
+        sent.append(prompt)
+        if prompt in fail:
+            return httpx.Response(400, json={"message": "bad prompt"})
+        return httpx.Response(200, json={"choices": [{"message": {"content": prompt.upper()}}]})
+    return httpx.Client(transport=httpx.MockTransport(handler))
+
+def test_input_hash_ignores_id_but_not_prompt_inputs():
+    a = input_hash("m", {"id": 1, "prompt": "hi"})
+    assert a == input_hash("m", {"id": 2, "prompt": "hi"})
+    assert a != input_hash("m", {"id": 1, "prompt": "hi"}, system="be brief")
+    assert a != input_hash("m", {"id": 1, "prompt": "hi"}, options={"temperature": "0"})
+    assert a != input_hash("other", {"id": 1, "prompt": "hi"})
+
+def test_journal_buffers_until_interval_and_survives_partial_line(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = Journal(path, fsync_interval=3600)
+    with patch("llm_cerebras.journal.os.fsync") as fsync:
+        journal.record("a", {"response": "A"})
+        journal.record("b", {"response": "B"})
+        assert path.read_text() == ""
+        journal.close()
+    fsync.assert_called_once()
+    with open(path, "a") as f:
+        f.write('{"hash": "c", "res')
+    reopened = Journal(path)
+    assert len(reopened) == 2 and "a" in reopened and "c" not in reopened
+    assert reopened.get("b") == {"response": "B"}
+    reopened.close()
+    assert path.read_text().endswith("}\n")
+
+def test_journal_syncs_every_write_with_zero_interval(tmp_path):
+    journal = Journal(tmp_path / "journal.jsonl", fsync_interval=0)
+    with patch("llm_cerebras.journal.os.fsync") as fsync:
+        journal.record("a", {"response": "A"})
+        journal.record("b", {"response": "B"})
+    assert fsync.call_count == 2
+    journal.close()
+
+def test_journal_syncs_on_the_interval_without_more_writes(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = Journal(path, fsync_interval=0.05)
+    journal.record("a", {"response": "A"})
+    assert path.read_text() == ""
+    time.sleep(0.3)
+    assert json.loads(path.read_text()) == {"hash": "a", "result": {"response": "A"}}
+    journal.close()
+
+def test_restart_skips_finished_and_retries_failures(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    model = CerebrasModel("cerebras-llama3.1-8b")
+    lines = ['"one"', '"two"', '"three"']
+
+    sent = []
+    with Journal(path) as journal, patch("llm_cerebras.cerebras.get_client", return_value=counting_client(sent, fail={"two"})):
+        counts = run_batch(model, read_records(lines), lambda r: None, journal=journal)
+    assert counts["completed"] == 2 and counts["failed"] == 1
+
+    sent, results = [], []
+    with Journal(path) as journal, patch("llm_cerebras.cerebras.get_client", return_value=counting_client(sent)):
+        counts = run_batch(model, read_records(lines), results.append, journal=journal)
+    assert sent == ["two"]
+    assert counts == {"completed": 1, "failed": 0, "skipped": 0, "restored": 2}
+    assert [(r["id"], r["response"]) for r in results] == [(0, "ONE"), (1, "TWO"), (2, "THREE")]
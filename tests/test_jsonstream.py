@@ -0,0 +1,85 @@
+import asyncio
+import json
+import httpx
+import llm
+import pytest
+from unittest.mock import patch
+from llm_cerebras import astream_items, stream_items
+from llm_cerebras.cerebras import AsyncCerebrasModel, CerebrasModel
+from llm_cerebras.jsonstream import JSONItemParser, iter_items, validate_item
+
+SCHEMA = llm.schema_dsl("name, age int", multi=True)
+
+pytestmark = pytest.mark.usefixtures("fake_key")
+
+def split(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+def sse_body(text, size=5):
+    chunks = [{"choices": [{"delta": {"content": piece}}]} for piece in split(text, size)]
+    return "".join(f"data: {json.dumps(c)}\n\n" for c in chunks) + "data: [DONE]\n\n"
+
+DOGS = json.dumps({"items": [{"name": "Rex ]}\"", "age": 3}, {"name": "Fido", "age": 5}]})
+
+@pytest.mark.parametrize("size", [1, 3, 1000])
+def test_parser_reports_items_as_they_close(size):
+    document = json.dumps({"items": [{"name": "a", "tags": [1, 2]}, 3, "x,y"], "other": [[4]]})
+    parser = JSONItemParser()
+    items = [item for chunk in split(document, size) for item in parser.feed(chunk)]
+    assert items == [
+        (("items", 0), {"name": "a", "tags": [1, 2]}),
+        (("items", 1), 3),
+        (("items", 2), "x,y"),
+        (("other", 0), [4]),
+    ]
+
+def test_item_is_reported_before_document_ends():
+    parser = JSONItemParser()
+    assert parser.feed('[{"a": 1}') == [((0,), {"a": 1})]
+    assert parser.feed(', {"a"') == []
+    assert parser.feed(": 2}]") == [((1,), {"a": 2})]
+
+def test_invalid_item_json_raises():
+    items = iter_items(["[tru", "e,", " nope]"])
+    assert next(items) == ((0,), True)
+    with pytest.raises(ValueError, match=r"item \[1\]"):
+        next(items)
+
+def test_stream_items_from_response():
+    client = httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(200, text=sse_body(DOGS))))
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        response = CerebrasModel("cerebras-llama3.1-8b").prompt("dogs", schema=SCHEMA)
+        items = list(stream_items(response))
+    assert items == [(("items", 0), {"name": "Rex ]}\"", "age": 3}), (("items", 1), {"name": "Fido", "age": 5})]
+    assert response.text() == DOGS
+    assert response.response_json["items"] == {"valid": 2, "invalid": 0}
+
+def test_stream_items_reuses_the_checked_items():
+    client = httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(200, text=sse_body(DOGS))))
+    with patch("llm_cerebras.cerebras.get_client", return_value=client), \
+            patch("llm_cerebras.jsonstream.validate_item", wraps=validate_item) as validate:
+        response = CerebrasModel("cerebras-llama3.1-8b").prompt("dogs", schema=SCHEMA)
+        assert [dog["name"] for _, dog in stream_items(response)] == ["Rex ]}\"", "Fido"]
+        assert validate.call_count == 2
+        assert [dog["name"] for _, dog in stream_items(response)] == ["Rex ]}\"", "Fido"]
+
+def test_invalid_streamed_items_are_logged_and_counted(caplog):
+    text = json.dumps({"items": [{"name": "Rex", "age": "old"}, {"name": "Fido", "age": 5}]})
+    client = httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(200, text=sse_body(text))))
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        response = CerebrasModel("cerebras-llama3.1-8b").prompt("dogs", schema=SCHEMA)
+        assert response.text() == text
+        with pytest.raises(ValueError, match=r"Item \['items', 0\]"):
+            list(stream_items(CerebrasModel("cerebras-llama3.1-8b").prompt("dogs", schema=SCHEMA)))
+    assert response.response_json["items"] == {"valid": 1, "invalid": 1}
+    assert "Schema validation failed" in caplog.text
+
+def test_astream_items_from_async_response():
+    client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: httpx.Response(200, text=sse_body(DOGS))))
+
+    async def run():
+        with patch("llm_cerebras.cerebras.get_async_client", return_value=client):
+            response = AsyncCerebrasModel("cerebras-llama3.1-8b").prompt("dogs", schema=SCHEMA)
+            return [item async for _, item in astream_items(response)]
+
+    assert [dog["name"] for dog in asyncio.run(run())] == ["Rex ]}\"", "Fido"]
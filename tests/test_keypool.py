@@ -0,0 +1,109 @@
+import json
+import httpx
+import pytest
+from click.testing import CliRunner
+from llm.cli import cli
+from unittest.mock import patch
+from llm_cerebras.cerebras import CerebrasModel
+from llm_cerebras.keypool import KeyPool, get_key_pool, key_stats, set_key_pool
+
+KEYS = ["key-aaaa-1111", "key-bbbb-2222"]
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = KeyPool(KEYS, stats_path=tmp_path / "keys.json")
+    set_key_pool(pool)
+    return pool
+
+def keyed_client(seen, status_for=None, headers_for=None):
+    """Record the key of each request; answer per key with the given status and headers."""
+    def handler(request):
+        key = request.headers["authorization"].split()[-1]
+        seen.append(key)
+        status = (status_for or {}).get(key, 200)
+        return httpx.Response(
+            status,
+            headers=(headers_for or {}).get(key, {}),
+            json={"choices": [{"message": {"content": "ok"}}]} if status == 200 else {"message": "no"},
+        )
+    return httpx.Client(transport=httpx.MockTransport(handler))
+
+def test_pool_needs_two_keys(monkeypatch):
+    monkeypatch.setenv("CEREBRAS_API_KEYS", "only-one")
+    assert get_key_pool() is None
+    set_key_pool(None)
+    monkeypatch.setenv("CEREBRAS_API_KEYS", "one, two")
+    assert [key.key for key in get_key_pool().keys] == ["one", "two"]
+
+def test_requests_are_spread_across_keys(pool):
+    seen = []
+    with patch("llm_cerebras.cerebras.get_client", return_value=keyed_client(seen)):
+        for i in range(4):
+            CerebrasModel("cerebras-llama3.1-8b").prompt(f"hi {i}", stream=False).text()
+    assert sorted(seen) == sorted(KEYS * 2)
+
+def test_key_with_most_budget_left_is_preferred(pool):
+    seen = []
+    headers = {
+        KEYS[0]: {"x-ratelimit-limit-requests-day": "100", "x-ratelimit-remaining-requests-day": "5"},
+        KEYS[1]: {"x-ratelimit-limit-requests-day": "100", "x-ratelimit-remaining-requests-day": "90"},
+    }
+    with patch("llm_cerebras.cerebras.get_client", return_value=keyed_client(seen, headers_for=headers)):
+        for i in range(6):
+            CerebrasModel("cerebras-llama3.1-8b").prompt(f"hi {i}", stream=False).text()
+    assert seen[2:] == [KEYS[1]] * 4
+
+def test_rejected_key_is_ejected_and_request_moves_on(pool):
+    seen = []
+    client = keyed_client(seen, status_for={KEYS[0]: 401})
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        for i in range(3):
+            assert CerebrasModel("cerebras-llama3.1-8b").prompt(f"hi {i}", stream=False).text() == "ok"
+    assert seen == [KEYS[0], KEYS[1], KEYS[1], KEYS[1]]
+    pool.flush()
+    rows = key_stats(KEYS, pool._backend.path)
+    assert (rows[0]["requests"], rows[0]["unauthorized"], rows[0]["ejected_for"] > 0) == (1, 1, True)
+    assert (rows[1]["requests"], rows[1]["ok"]) == (3, 3)
+
+def test_all_keys_throttled_falls_back_to_retries(pool):
+    seen = []
+    client = keyed_client(seen, status_for={key: 429 for key in KEYS})
+    with patch("llm_cerebras.cerebras.get_client", return_value=client), \
+            patch("llm_cerebras.cerebras.time.sleep"):
+        with pytest.raises(httpx.HTTPStatusError):
+            CerebrasModel("cerebras-llama3.1-8b").prompt("hi", stream=False, max_retries=2).text()
+    assert seen[:2] == KEYS and len(seen) == 3
+
+def test_switching_keys_spends_retries(pool):
+    seen = []
+    client = keyed_client(seen, status_for={key: 401 for key in KEYS})
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        with pytest.raises(httpx.HTTPStatusError):
+            CerebrasModel("cerebras-llama3.1-8b").prompt("hi", stream=False, max_retries=0).text()
+    assert seen == KEYS[:1]
+
+def test_pool_keys_are_used_without_a_single_key(monkeypatch):
+    monkeypatch.delenv("CEREBRAS_API_KEY", raising=False)
+    monkeypatch.setenv("CEREBRAS_API_KEYS", ",".join(KEYS))
+    seen = []
+
+    def handler(request):
+        seen.append(request.headers["authorization"])
+        return httpx.Response(200, json={"data": [{"id": "llama3.1-8b"}]})
+
+    with patch("llm_cerebras.cerebras.get_client", return_value=httpx.Client(transport=httpx.MockTransport(handler))):
+        CerebrasModel._fetch_models_from_api()
+    assert seen == [f"Bearer {KEYS[0]}"]
+
+def test_cli_keys(pool, monkeypatch):
+    monkeypatch.setenv("CEREBRAS_API_KEYS", ",".join(KEYS))
+    with patch("llm_cerebras.cerebras.get_client", return_value=keyed_client([])):
+        CerebrasModel("cerebras-llama3.1-8b").prompt("hi", stream=False).text()
+    pool.flush()
+    with patch("llm_cerebras.keypool.default_stats_path", return_value=pool._backend.path):
+        result = CliRunner().invoke(cli, ["cerebras", "keys"])
+        as_json = CliRunner().invoke(cli, ["cerebras", "keys", "--json"])
+    assert result.exit_code == 0, result.output
+    assert "...1111: ok, 1 requests, 1 ok" in result.output
+    assert "key-aaaa" not in result.output
+    assert [row["requests"] for row in json.loads(as_json.output)] == [1, 0]
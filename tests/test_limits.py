@@ -0,0 +1,116 @@
+import json
+import httpx
+import llm
+import pytest
+from unittest.mock import patch
+from llm_cerebras.cerebras import CerebrasModel, _SharedCerebras
+from llm_cerebras.history import history_cache
+from llm_cerebras.limits import ContextWindowExceeded, model_limits, parse_model_limits, plan_max_tokens
+
+pytestmark = pytest.mark.usefixtures("fake_key")
+
+@pytest.fixture(autouse=True)
+def empty_history_cache():
+    history_cache.clear()
+    yield
+    history_cache.clear()
+
+def echo_client(requests):
+    def handler(request):
+        requests.append(json.loads(request.content))
+        return httpx.Response(200, json={"choices": [{"message": {"content": "ok"}}]})
+    return httpx.Client(transport=httpx.MockTransport(handler))
+
+def test_parse_model_limits():
+    assert parse_model_limits({"id": "a", "context_length": 32768, "max_completion_tokens": 4096}) == {
+        "context_window": 32768,
+        "max_output": 4096,
+    }
+    assert parse_model_limits({"id": "b", "limits": {"max_context_length": 8192}}) == {"context_window": 8192}
+    assert parse_model_limits({"id": "c", "owned_by": "Cerebras"}) == {}
+
+def test_model_limits_unknown_without_reported_window(monkeypatch):
+    monkeypatch.delenv("LLM_CEREBRAS_CONTEXT_WINDOW", raising=False)
+    assert model_limits(None, "x") is None
+    assert model_limits({"x": {"max_output": 2048}}, "x") is None
+    monkeypatch.setenv("LLM_CEREBRAS_CONTEXT_WINDOW", "65536")
+    assert model_limits({"x": {"max_output": 2048}}, "x") == {"context_window": 65536, "max_output": 2048}
+    assert model_limits({"x": {"context_window": 8192}}, "x") == {"context_window": 8192, "max_output": 8192}
+
+def test_plan_max_tokens():
+    limits = {"context_window": 1000, "max_output": 500}
+    assert plan_max_tokens(100, None, limits) is None
+    assert plan_max_tokens(100, 200, limits) == 200
+    assert plan_max_tokens(100, 900, limits) == 500
+    assert plan_max_tokens(800, 900, limits) == 200
+    with pytest.raises(ContextWindowExceeded):
+        plan_max_tokens(1000, None, limits)
+
+def test_metadata_is_fetched_and_cached(tmp_path):
+    api = {"data": [{"id": "llama3.1-8b", "context_length": 16384, "max_completion_tokens": 4096}, {"id": "qwen-3-32b"}]}
+    client = httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(200, json=api)))
+    path = tmp_path / "cerebras_models.json"
+    with patch("llm_cerebras.cerebras.get_client", return_value=client), \
+            patch.object(CerebrasModel, "get_cache_file", return_value=path):
+        CerebrasModel.get_models(refresh=True)
+        assert json.loads(path.read_text())["metadata"] == {"llama3.1-8b": {"context_window": 16384, "max_output": 4096}}
+        _SharedCerebras._metadata_memo = None
+        CerebrasModel.load_cached_models()
+    assert CerebrasModel("cerebras-llama3.1-8b").model_limits == {"context_window": 16384, "max_output": 4096}
+
+def test_oversized_prompt_is_rejected_without_a_request():
+    _SharedCerebras._metadata_memo = {"llama3.1-8b": {"context_window": 100}}
+    requests = []
+    with patch("llm_cerebras.cerebras.get_client", return_value=echo_client(requests)):
+        with pytest.raises(llm.ModelError, match="cerebras-llama3.1-8b"):
+            CerebrasModel("cerebras-llama3.1-8b").prompt("word " * 500, stream=False).text()
+    assert requests == []
+
+def test_max_tokens_is_clamped_to_fit():
+    _SharedCerebras._metadata_memo = {"llama3.1-8b": {"context_window": 1000, "max_output": 300}}
+    requests = []
+    with patch("llm_cerebras.cerebras.get_client", return_value=echo_client(requests)):
+        CerebrasModel("cerebras-llama3.1-8b").prompt("hi", stream=False, max_tokens=5000).text()
+        CerebrasModel("cerebras-llama3.1-8b").prompt("hi", stream=False).text()
+    assert requests[0]["max_tokens"] == 300
+    assert requests[1].get("max_tokens") is None
+
+def test_conversation_is_trimmed_to_context_window():
+    _SharedCerebras._metadata_memo = {"llama3.1-8b": {"context_window": 2000, "max_output": 500}}
+    requests = []
+    conversation = CerebrasModel("cerebras-llama3.1-8b").conversation()
+    with patch("llm_cerebras.cerebras.get_client", return_value=echo_client(requests)):
+        for i in range(30):
+            conversation.prompt("x" * 400, stream=False).text()
+    assert len(requests) == 30
+    assert max(len(r["messages"]) for r in requests) < 30
+    assert requests[-1]["messages"][-1]["content"] == "x" * 400
+
+def test_unknown_limits_send_prompts_unchanged(monkeypatch):
+    monkeypatch.delenv("LLM_CEREBRAS_CONTEXT_WINDOW", raising=False)
+    _SharedCerebras._metadata_memo = {}
+    requests = []
+    conversation = CerebrasModel("cerebras-llama3.3-70b").conversation()
+    with patch("llm_cerebras.cerebras.get_client", return_value=echo_client(requests)):
+        conversation.prompt("word " * 8000, stream=False, max_tokens=5000).text()
+        for i in range(30):
+            conversation.prompt("x" * 4000, stream=False).text()
+    assert requests[0]["max_tokens"] == 5000
+    assert len(requests[-1]["messages"]) == 61
+
+def test_trimming_leaves_room_for_schema_instructions():
+    _SharedCerebras._metadata_memo = {"llama3.1-8b": {"context_window": 2000, "max_output": 500}}
+    schema = {"type": "object", "properties": {"answer": {"type": "string", "description": "y " * 1000}}}
+    requests = []
+
+    def handler(request):
+        requests.append(json.loads(request.content))
+        return httpx.Response(200, json={"choices": [{"message": {"content": '{"answer": "ok"}'}}]})
+
+    conversation = CerebrasModel("cerebras-llama3.1-8b").conversation()
+    with patch("llm_cerebras.cerebras.get_client", return_value=httpx.Client(transport=httpx.MockTransport(handler))):
+        for i in range(10):
+            conversation.prompt("x" * 400, stream=False, schema=schema, native_schema=False, max_tokens=400).text()
+    assert len(requests) == 10
+    assert all(r["max_tokens"] == 400 for r in requests)
+    assert "Your response must follow this schema" in requests[-1]["messages"][0]["content"]
@@ -0,0 +1,71 @@
+import json
+import pytest
+import httpx
+from unittest.mock import patch
+from llm_cerebras.cerebras import CerebrasModel
+from llm_cerebras.metrics import RequestTimer, add_metrics_hook, remove_metrics_hook, emit_metrics
+
+@pytest.fixture
+def captured():
+    metrics = []
+    add_metrics_hook(metrics.append)
+    yield metrics
+    remove_metrics_hook(metrics.append)
+
+pytestmark = pytest.mark.usefixtures("fake_key")
+
+def test_timer_streaming_metrics():
+    timer = RequestTimer("llama3.1-8b", True)
+    timer.trace("connection.connect_tcp.started", {})
+    timer.trace("connection.start_tls.complete", {})
+    for _ in range(4):
+        timer.chunk()
+    timer.output_tokens = 40
+    metrics = timer.finish()
+    assert metrics["model"] == "llama3.1-8b"
+    assert metrics["connect_ms"] >= 0
+    assert metrics["connection_reused"] is False
+    assert metrics["ttft_ms"] <= metrics["duration_ms"]
+    assert metrics["inter_chunk_ms"]["count"] == 3
+    assert metrics["tokens_per_second"] > 0
+    assert "error" not in metrics
+
+def test_timer_records_error_and_reused_connection():
+    metrics = RequestTimer("llama3.1-8b", False).finish(httpx.ReadTimeout("slow"))
+    assert metrics["connection_reused"] is True
+    assert metrics["ttft_ms"] is None
+    assert metrics["error"] == "ReadTimeout"
+
+def test_failing_hook_does_not_raise(captured):
+    def broken(metrics):
+        raise RuntimeError("dashboard down")
+    add_metrics_hook(broken)
+    try:
+        emit_metrics({"model": "x"})
+    finally:
+        remove_metrics_hook(broken)
+    assert captured == [{"model": "x"}]
+
+def test_execute_emits_streaming_metrics(captured):
+    chunks = [{"choices": [{"delta": {"content": c}}]} for c in ("a", "b", "c")]
+    chunks.append({"choices": [], "usage": {"prompt_tokens": 5, "completion_tokens": 3, "total_tokens": 8}})
+    body = "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks) + "data: [DONE]\n\n"
+    client = httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(200, text=body)))
+    model = CerebrasModel("cerebras-llama3.1-8b")
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        response = model.prompt("Hi", stream=True)
+        assert response.text() == "abc"
+    assert len(captured) == 1
+    metrics = captured[0]
+    assert metrics["stream"] is True
+    assert metrics["output_tokens"] == 3
+    assert metrics["inter_chunk_ms"]["count"] == 2
+    assert response.response_json["timing"] == metrics
+
+def test_execute_emits_metrics_on_failure(captured):
+    client = httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(400)))
+    model = CerebrasModel("cerebras-llama3.1-8b")
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        with pytest.raises(httpx.HTTPStatusError):
+            model.prompt("Hi", stream=False).text()
+    assert captured[0]["error"] == "HTTPStatusError"
@@ -0,0 +1,92 @@
+import json
+import time
+import pytest
+from unittest.mock import patch
+from llm_cerebras.cerebras import CerebrasModel, AsyncCerebrasModel, _SharedCerebras
+
+MODELS = {"cerebras-llama3.1-8b": "llama3.1-8b"}
+
+@pytest.fixture(autouse=True)
+def reset_memo():
+    saved = (_SharedCerebras._models_memo, _SharedCerebras._models_memo_time)
+    _SharedCerebras._models_memo = None
+    yield
+    _SharedCerebras._models_memo, _SharedCerebras._models_memo_time = saved
+
+@pytest.fixture
+def cache_file(tmp_path):
+    path = tmp_path / "cerebras_models.json"
+    path.write_text(json.dumps({"timestamp": time.time(), "models": MODELS}))
+    with patch.object(CerebrasModel, "get_cache_file", return_value=path):
+        yield path
+
+def test_model_map_reads_cache_file_once(cache_file):
+    model = CerebrasModel("cerebras-llama3.1-8b")
+    with patch.object(CerebrasModel, "load_cached_models", wraps=CerebrasModel.load_cached_models) as load:
+        assert model.api_model_id == "llama3.1-8b"
+        assert model.api_model_id == "llama3.1-8b"
+        assert model.model_map == MODELS
+    assert load.call_count == 1
+
+def test_memo_shared_between_sync_and_async_models():
+    CerebrasModel._remember_models(MODELS, time.time())
+    assert AsyncCerebrasModel("cerebras-llama3.1-8b").api_model_id == "llama3.1-8b"
+
+@pytest.mark.usefixtures("fake_key")
+def test_stale_memo_served_while_refreshing_in_background():
+    CerebrasModel._remember_models(MODELS, time.time() - CerebrasModel._cache_duration - 1)
+    model = CerebrasModel("cerebras-llama3.1-8b")
+    with patch.object(CerebrasModel, "refresh_models_in_background") as refresh:
+        with patch.object(CerebrasModel, "fetch_models_from_api") as fetch:
+            assert model.api_model_id == "llama3.1-8b"
+    refresh.assert_called_once()
+    fetch.assert_not_called()
+
+def test_background_refresh_updates_memo(cache_file):
+    CerebrasModel._remember_models({}, 0)
+    thread = CerebrasModel.refresh_models_in_background()
+    thread.join(timeout=5)
+    assert _SharedCerebras._models_memo == MODELS
+
+def test_failed_background_refresh_keeps_stale_models(tmp_path):
+    path = tmp_path / "cerebras_models.json"
+    stale = {"cerebras-qwen-3-32b": "qwen-3-32b", "cerebras-llama3.1-8b": "llama3.1-8b"}
+    path.write_text(json.dumps({"timestamp": time.time() - CerebrasModel._cache_duration - 1, "models": stale}))
+    with patch.object(CerebrasModel, "get_cache_file", return_value=path), \
+            patch("llm_cerebras.cerebras.llm.get_key", return_value=None):
+        model = CerebrasModel("cerebras-qwen-3-32b")
+        assert model.api_model_id == "qwen-3-32b"
+        CerebrasModel.refresh_models_in_background().join(timeout=5)
+        assert model.api_model_id == "qwen-3-32b"
+        # Not retried on every prompt
+        with patch.object(CerebrasModel, "refresh_models_in_background") as refresh:
+            model.api_model_id
+        refresh.assert_not_called()
+    assert json.loads(path.read_text())["models"] == stale
+
+@pytest.mark.usefixtures("fake_key")
+def test_memo_without_cache_uses_snapshot_and_refreshes_lazily():
+    model = CerebrasModel("cerebras-llama3.3-70b")
+    with patch.object(CerebrasModel, "refresh_models_in_background") as refresh:
+        with patch.object(CerebrasModel, "fetch_models_from_api") as fetch:
+            assert model.api_model_id == "llama-3.3-70b"
+    fetch.assert_not_called()
+    refresh.assert_called_once()
+
+def test_save_models_to_cache_round_trip(tmp_path):
+    path = tmp_path / "cerebras_models.json"
+    with patch.object(CerebrasModel, "get_cache_file", return_value=path):
+        CerebrasModel.save_models_to_cache(MODELS)
+        assert CerebrasModel.load_cached_models() == MODELS
+    assert [p.name for p in tmp_path.iterdir()] == ["cerebras_models.json"]
+
+def test_no_refresh_without_an_api_key(caplog):
+    with patch("llm_cerebras.cerebras.llm.get_key", return_value=None) as get_key, \
+            patch.object(CerebrasModel, "refresh_models_in_background") as refresh:
+        model = CerebrasModel("cerebras-llama3.3-70b")
+        assert model.api_model_id == "llama-3.3-70b"
+        assert model.api_model_id == "llama-3.3-70b"
+    refresh.assert_not_called()
+    # Looked up once: the single key, then the key pool
+    assert [c.args[1] for c in get_key.call_args_list] == ["cerebras", "cerebras_keys"]
+    assert not caplog.records
@@ -0,0 +1,124 @@
+import asyncio
+import threading
+import httpx
+from unittest.mock import patch, MagicMock
+from llm_cerebras.cerebras import CerebrasModel
+from llm_cerebras.ratelimit import RateLimiter, MemoryBackend, FileBackend, get_rate_limiter, set_rate_limiter
+
+def test_requests_per_minute_bucket():
+    limiter = RateLimiter(requests_per_minute=2)
+    assert limiter.try_acquire("model") == 0
+    assert limiter.try_acquire("model") == 0
+    wait = limiter.try_acquire("model")
+    assert 29 < wait <= 30
+    # Other models have their own buckets
+    assert limiter.try_acquire("other") == 0
+
+def test_tokens_per_minute_bucket():
+    limiter = RateLimiter(tokens_per_minute=100)
+    assert limiter.try_acquire("model", tokens=80) == 0
+    assert limiter.try_acquire("model", tokens=30) > 0
+    assert limiter.try_acquire("model", tokens=20) == 0
+
+def test_learns_limits_from_headers():
+    limiter = RateLimiter()
+    assert limiter.try_acquire("model", tokens=10) == 0
+    limiter.update_from_headers("model", httpx.Headers({
+        "x-ratelimit-limit-tokens-minute": "60000",
+        "x-ratelimit-remaining-tokens-minute": "0",
+        "x-ratelimit-limit-requests-day": "14400",
+        "x-ratelimit-remaining-requests-day": "14399",
+        "x-ratelimit-reset-tokens-minute": "59.5",
+    }))
+    wait = limiter.try_acquire("model", tokens=1000)
+    assert 0.9 < wait <= 1.0
+
+def test_record_usage_refunds_overestimate():
+    limiter = RateLimiter(tokens_per_minute=100)
+    assert limiter.try_acquire("model", tokens=100) == 0
+    limiter.record_usage("model", estimated=100, actual=40)
+    assert limiter.try_acquire("model", tokens=50) == 0
+
+def test_acquire_gives_up_waiting_past_max_wait():
+    limiter = RateLimiter(requests_per_minute=1, max_wait=5)
+    limiter.acquire("model")
+    with patch("llm_cerebras.ratelimit.time.sleep") as sleep:
+        limiter.acquire("model")
+    sleep.assert_not_called()
+
+def test_memory_backend_is_thread_safe():
+    limiter = RateLimiter(MemoryBackend(), requests_per_minute=50)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(limiter.try_acquire("model"))) for _ in range(100)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sum(1 for wait in results if wait == 0) == 50
+
+def test_file_backend_shares_budget_between_limiters(tmp_path):
+    # Two limiters on the same file behave like two worker processes
+    first = RateLimiter(FileBackend(tmp_path / "limits.json"), requests_per_minute=3)
+    second = RateLimiter(FileBackend(tmp_path / "limits.json"), requests_per_minute=3)
+    assert first.try_acquire("model") == 0
+    assert second.try_acquire("model") == 0
+    assert first.try_acquire("model") == 0
+    assert second.try_acquire("model") > 0
+
+def test_headroom_does_not_write_the_file(tmp_path):
+    limiter = RateLimiter(FileBackend(tmp_path / "limits.json"), requests_per_minute=4)
+    assert limiter.try_acquire("model") == 0
+    with patch("llm_cerebras.ratelimit.os.replace") as replace:
+        assert 0.74 < limiter.headroom("model") < 0.76
+        assert limiter.headroom("other") == 1.0
+    replace.assert_not_called()
+
+def test_file_backend_is_used_off_the_event_loop(tmp_path):
+    limiter = RateLimiter(FileBackend(tmp_path / "limits.json"), requests_per_minute=4)
+    threads = []
+    transact = limiter.backend.transact
+
+    def recording(fn, write=True):
+        threads.append(threading.get_ident())
+        return transact(fn, write)
+
+    async def acquire():
+        with patch.object(limiter.backend, "transact", side_effect=recording):
+            await limiter.acquire_async("model")
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(acquire())
+    assert threads and loop_thread not in threads
+
+def test_rate_limiter_configured_from_environment(monkeypatch):
+    monkeypatch.setenv("LLM_CEREBRAS_RPM", "30")
+    monkeypatch.setenv("LLM_CEREBRAS_RATE_LIMIT_BACKEND", "file")
+    monkeypatch.setattr("llm_cerebras.ratelimit._rate_limiter", None)
+    limiter = get_rate_limiter()
+    assert isinstance(limiter.backend, FileBackend)
+    assert limiter.configured == {"requests-minute": 30}
+    monkeypatch.setenv("LLM_CEREBRAS_RATE_LIMIT_BACKEND", "off")
+    monkeypatch.setattr("llm_cerebras.ratelimit._rate_limiter", None)
+    assert get_rate_limiter() is None
+
+@patch("llm_cerebras.cerebras.llm.get_key", return_value="fake-api-key")
+def test_execute_paces_and_learns_from_headers(mock_get_key):
+    limiter = MagicMock(wraps=RateLimiter())
+    set_rate_limiter(limiter)
+    transport = httpx.MockTransport(lambda request: httpx.Response(
+        200,
+        headers={"x-ratelimit-limit-tokens-minute": "1000", "x-ratelimit-remaining-tokens-minute": "990"},
+        json={"choices": [{"message": {"content": "Hi"}}], "usage": {"total_tokens": 10}},
+    ))
+    prompt = MagicMock()
+    prompt.prompt = "Test prompt"
+    prompt.schema = None
+    prompt.options = CerebrasModel.Options()
+    model = CerebrasModel("cerebras-llama3.1-8b")
+    with patch("llm_cerebras.cerebras.get_client", return_value=httpx.Client(transport=transport)):
+        assert list(model.execute(prompt, False, MagicMock(), None)) == ["Hi"]
+    limiter.acquire.assert_called_once()
+    assert limiter.acquire.call_args.args[0] == "llama3.1-8b"
+    limiter.update_from_headers.assert_called_once()
+    limiter.record_usage.assert_called_once()
+    assert limiter.record_usage.call_args.args[2] == 10
@@ -0,0 +1,111 @@
+import asyncio
+import json
+import httpx
+import llm
+import pytest
+from unittest.mock import patch
+from llm_cerebras.cerebras import AsyncCerebrasModel, CerebrasModel
+from llm_cerebras.repair import add_usage, failed_generation, local_fix
+
+SCHEMA = llm.schema_dsl("name, age int")
+
+pytestmark = pytest.mark.usefixtures("fake_key")
+
+def scripted_client(replies, requests, client_class=httpx.Client):
+    """Answer successive requests with the given (status, body) pairs."""
+    def handler(request):
+        requests.append(json.loads(request.content))
+        status, body = replies[len(requests) - 1]
+        return httpx.Response(status, json=body)
+    return client_class(transport=httpx.MockTransport(handler))
+
+def completion(content, tokens=10):
+    return 200, {
+        "choices": [{"message": {"content": content}}],
+        "usage": {"prompt_tokens": tokens, "completion_tokens": 5, "total_tokens": tokens + 5},
+    }
+
+@pytest.mark.parametrize("broken, fixed", [
+    ('{"a": 1, "b": [1, 2,],}', {"a": 1, "b": [1, 2]}),
+    ('Here you go: {"a": "x"} Hope that helps!', {"a": "x"}),
+    ('```json\n{"a": [1, {"b": "c', {"a": [1, {"b": "c"}]}),
+    ('{"a": "x\\', {"a": "x"}),
+    ('{"a": ', {"a": None}),
+])
+def test_local_fix(broken, fixed):
+    assert json.loads(local_fix(broken)) == fixed
+
+def test_local_fix_gives_up():
+    assert local_fix("no json here") is None
+    assert local_fix('{"a" "b"}') is None
+
+def test_failed_generation():
+    body = {"message": "Failed to generate JSON", "code": "json_validate_failed", "failed_generation": '{"name": '}
+    assert failed_generation(httpx.Response(400, json=body)) == '{"name": '
+    assert failed_generation(httpx.Response(400, json={"error": body})) == '{"name": '
+    assert failed_generation(httpx.Response(400, json={"message": "bad"})) is None
+    assert failed_generation(httpx.Response(500, json=body)) is None
+
+def test_add_usage():
+    assert add_usage(None, {"prompt_tokens": 1}) == {"prompt_tokens": 1}
+    assert add_usage({"prompt_tokens": 1, "completion_tokens": 2}, {"prompt_tokens": 3, "completion_tokens": 4}) == {
+        "prompt_tokens": 4,
+        "completion_tokens": 6,
+    }
+
+def test_locally_fixable_reply_needs_no_second_request():
+    requests = []
+    client = scripted_client([completion('{"name": "Rex", "age": 3,')], requests)
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        response = CerebrasModel("cerebras-llama3.1-8b").prompt("a dog", schema=SCHEMA, stream=False)
+        assert json.loads(response.text()) == {"name": "Rex", "age": 3}
+    assert len(requests) == 1
+    assert response.response_json["attempts"] == 1
+
+def test_invalid_reply_is_sent_back_for_correction():
+    requests = []
+    client = scripted_client([
+        (400, {"message": "Failed to generate JSON", "failed_generation": "name: Rex"}),
+        completion('{"name": "Rex", "age": "three"}', tokens=20),
+        completion('{"name": "Rex", "age": 3}', tokens=30),
+    ], requests)
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        response = CerebrasModel("cerebras-llama3.1-8b").prompt("a dog", schema=SCHEMA, stream=False)
+        assert json.loads(response.text()) == {"name": "Rex", "age": 3}
+    assert len(requests) == 3
+    assert requests[1]["messages"][-2] == {"role": "assistant", "content": "name: Rex"}
+    assert "Failed to generate JSON" in requests[1]["messages"][-1]["content"]
+    assert requests[2]["messages"][-2]["content"] == '{"name": "Rex", "age": "three"}'
+    assert "age" in requests[2]["messages"][-1]["content"]
+    assert response.response_json["attempts"] == 3
+    assert (response.usage().input, response.usage().output) == (50, 10)
+
+def test_repairs_are_bounded():
+    requests = []
+    client = scripted_client([completion('{"name": "Rex"}')] * 2, requests)
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        response = CerebrasModel("cerebras-llama3.1-8b").prompt("a dog", schema=SCHEMA, stream=False, max_repairs=1)
+        assert json.loads(response.text()) == {"name": "Rex"}
+    assert len(requests) == 2
+    assert response.response_json["attempts"] == 2
+
+def test_failed_generation_without_schema_is_raised():
+    client = scripted_client([(400, {"message": "bad", "failed_generation": "x"})], [])
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        with pytest.raises(httpx.HTTPStatusError):
+            CerebrasModel("cerebras-llama3.1-8b").prompt("hi", stream=False).text()
+
+def test_async_repair():
+    requests = []
+    client = scripted_client(
+        [completion("not json"), completion('{"name": "Rex", "age": 3}')], requests, httpx.AsyncClient
+    )
+
+    async def run():
+        with patch("llm_cerebras.cerebras.get_async_client", return_value=client):
+            response = AsyncCerebrasModel("cerebras-llama3.1-8b").prompt("a dog", schema=SCHEMA, stream=False)
+            return await response.text(), (await response.json())["attempts"]
+
+    text, attempts = asyncio.run(run())
+    assert json.loads(text) == {"name": "Rex", "age": 3}
+    assert attempts == 2 and len(requests) == 2
@@ -0,0 +1,105 @@
+import asyncio
+import json
+import httpx
+import pytest
+from click.testing import CliRunner
+from unittest.mock import patch
+from llm.cli import cli
+from llm_cerebras.cache import ResponseCache, cache_key, get_response_cache
+from llm_cerebras.cerebras import AsyncCerebrasModel, CerebrasModel
+
+USAGE = {"prompt_tokens": 5, "completion_tokens": 3, "total_tokens": 8}
+
+pytestmark = pytest.mark.usefixtures("fake_key")
+
+def serve(requests):
+    def handler(request):
+        body = json.loads(request.content)
+        requests.append(body)
+        if body["stream"]:
+            chunks = [
+                {"choices": [{"delta": {"content": "Hel"}}]},
+                {"choices": [{"delta": {"content": "lo"}}]},
+                {"choices": [], "usage": USAGE},
+            ]
+            return httpx.Response(200, text="".join(f"data: {json.dumps(c)}\n\n" for c in chunks))
+        return httpx.Response(200, json={"choices": [{"message": {"content": "Hello"}}], "usage": USAGE})
+    return handler
+
+def test_cache_key_ignores_delivery_fields():
+    data = {"model": "m", "messages": [{"role": "user", "content": "hi"}], "temperature": 0, "seed": None}
+    assert cache_key(data) == cache_key(dict(data, stream=True, stream_options={"include_usage": True}))
+    assert cache_key(data) != cache_key(dict(data, temperature=0.5))
+    assert cache_key(data) != cache_key(dict(data, response_format={"type": "json_object"}))
+
+def test_cache_is_opt_in():
+    requests = []
+    client = httpx.Client(transport=httpx.MockTransport(serve(requests)))
+    model = CerebrasModel("cerebras-llama3.1-8b")
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        model.prompt("Hi", stream=False).text()
+        model.prompt("Hi", stream=False).text()
+    assert len(requests) == 2
+
+def test_stream_replays_from_cache(monkeypatch):
+    monkeypatch.setenv("LLM_CEREBRAS_CACHE", "1")
+    requests = []
+    client = httpx.Client(transport=httpx.MockTransport(serve(requests)))
+    model = CerebrasModel("cerebras-llama3.1-8b")
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        first = model.prompt("Hi", stream=True)
+        assert list(first) == ["Hel", "lo"]
+        second = model.prompt("Hi", stream=True)
+        assert list(second) == ["Hel", "lo"]
+        third = model.prompt("Hi", stream=False, cache=True)
+        assert third.text() == "Hello"
+        # An explicit option overrides the environment
+        model.prompt("Hi", stream=False, cache=False).text()
+    assert len(requests) == 2
+    assert second.response_json["cached"] is True
+    assert (second.usage().input, second.usage().output) == (5, 3)
+    stats = get_response_cache().stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (2, 1, 1)
+
+def test_async_cache_shared_with_sync():
+    requests = []
+    model = CerebrasModel("cerebras-llama3.1-8b")
+    with patch("llm_cerebras.cerebras.get_client", return_value=httpx.Client(transport=httpx.MockTransport(serve(requests)))):
+        model.prompt("Hi", stream=False, cache=True).text()
+
+    async def run():
+        async_model = AsyncCerebrasModel("cerebras-llama3.1-8b")
+        client = httpx.AsyncClient(transport=httpx.MockTransport(serve(requests)))
+        with patch("llm_cerebras.cerebras.get_async_client", return_value=client):
+            return await async_model.prompt("Hi", stream=False, cache=True).text()
+
+    assert asyncio.run(run()) == "Hello"
+    assert len(requests) == 1
+
+def test_ttl_and_size_eviction(tmp_path):
+    cache = ResponseCache(tmp_path / "cache.db", ttl=60, max_bytes=100)
+    cache.set("old", {"chunks": ["x"]})
+    with patch("llm_cerebras.cache.time.time", return_value=1e12):
+        assert cache.get("old") is None
+    for i in range(5):
+        cache.set(f"k{i}", {"chunks": ["y" * 20]})
+    cache.get("k0")
+    cache.evict()
+    stats = cache.stats()
+    assert stats["size_bytes"] <= 100
+    assert cache.get("k0") is not None
+    assert cache.get("k1") is None
+
+def test_cli_stats_and_clear(monkeypatch):
+    cache = get_response_cache()
+    cache.set("k", {"chunks": ["hello"]})
+    cache.get("k")
+    cache.get("missing")
+    runner = CliRunner()
+    result = runner.invoke(cli, ["cerebras", "cache", "stats", "--json"])
+    assert result.exit_code == 0, result.output
+    stats = json.loads(result.output)
+    assert (stats["entries"], stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 1, 0.5)
+    result = runner.invoke(cli, ["cerebras", "cache", "clear"])
+    assert result.exit_code == 0
+    assert "Hit rate: n/a" in runner.invoke(cli, ["cerebras", "cache", "stats"]).output
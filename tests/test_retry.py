@@ -0,0 +1,146 @@
+import json
+import pytest
+import httpx
+from unittest.mock import patch, MagicMock
+from llm_cerebras.cerebras import CerebrasModel
+from llm_cerebras.retry import RetryPolicy, RetryState, retry_after_seconds, parse_duration
+
+@pytest.fixture
+def cerebras_model():
+    return CerebrasModel("cerebras-llama3.1-8b")
+
+def make_prompt(**options):
+    prompt = MagicMock()
+    prompt.prompt = "Test prompt"
+    prompt.schema = None
+    prompt.options = CerebrasModel.Options(**options)
+    return prompt
+
+def make_response():
+    response = MagicMock()
+    response.response_json = None
+    return response
+
+def completion(content):
+    return {"choices": [{"message": {"content": content}}]}
+
+def sse(*contents):
+    lines = [f'data: {json.dumps({"choices": [{"delta": {"content": c}}]})}\n\n' for c in contents]
+    return "".join(lines) + "data: [DONE]\n\n"
+
+def mock_client(*responses):
+    """An httpx.Client whose requests get the given responses in turn."""
+    queue = list(responses)
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        item = queue.pop(0)
+        if isinstance(item, Exception):
+            raise item
+        return item
+
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    client.requests = requests
+    return client
+
+@pytest.fixture(autouse=True)
+def no_sleep():
+    with patch("llm_cerebras.cerebras.time.sleep") as sleep, \
+            patch("llm_cerebras.cerebras.llm.get_key", return_value="fake-api-key"):
+        yield sleep
+
+def test_parse_duration():
+    assert parse_duration("1.5") == 1.5
+    assert parse_duration("250ms") == 0.25
+    assert parse_duration("2m") == 120
+    assert parse_duration("soon") is None
+
+def test_retry_after_header_takes_priority():
+    headers = {"retry-after": "3", "x-ratelimit-reset-tokens-minute": "20", "x-ratelimit-remaining-tokens-minute": "0"}
+    assert retry_after_seconds(headers) == 3
+
+def test_retry_after_uses_reset_of_exhausted_limits_only():
+    headers = {
+        "x-ratelimit-remaining-requests-day": "1000",
+        "x-ratelimit-reset-requests-day": "30000.5",
+        "x-ratelimit-remaining-tokens-minute": "0",
+        "x-ratelimit-reset-tokens-minute": "12.25",
+    }
+    assert retry_after_seconds(headers) == 12.25
+    assert retry_after_seconds({}) is None
+
+def test_retry_state_respects_total_wait_cap():
+    state = RetryState(RetryPolicy(max_retries=10, max_total_wait=5))
+    response = MagicMock()
+    response.headers = {"retry-after": "4"}
+    assert state.next_delay(response) == 4
+    assert state.next_delay(response) is None
+    assert state.retries == 1
+
+def test_backoff_grows_and_is_capped():
+    policy = RetryPolicy(base_delay=1, max_delay=8)
+    assert 0.5 <= policy.backoff(0) <= 1
+    assert 2 <= policy.backoff(2) <= 4
+    assert 4 <= policy.backoff(10) <= 8
+
+def test_non_streaming_retries_429_then_succeeds(cerebras_model, no_sleep):
+    client = mock_client(
+        httpx.Response(429, headers={"retry-after": "2"}),
+        httpx.Response(503),
+        httpx.Response(200, json=completion("Hello")),
+    )
+    response = make_response()
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        result = list(cerebras_model.execute(make_prompt(), False, response, None))
+    assert result == ["Hello"]
+    assert len(client.requests) == 3
+    assert no_sleep.call_args_list[0].args == (2.0,)
+    assert response.response_json["retries"] == 2
+
+def test_non_retryable_status_raises_immediately(cerebras_model):
+    client = mock_client(httpx.Response(401, json={"message": "bad key"}))
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        with pytest.raises(httpx.HTTPStatusError):
+            list(cerebras_model.execute(make_prompt(), False, make_response(), None))
+    assert len(client.requests) == 1
+
+def test_gives_up_after_max_retries(cerebras_model):
+    client = mock_client(*[httpx.Response(500) for _ in range(3)])
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        with pytest.raises(httpx.HTTPStatusError):
+            list(cerebras_model.execute(make_prompt(max_retries=2), False, make_response(), None))
+    assert len(client.requests) == 3
+
+def test_streaming_checks_status_and_retries(cerebras_model):
+    client = mock_client(
+        httpx.ConnectError("connection refused"),
+        httpx.Response(429),
+        httpx.Response(200, text=sse("Hel", "lo")),
+    )
+    response = make_response()
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        result = list(cerebras_model.execute(make_prompt(), True, response, None))
+    assert result == ["Hel", "lo"]
+    assert response.response_json["retries"] == 2
+
+def test_streaming_error_status_raises(cerebras_model):
+    client = mock_client(httpx.Response(400, json={"message": "bad request"}))
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        with pytest.raises(httpx.HTTPStatusError):
+            list(cerebras_model.execute(make_prompt(), True, make_response(), None))
+
+def test_stream_not_retried_after_first_token(cerebras_model):
+    class BrokenStream(httpx.SyncByteStream):
+        def __iter__(self):
+            yield sse("Hel").split("data: [DONE]")[0].encode()
+            raise httpx.ReadError("connection reset")
+
+    client = mock_client(httpx.Response(200, stream=BrokenStream()), httpx.Response(200, text=sse("again")))
+    chunks = []
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        with pytest.raises(httpx.ReadError):
+            for chunk in cerebras_model.execute(make_prompt(), True, make_response(), None):
+                chunks.append(chunk)
+    assert chunks == ["Hel"]
+    assert len(client.requests) == 1
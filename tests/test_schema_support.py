@@ -1,8 +1,10 @@
 import pytest
 import json
 import httpx
+import llm
 from unittest.mock import patch, MagicMock
 from llm_cerebras.cerebras import CerebrasModel
+from llm_cerebras.schemas import schema_cache, schema_key, strict_schema, SchemaCache
 
 @pytest.fixture
 def cerebras_model():
@@ -95,12 +97,13 @@ def test_build_schema_instructions(cerebras_model):
     assert "required" in instructions
     assert "The person's name" in instructions
 
-@patch('llm_cerebras.cerebras.httpx.post')
+@patch('llm_cerebras.cerebras.get_client')
 @patch('llm_cerebras.cerebras.llm.get_key')
-def test_execute_with_schema_json_object(mock_get_key, mock_post, cerebras_model):
+def test_execute_with_schema_json_object(mock_get_key, mock_get_client, cerebras_model):
     """Test execution with schema using json_object"""
     # Setup mocks
     mock_get_key.return_value = "fake-api-key"
+    mock_post = mock_get_client.return_value.post
     
     # Configure mock for a successful json_object response
     mock_response = MagicMock()
@@ -118,6 +121,7 @@ def test_execute_with_schema_json_object(mock_get_key, mock_post, cerebras_model
     prompt.options.max_tokens = None
     prompt.options.top_p = 1
     prompt.options.seed = None
+    prompt.options.native_schema = False
     
     # Execute
     response = MagicMock()
@@ -143,12 +147,13 @@ def test_execute_with_schema_json_object(mock_get_key, mock_post, cerebras_model
     assert messages[0]["role"] == "system"
     assert "Your response must follow this schema" in messages[0]["content"]
 
-@patch('llm_cerebras.cerebras.httpx.post')
+@patch('llm_cerebras.cerebras.get_client')
 @patch('llm_cerebras.cerebras.llm.get_key')
-def test_validate_schema_success(mock_get_key, mock_post, cerebras_model):
+def test_validate_schema_success(mock_get_key, mock_get_client, cerebras_model):
     """Test schema validation success"""
     # Setup mocks
     mock_get_key.return_value = "fake-api-key"
+    mock_post = mock_get_client.return_value.post
     mock_response = MagicMock()
     mock_response.raise_for_status.return_value = None
     mock_response.json.return_value = {
@@ -177,12 +182,13 @@ def test_validate_schema_success(mock_get_key, mock_post, cerebras_model):
     assert len(result) == 1
     assert json.loads(result[0]) == {"name": "Alice", "age": 30}
 
-@patch('llm_cerebras.cerebras.httpx.post')
+@patch('llm_cerebras.cerebras.get_client')
 @patch('llm_cerebras.cerebras.llm.get_key')
-def test_execute_with_concise_schema(mock_get_key, mock_post, cerebras_model):
+def test_execute_with_concise_schema(mock_get_key, mock_get_client, cerebras_model):
     """Test execution with concise schema format"""
     # Setup mocks
     mock_get_key.return_value = "fake-api-key"
+    mock_post = mock_get_client.return_value.post
     
     # Second call succeeds with json_object
     mock_response = MagicMock()
@@ -216,3 +222,140 @@ def test_execute_with_concise_schema(mock_get_key, mock_post, cerebras_model):
     assert "age" in parsed
     assert "bio" in parsed
     assert isinstance(parsed["age"], int)
+
+def test_validate_schema_without_jsonschema(cerebras_model):
+    """Test the basic fallback validation when jsonschema is not installed"""
+    schema = {"type": "object", "properties": {"age": {"type": "integer"}}, "required": ["age"]}
+    schema_cache.clear()
+    with patch('llm_cerebras.schemas._get_jsonschema', return_value=None), \
+            patch('llm_cerebras.schemas._get_fastjsonschema', return_value=None):
+        assert cerebras_model._validate_schema({"age": 3}, schema)
+        with pytest.raises(ValueError):
+            cerebras_model._validate_schema({"age": "three"}, schema)
+    schema_cache.clear()
+
+def test_schema_key_is_canonical():
+    """Test that key order and whitespace do not change the cache key"""
+    a = {"type": "object", "properties": {"a": {"type": "string"}, "b": {"type": "integer"}}}
+    b = json.loads('{"properties": {"b": {"type": "integer"}, "a": {"type": "string"}}, "type": "object"}')
+    assert schema_key(a) == schema_key(b)
+    assert schema_key("name, age int") != schema_key("name, age")
+
+def test_compiled_schema_is_cached(cerebras_model):
+    """Test that repeated schemas reuse the processed schema and validator"""
+    schema_cache.clear()
+    first = cerebras_model._compiled_schema("name, age int")
+    second = cerebras_model._compiled_schema("name, age int")
+    assert first is second
+    assert first.schema["properties"]["age"]["type"] == "integer"
+    assert "Your response must follow this schema" in first.instructions
+    assert schema_cache.stats() == {"hits": 1, "misses": 1, "size": 1, "maxsize": schema_cache.maxsize}
+    first.validate({"name": "Rex", "age": 3})
+    with pytest.raises(ValueError):
+        first.validate({"name": "Rex", "age": "three"})
+    schema_cache.clear()
+
+def test_schema_cache_evicts_least_recently_used():
+    """Test the LRU bound of the schema cache"""
+    cache = SchemaCache(maxsize=2)
+    build = MagicMock(side_effect=lambda schema: object())
+    cache.get("a", build)
+    cache.get("b", build)
+    cache.get("a", build)
+    cache.get("c", build)
+    assert cache.stats()["size"] == 2
+    cache.get("a", build)
+    assert build.call_count == 3
+    cache.get("b", build)
+    assert build.call_count == 4
+
+def test_strict_schema_closes_objects():
+    """Test that strict mode schemas forbid extra properties unless told otherwise"""
+    schema = {
+        "type": "object",
+        "properties": {
+            "items": {"type": "array", "items": {"type": "object", "properties": {"a": {"type": "string"}}}},
+            "extra": {"type": "object", "additionalProperties": True},
+        },
+    }
+    strict = strict_schema(schema)
+    assert strict["additionalProperties"] is False
+    assert strict["properties"]["items"]["items"]["additionalProperties"] is False
+    assert strict["properties"]["extra"]["additionalProperties"] is True
+    assert "additionalProperties" not in schema
+
+def test_native_schema_request(cerebras_model):
+    """Test that schemas use strict json_schema mode without schema instructions"""
+    sent = []
+
+    def handler(request):
+        sent.append(json.loads(request.content))
+        return httpx.Response(200, json={"choices": [{"message": {"content": '{"name": "Rex", "age": 3}'}}]})
+
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    with patch("llm_cerebras.cerebras.get_client", return_value=client), \
+            patch("llm_cerebras.cerebras.llm.get_key", return_value="fake-api-key"):
+        assert json.loads(cerebras_model.prompt("a dog", schema=llm.schema_dsl("name, age int"), stream=False).text()) == {"name": "Rex", "age": 3}
+    assert sent[0]["response_format"]["type"] == "json_schema"
+    assert sent[0]["response_format"]["json_schema"]["schema"]["additionalProperties"] is False
+    assert [m["role"] for m in sent[0]["messages"]] == ["user"]
+
+def test_native_schema_fallback_is_remembered(cerebras_model):
+    """Test that a model rejecting json_schema falls back to json_object and is remembered"""
+    sent = []
+
+    def handler(request):
+        body = json.loads(request.content)
+        sent.append(body)
+        if body["response_format"]["type"] == "json_schema":
+            return httpx.Response(400, json={"message": "response_format json_schema is not supported"})
+        return httpx.Response(200, json={"choices": [{"message": {"content": '{"name": "Rex", "age": 3}'}}]})
+
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    with patch("llm_cerebras.cerebras.get_client", return_value=client), \
+            patch("llm_cerebras.cerebras.llm.get_key", return_value="fake-api-key"):
+        assert json.loads(cerebras_model.prompt("a dog", schema=llm.schema_dsl("name, age int"), stream=False).text())["name"] == "Rex"
+        cerebras_model.prompt("another dog", schema=llm.schema_dsl("name, age int"), stream=False).text()
+    assert [body["response_format"]["type"] for body in sent] == ["json_schema", "json_object", "json_object"]
+    assert sent[1]["messages"][0]["role"] == "system"
+    cached = json.loads(CerebrasModel.get_cache_file().read_text())
+    assert cached["metadata"]["llama-3.3-70b"]["json_schema"] is False
+
+def test_unrelated_error_keeps_native_schema(cerebras_model):
+    """Test that a 400 that is not about the response format does not downgrade the model"""
+    sent = []
+
+    def handler(request):
+        sent.append(json.loads(request.content))
+        return httpx.Response(400, json={"message": "Please reduce the length of the messages", "code": "context_length_exceeded"})
+
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    with patch("llm_cerebras.cerebras.get_client", return_value=client), \
+            patch("llm_cerebras.cerebras.llm.get_key", return_value="fake-api-key"):
+        with pytest.raises(httpx.HTTPStatusError):
+            cerebras_model.prompt("a dog", schema=llm.schema_dsl("name, age int"), stream=False, max_repairs=0).text()
+    assert [body["response_format"]["type"] for body in sent] == ["json_schema"]
+    assert cerebras_model._supports("json_schema") is True
+
+def test_rejected_schema_only_affects_that_schema(cerebras_model):
+    """Test that a model refusing one schema keeps json_schema mode for others"""
+    sent = []
+
+    def handler(request):
+        body = json.loads(request.content)
+        sent.append(body)
+        schema = (body["response_format"].get("json_schema") or {}).get("schema", {})
+        if "tags" in schema.get("properties", {}):
+            return httpx.Response(400, json={"message": "Unsupported keyword in json_schema: maxItems"})
+        return httpx.Response(200, json={"choices": [{"message": {"content": '{"name": "Rex", "tags": []}'}}]})
+
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    tagged = {"type": "object", "properties": {"name": {"type": "string"}, "tags": {"type": "array", "maxItems": 2}}}
+    with patch("llm_cerebras.cerebras.get_client", return_value=client), \
+            patch("llm_cerebras.cerebras.llm.get_key", return_value="fake-api-key"):
+        cerebras_model.prompt("a dog", schema=tagged, stream=False).text()
+        cerebras_model.prompt("a dog", schema=tagged, stream=False).text()
+        cerebras_model.prompt("a dog", schema=llm.schema_dsl("name"), stream=False).text()
+    assert [body["response_format"]["type"] for body in sent] == ["json_schema", "json_object", "json_object", "json_schema"]
+    assert cerebras_model._supports("json_schema") is True
+    assert not CerebrasModel.get_cache_file().exists()
@@ -0,0 +1,137 @@
+import asyncio
+import json
+import threading
+import time
+import httpx
+import pytest
+from unittest.mock import patch
+from llm_cerebras.cerebras import AsyncCerebrasModel, CerebrasModel
+from llm_cerebras.singleflight import Flight, SingleFlight
+
+USAGE = {"prompt_tokens": 5, "completion_tokens": 2, "total_tokens": 7}
+
+pytestmark = pytest.mark.usefixtures("fake_key")
+
+def slow_handler(requests, delay=0.3, status=200):
+    def handler(request):
+        body = json.loads(request.content)
+        requests.append(body)
+        time.sleep(delay)
+        if status != 200:
+            return httpx.Response(status, json={"message": "bad request"})
+        if body["stream"]:
+            chunks = [{"choices": [{"delta": {"content": c}}]} for c in ("Hel", "lo")]
+            chunks.append({"choices": [], "usage": USAGE})
+            return httpx.Response(200, text="".join(f"data: {json.dumps(c)}\n\n" for c in chunks))
+        return httpx.Response(200, json={"choices": [{"message": {"content": "Hello"}}], "usage": USAGE})
+    return handler
+
+def run_in_threads(fn, count):
+    results = [None] * count
+    def worker(i):
+        try:
+            results[i] = fn()
+        except Exception as e:
+            results[i] = e
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+    return results
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_concurrent_identical_prompts_share_one_request(stream):
+    requests = []
+    client = httpx.Client(transport=httpx.MockTransport(slow_handler(requests)))
+    model = CerebrasModel("cerebras-llama3.1-8b")
+
+    def prompt():
+        response = model.prompt("Hi", stream=stream, temperature=0)
+        chunks = list(response)
+        return chunks, response
+
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        results = run_in_threads(prompt, 4)
+    assert len(requests) == 1
+    expected = ["Hel", "lo"] if stream else ["Hello"]
+    assert all(chunks == expected for chunks, _ in results)
+    followers = [r for _, r in results if r.response_json.get("deduplicated")]
+    assert len(followers) == 3
+    assert all(r.usage().input == 5 for _, r in results)
+
+def test_leader_error_reaches_followers():
+    requests = []
+    client = httpx.Client(transport=httpx.MockTransport(slow_handler(requests, status=400)))
+    model = CerebrasModel("cerebras-llama3.1-8b")
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        results = run_in_threads(lambda: model.prompt("Hi", stream=False, temperature=0).text(), 3)
+    assert len(requests) == 1
+    assert all(isinstance(r, httpx.HTTPStatusError) for r in results)
+
+def test_dedupe_can_be_disabled():
+    requests = []
+    client = httpx.Client(transport=httpx.MockTransport(slow_handler(requests, delay=0.1)))
+    model = CerebrasModel("cerebras-llama3.1-8b")
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        run_in_threads(lambda: model.prompt("Hi", stream=False, temperature=0, dedupe=False).text(), 3)
+    assert len(requests) == 3
+
+@pytest.mark.parametrize("options, shared", [
+    ({}, False),
+    ({"temperature": 1.2}, False),
+    ({"seed": 7}, True),
+    ({"temperature": 1.2, "dedupe": True}, True),
+])
+def test_only_deterministic_requests_are_shared_by_default(options, shared):
+    requests = []
+    client = httpx.Client(transport=httpx.MockTransport(slow_handler(requests, delay=0.1)))
+    model = CerebrasModel("cerebras-llama3.1-8b")
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        run_in_threads(lambda: model.prompt("Hi", stream=False, **options).text(), 3)
+    assert len(requests) == (1 if shared else 3)
+
+def test_same_thread_does_not_wait_on_itself():
+    requests = []
+    client = httpx.Client(transport=httpx.MockTransport(slow_handler(requests, delay=0)))
+    model = CerebrasModel("cerebras-llama3.1-8b")
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        first = iter(model.prompt("Hi", stream=True, temperature=0))
+        assert next(first) == "Hel"
+        assert model.prompt("Hi", stream=True, temperature=0).text() == "Hello"
+        assert list(first) == ["lo"]
+    assert len(requests) == 2
+
+def test_follower_sees_chunks_as_they_arrive():
+    registry = SingleFlight(Flight)
+    leader, is_leader = registry.join("k", owner=1)
+    follower, is_follower_leader = registry.join("k", owner=2)
+    assert is_leader and not is_follower_leader and follower is leader
+    received = []
+    thread = threading.Thread(target=lambda: received.extend(follower.follow()))
+    thread.start()
+    leader.append("a")
+    leader.append("b")
+    registry.land("k", leader, {"usage": USAGE})
+    thread.join(timeout=5)
+    assert received == ["a", "b"]
+    assert len(registry) == 0
+
+def test_async_gather_shares_one_request():
+    requests = []
+
+    async def run():
+        model = AsyncCerebrasModel("cerebras-llama3.1-8b")
+
+        async def handler(request):
+            body = json.loads(request.content)
+            requests.append(body)
+            await asyncio.sleep(0.1)
+            return httpx.Response(200, json={"choices": [{"message": {"content": "Hello"}}], "usage": USAGE})
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        with patch("llm_cerebras.cerebras.get_async_client", return_value=client):
+            return await asyncio.gather(*(model.prompt("Hi", stream=False, temperature=0).text() for _ in range(3)))
+
+    assert asyncio.run(run()) == ["Hello"] * 3
+    assert len(requests) == 1
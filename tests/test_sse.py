@@ -0,0 +1,107 @@
+import json
+import random
+import time
+from pathlib import Path
+import pytest
+import httpx
+from unittest.mock import patch
+from llm_cerebras.cerebras import CerebrasModel
+from llm_cerebras.sse import SSEDecoder, iter_sse, coalesce
+
+FIXTURE = Path(__file__).parent / "fixtures" / "stream_llama3.1-8b.sse"
+
+# Budget for decoding one event of the recorded stream and extracting its
+# content delta, in microseconds.
+PER_EVENT_BUDGET_US = 50
+
+def split_randomly(data, seed=0):
+    rng = random.Random(seed)
+    chunks, i = [], 0
+    while i < len(data):
+        size = rng.randint(1, 300)
+        chunks.append(data[i:i + size])
+        i += size
+    return chunks
+
+def naive_contents(text):
+    """The line-based parser the plugin used before the SSE decoder."""
+    contents = []
+    for line in text.splitlines():
+        if line.startswith("data: ") and line[6:] != "[DONE]":
+            choices = json.loads(line[6:])["choices"]
+            if choices and choices[0]["delta"].get("content"):
+                contents.append(choices[0]["delta"]["content"])
+    return contents
+
+def decoder_contents(chunks):
+    contents = []
+    for event in iter_sse(chunks):
+        if event.data != b"[DONE]":
+            choices = event.json()["choices"]
+            if choices and choices[0]["delta"].get("content"):
+                contents.append(choices[0]["delta"]["content"])
+    return contents
+
+def test_multiline_data_comments_and_fields():
+    decoder = SSEDecoder()
+    events = decoder.feed(b": ping\nevent: error\nid: 7\nretry: 1500\ndata: {\"a\":\ndata: 1}\n\ndata:x\n\n")
+    assert len(events) == 2
+    assert events[0].event == "error"
+    assert events[0].id == "7"
+    assert events[0].retry == 1500
+    assert events[0].json() == {"a": 1}
+    assert events[1].data == b"x"
+    assert events[1].event == "message"
+
+def test_line_endings_split_across_chunks():
+    decoder = SSEDecoder()
+    assert decoder.feed(b"data: one\r") == []
+    events = decoder.feed(b"\n\r\ndata: two\r\rdata: three")
+    assert [e.data for e in events] == [b"one", b"two"]
+    assert [e.data for e in decoder.flush()] == [b"three"]
+
+def test_fixture_matches_line_parser_for_any_chunking():
+    data = FIXTURE.read_bytes()
+    expected = naive_contents(data.decode())
+    assert len(expected) > 100
+    for seed in range(5):
+        assert decoder_contents(split_randomly(data, seed)) == expected
+    assert decoder_contents(split_randomly(data.replace(b"\n", b"\r\n"))) == expected
+
+def test_coalesce_joins_deltas_within_interval():
+    assert list(coalesce(iter(["a", "b", "c"]), 0)) == ["a", "b", "c"]
+    assert list(coalesce(iter(["a", "b", "c"]), 60)) == ["a", "bc"]
+
+def test_stream_error_event_raises_model_error():
+    body = 'event: error\ndata: {"error": {"message": "overloaded"}}\n\n'
+    client = httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(200, text=body)))
+    with patch("llm_cerebras.cerebras.get_client", return_value=client), \
+            patch("llm_cerebras.cerebras.llm.get_key", return_value="fake-api-key"):
+        with pytest.raises(Exception, match="overloaded"):
+            CerebrasModel("cerebras-llama3.1-8b").prompt("Hi", stream=True).text()
+
+def test_stream_flush_interval_option():
+    body = FIXTURE.read_text()
+    client = httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(200, text=body)))
+    with patch("llm_cerebras.cerebras.get_client", return_value=client), \
+            patch("llm_cerebras.cerebras.llm.get_key", return_value="fake-api-key"):
+        chunks = list(CerebrasModel("cerebras-llama3.1-8b").prompt("Hi", stream=True, stream_flush_interval=60))
+    assert "".join(chunks) == "".join(naive_contents(body))
+    assert len(chunks) == 2
+
+def test_decoder_benchmark():
+    """Micro-benchmark the decoder against the recorded stream."""
+    chunks = split_randomly(FIXTURE.read_bytes())
+    events = len(FIXTURE.read_bytes().split(b"\n\n"))
+    rounds = 50
+    start = time.perf_counter()
+    for _ in range(rounds):
+        decoder_contents(chunks)
+    decoder_us = (time.perf_counter() - start) / (rounds * events) * 1e6
+    text = FIXTURE.read_text()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        naive_contents(text)
+    naive_us = (time.perf_counter() - start) / (rounds * events) * 1e6
+    print(f"SSE decoder: {decoder_us:.2f}us/event, line parser: {naive_us:.2f}us/event")
+    assert decoder_us < PER_EVENT_BUDGET_US
@@ -0,0 +1,95 @@
+"""
+Startup benchmarks: the plugin is imported and its models registered on
+every llm invocation, so this has to stay fast and offline.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+# Budget for importing the plugin and registering its models, in milliseconds.
+# llm and httpx are imported before the clock starts.
+REGISTRATION_BUDGET_MS = 250
+
+# Budget for the cumulative `python -X importtime` cost of the llm_cerebras
+# package itself, in milliseconds.
+IMPORT_BUDGET_MS = 100
+
+STARTUP_SCRIPT = """
+import json, socket, time
+import llm, httpx
+
+attempts = []
+def no_network(self, *args, **kwargs):
+    attempts.append(args)
+    raise OSError("network disabled")
+socket.socket.connect = no_network
+socket.socket.connect_ex = no_network
+
+start = time.perf_counter()
+from llm_cerebras.cerebras import register_models
+registered = []
+register_models(lambda model, async_model=None, aliases=None: registered.append(model.model_id))
+elapsed = (time.perf_counter() - start) * 1000
+print(json.dumps({"ms": elapsed, "models": registered, "connects": len(attempts)}))
+"""
+
+def run_startup(user_dir):
+    env = dict(os.environ, LLM_USER_PATH=str(user_dir), CEREBRAS_API_KEY="fake-api-key")
+    result = subprocess.run(
+        [sys.executable, "-c", STARTUP_SCRIPT],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def test_registration_without_cache_uses_snapshot_offline(tmp_path):
+    stats = run_startup(tmp_path)
+    assert stats["connects"] == 0
+    assert "cerebras-llama3.1-8b" in stats["models"]
+    assert stats["ms"] < REGISTRATION_BUDGET_MS, f"Registration took {stats['ms']:.1f}ms"
+
+def test_registration_with_expired_cache_is_offline(tmp_path):
+    (tmp_path / "cerebras_models.json").write_text(json.dumps({
+        "timestamp": 0,
+        "models": {"cerebras-example": "example"},
+    }))
+    stats = run_startup(tmp_path)
+    assert stats["connects"] == 0
+    assert stats["models"] == ["cerebras-example"]
+    assert stats["ms"] < REGISTRATION_BUDGET_MS, f"Registration took {stats['ms']:.1f}ms"
+
+def test_import_time_budget_and_lazy_jsonschema():
+    result = subprocess.run(
+        [
+            sys.executable, "-X", "importtime", "-c",
+            "import sys, llm, httpx; import llm_cerebras; "
+            "print('jsonschema' in sys.modules)",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.strip() == "False", "jsonschema was imported eagerly"
+    cumulative_us = None
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and line.split("|")[-1].strip() == "llm_cerebras":
+            cumulative_us = int(line.split("|")[1])
+    assert cumulative_us is not None, result.stderr[-2000:]
+    assert cumulative_us / 1000 < IMPORT_BUDGET_MS, f"Import took {cumulative_us / 1000:.1f}ms"
+
+def test_import_has_no_logging_side_effects():
+    result = subprocess.run(
+        [
+            sys.executable, "-c",
+            "import sys, logging; logging.basicConfig(); "
+            "sys.modules['jsonschema'] = None; import llm_cerebras",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stderr == ""
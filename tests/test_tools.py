@@ -0,0 +1,150 @@
+import json
+import threading
+import time
+import httpx
+import llm
+import pytest
+from unittest.mock import patch
+from llm_cerebras.cerebras import CerebrasModel
+from llm_cerebras.history import history_cache, trim_history
+from llm_cerebras.tools import ToolCallDeltas
+
+pytestmark = pytest.mark.usefixtures("fake_key")
+
+@pytest.fixture(autouse=True)
+def empty_history_cache():
+    history_cache.clear()
+    yield
+    history_cache.clear()
+
+def tool_call(id, name, arguments):
+    return {"id": id, "type": "function", "function": {"name": name, "arguments": json.dumps(arguments)}}
+
+def scripted_client(messages, requests):
+    """Reply to successive requests with the given assistant messages."""
+    def handler(request):
+        requests.append(json.loads(request.content))
+        return httpx.Response(200, json={"choices": [{"message": messages[len(requests) - 1]}]})
+    return httpx.Client(transport=httpx.MockTransport(handler))
+
+def weather(city: str) -> str:
+    "Current weather in a city"
+    return f"Sunny in {city}"
+
+def test_tool_calls_are_requested_and_parsed():
+    requests = []
+    client = scripted_client([{"role": "assistant", "content": None, "tool_calls": [tool_call("c1", "weather", {"city": "Paris"})]}], requests)
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        response = CerebrasModel("cerebras-llama3.1-8b").prompt(
+            "weather?", tools=[weather], stream=False, tool_choice="weather"
+        )
+        assert response.text() == ""
+        calls = response.tool_calls()
+    assert [(c.name, c.arguments, c.tool_call_id) for c in calls] == [("weather", {"city": "Paris"}, "c1")]
+    tools = requests[0]["tools"]
+    assert tools[0]["function"]["name"] == "weather"
+    assert tools[0]["function"]["description"] == "Current weather in a city"
+    assert tools[0]["function"]["parameters"]["properties"]["city"]["type"] == "string"
+    assert requests[0]["tool_choice"] == {"type": "function", "function": {"name": "weather"}}
+
+def test_streamed_tool_call_deltas():
+    chunks = [
+        {"choices": [{"delta": {"tool_calls": [{"index": 0, "id": "c1", "function": {"name": "weather", "arguments": ""}}]}}]},
+        {"choices": [{"delta": {"tool_calls": [{"index": 0, "function": {"arguments": '{"city": '}}]}}]},
+        {"choices": [{"delta": {"tool_calls": [{"index": 1, "id": "c2", "function": {"name": "weather", "arguments": '{"city": "Oslo"}'}}]}}]},
+        {"choices": [{"delta": {"tool_calls": [{"index": 0, "function": {"arguments": '"Rome"}'}}]}}]},
+    ]
+    body = "".join(f"data: {json.dumps(c)}\n\n" for c in chunks) + "data: [DONE]\n\n"
+    client = httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(200, text=body)))
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        response = CerebrasModel("cerebras-llama3.1-8b").prompt("weather?", tools=[weather])
+        assert response.text() == ""
+        calls = response.tool_calls()
+    assert [(c.tool_call_id, c.arguments) for c in calls] == [("c1", {"city": "Rome"}), ("c2", {"city": "Oslo"})]
+
+def test_tool_call_deltas_without_index():
+    deltas = ToolCallDeltas()
+    deltas.add([{"id": "a", "function": {"name": "f", "arguments": "{}"}}])
+    assert deltas.calls()[0]["function"] == {"name": "f", "arguments": "{}"}
+
+def test_chain_runs_tool_calls_in_parallel():
+    active = {"now": 0, "peak": 0}
+    lock = threading.Lock()
+
+    def slow_lookup(key: str) -> str:
+        "Look something up, slowly"
+        with lock:
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+        time.sleep(0.2)
+        with lock:
+            active["now"] -= 1
+        return key.upper()
+
+    requests = []
+    client = scripted_client([
+        {"role": "assistant", "content": "", "tool_calls": [tool_call(f"c{i}", "slow_lookup", {"key": k}) for i, k in enumerate("abc")]},
+        {"role": "assistant", "content": "A, B and C"},
+    ], requests)
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        chain = CerebrasModel("cerebras-llama3.1-8b").chain("look up a, b and c", tools=[slow_lookup], stream=False)
+        assert chain.text() == "A, B and C"
+    assert active["peak"] == 3
+    messages = requests[1]["messages"]
+    assert [m["role"] for m in messages] == ["user", "assistant", "tool", "tool", "tool"]
+    assert [m["tool_call_id"] for m in messages[2:]] == ["c0", "c1", "c2"]
+    assert [m["content"] for m in messages[2:]] == ["A", "B", "C"]
+    assert json.loads(messages[1]["tool_calls"][1]["function"]["arguments"]) == {"key": "b"}
+
+def test_trim_history_keeps_tool_results_with_their_call():
+    messages = [
+        {"role": "user", "content": "q1"},
+        {"role": "assistant", "content": None, "tool_calls": []},
+        {"role": "tool", "content": "r1"},
+        {"role": "assistant", "content": "a1"},
+        {"role": "user", "content": "q2"},
+        {"role": "assistant", "content": "a2"},
+    ]
+    kept, dropped = trim_history(messages, [10] * 6, 60, 30)
+    assert kept == messages[4:] and dropped == 1
+
+def test_callbacks_run_one_call_at_a_time():
+    active = {"now": 0, "peak": 0}
+    lock = threading.Lock()
+
+    def approve(tool, tool_call):
+        with lock:
+            active["now"] += 1
+            active["peak"] = max(active["peak"], active["now"])
+        time.sleep(0.05)
+        with lock:
+            active["now"] -= 1
+
+    client = scripted_client([
+        {"role": "assistant", "content": "", "tool_calls": [tool_call(f"c{i}", "weather", {"city": c}) for i, c in enumerate("ABC")]},
+    ], [])
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        response = CerebrasModel("cerebras-llama3.1-8b").prompt("weather?", tools=[weather], stream=False)
+        response.text()
+        results = response.execute_tool_calls(before_call=approve)
+    assert active["peak"] == 1
+    assert [r.output for r in results] == ["Sunny in A", "Sunny in B", "Sunny in C"]
+
+def test_pause_keeps_results_of_finished_calls():
+    def lookup(key: str) -> str:
+        "Look something up"
+        if key == "a":
+            raise llm.PauseChain("needs a human")
+        time.sleep(0.05)
+        return key.upper()
+
+    client = scripted_client([
+        {"role": "assistant", "content": "", "tool_calls": [tool_call(f"c{i}", "lookup", {"key": k}) for i, k in enumerate("abc")]},
+    ], [])
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        response = CerebrasModel("cerebras-llama3.1-8b").prompt("look up", tools=[lookup], stream=False)
+        response.text()
+        with pytest.raises(llm.PauseChain) as paused:
+            response.execute_tool_calls()
+    assert paused.value.tool_call.tool_call_id == "c0"
+    assert [(r.tool_call_id, r.output) for r in paused.value.tool_results] == [("c1", "B"), ("c2", "C")]
@@ -0,0 +1,54 @@
+import json
+import pytest
+import httpx
+from unittest.mock import patch
+from llm_cerebras.cerebras import CerebrasModel
+
+USAGE = {"prompt_tokens": 12, "completion_tokens": 10, "total_tokens": 22}
+TIME_INFO = {"queue_time": 0.00007, "prompt_time": 0.001, "completion_time": 0.0056, "total_time": 0.022}
+
+@pytest.fixture
+def cerebras_model():
+    return CerebrasModel("cerebras-llama3.1-8b")
+
+pytestmark = pytest.mark.usefixtures("fake_key")
+
+def serve(body, requests):
+    def handler(request):
+        requests.append(json.loads(request.content))
+        return body
+    return httpx.Client(transport=httpx.MockTransport(handler))
+
+def test_non_streaming_usage_recorded(cerebras_model):
+    requests = []
+    client = serve(httpx.Response(200, json={
+        "choices": [{"message": {"content": "Hello!"}}],
+        "usage": USAGE,
+        "time_info": TIME_INFO,
+    }), requests)
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        response = cerebras_model.prompt("Hi", stream=False)
+        assert response.text() == "Hello!"
+    assert "stream_options" not in requests[0]
+    usage = response.usage()
+    assert (usage.input, usage.output) == (12, 10)
+    assert response.response_json["usage"] == USAGE
+    assert response.response_json["time_info"] == TIME_INFO
+
+def test_streaming_usage_from_final_chunk(cerebras_model):
+    chunks = [
+        {"choices": [{"delta": {"content": "Hel"}}]},
+        {"choices": [{"delta": {"content": "lo"}}]},
+        {"choices": [], "usage": dict(USAGE, prompt_tokens_details={"cached_tokens": 8}), "time_info": TIME_INFO},
+    ]
+    body = "".join(f"data: {json.dumps(chunk)}\n\n" for chunk in chunks) + "data: [DONE]\n\n"
+    requests = []
+    client = serve(httpx.Response(200, text=body), requests)
+    with patch("llm_cerebras.cerebras.get_client", return_value=client):
+        response = cerebras_model.prompt("Hi", stream=True)
+        assert response.text() == "Hello"
+    assert requests[0]["stream_options"] == {"include_usage": True}
+    usage = response.usage()
+    assert (usage.input, usage.output) == (12, 10)
+    assert usage.details == {"prompt_tokens_details": {"cached_tokens": 8}}
+    assert response.response_json["time_info"] == TIME_INFO